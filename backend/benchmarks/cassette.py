@@ -0,0 +1,280 @@
+"""Record real upstream traffic into a cassette and replay it offline with the original timings
+
+record: a local proxy in front of Google Maps, Open-Meteo, Amadeus and Gemini. Point the API
+at it (it prints the environment variables), run real /plan-trip requests, then stop it with
+Ctrl+C to write the cassette.
+
+replay: serves the recorded responses, each after the delay it originally took, so CPU and
+latency benchmarks see the same upstream behaviour on every run. The load test replays a
+cassette with --cassette.
+
+Run from the backend directory:
+    python -m benchmarks.cassette record trip.cassette --port 8920
+    python -m benchmarks.cassette replay trip.cassette --port 8920 [--speed 2]
+"""
+
+import argparse
+import asyncio
+import base64
+import gzip
+import hashlib
+import json
+import time
+from typing import Dict, Any, List, Optional, Tuple
+
+import aiohttp
+from aiohttp import web
+
+CASSETTE_VERSION = 1
+
+# Path prefix -> (upstream, real host); matches the paths of the base URLs the API is pointed at
+UPSTREAM_HOSTS = [
+    ("/maps/api/", "google_maps", "https://maps.googleapis.com"),
+    ("/v1/forecast", "open_meteo", "https://api.open-meteo.com"),
+    ("/v1/security/oauth2/", "amadeus", "https://test.api.amadeus.com"),
+    ("/v2/shopping/", "amadeus", "https://test.api.amadeus.com"),
+    ("/v1beta/", "gemini", "https://generativelanguage.googleapis.com")
+]
+
+# Credentials never reach the cassette and don't take part in matching (request headers,
+# which carry the rest of them, are forwarded but not stored)
+SECRET_PARAMS = {"key", "client_id", "client_secret", "signature"}
+
+# Hop-by-hop and length headers are recomputed rather than forwarded
+SKIPPED_HEADERS = {"host", "content-length", "connection", "transfer-encoding", "accept-encoding"}
+
+def classify(path: str) -> Optional[Tuple[str, str, str]]:
+    """(upstream, operation, real host) for a request path, or None if it isn't an upstream"""
+
+    for prefix, upstream, host in UPSTREAM_HOSTS:
+        if path.startswith(prefix):
+            if upstream == "google_maps":
+                # "/maps/api/place/nearbysearch/json" -> "place.nearbysearch"
+                operation = ".".join(part for part in path.strip("/").split("/")[2:] if part != "json")
+            elif upstream == "gemini":
+                operation = path.rsplit(":", 1)[-1]
+            else:
+                operation = path.rstrip("/").rsplit("/", 1)[-1].replace("-", "_")
+            return upstream, operation, host
+    return None
+
+def request_key(method: str, path: str, query: List[Tuple[str, str]], body: bytes, content_type: str) -> str:
+    """Identity of a request for matching: method, path, non-secret query and JSON body"""
+
+    params = sorted((name, value) for name, value in query if name not in SECRET_PARAMS)
+    # Form bodies only carry credentials (the Amadeus token request), so only JSON bodies count
+    body_digest = hashlib.sha1(body).hexdigest() if body and "json" in content_type else ""
+    return json.dumps([method, path, params, body_digest])
+
+def load_cassette(path: str) -> List[Dict[str, Any]]:
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        header = json.loads(f.readline())
+        if header.get("version") != CASSETTE_VERSION:
+            raise ValueError(f"{path} is a version {header.get('version')} cassette, expected {CASSETTE_VERSION}")
+        return [json.loads(line) for line in f if line.strip()]
+
+def save_cassette(path: str, interactions: List[Dict[str, Any]]):
+    """Gzipped JSON lines: a header, then one interaction per line in the order they finished"""
+
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        f.write(json.dumps({"version": CASSETTE_VERSION, "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%S%z")}) + "\n")
+        for interaction in interactions:
+            f.write(json.dumps(interaction, separators=(",", ":")) + "\n")
+
+def _encode_body(body: bytes, content_type: str) -> Dict[str, str]:
+    if "json" in content_type or content_type.startswith("text/"):
+        try:
+            return {"body": body.decode("utf-8"), "encoding": "text"}
+        except UnicodeDecodeError:
+            pass
+    # Open-Meteo answers in flatbuffers
+    return {"body": base64.b64encode(body).decode("ascii"), "encoding": "base64"}
+
+def _decode_body(interaction: Dict[str, Any]) -> bytes:
+    if interaction["encoding"] == "base64":
+        return base64.b64decode(interaction["body"])
+    return interaction["body"].encode("utf-8")
+
+class _Stats:
+    """Calls per upstream and operation, served on /__stats in the same shape as benchmarks.stubs"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.calls: Dict[str, Dict[str, int]] = {}
+        self.errors: Dict[str, int] = {}
+
+    def count(self, upstream: str, operation: str):
+        operations = self.calls.setdefault(upstream, {})
+        operations[operation] = operations.get(operation, 0) + 1
+        self.errors.setdefault(upstream, 0)
+
+    def add_routes(self, app: web.Application):
+        async def stats(request: web.Request) -> web.Response:
+            return web.json_response({"calls": self.calls, "errors": self.errors})
+
+        async def reset(request: web.Request) -> web.Response:
+            self.reset()
+            return web.json_response({"status": "reset"})
+
+        app.router.add_get("/__stats", stats)
+        app.router.add_post("/__reset", reset)
+
+class Recorder(_Stats):
+    """Forwards every upstream request to the real API and keeps the exchange"""
+
+    def __init__(self, output: str):
+        super().__init__()
+        self.output = output
+        self.interactions: List[Dict[str, Any]] = []
+        self.started = time.monotonic()
+        self.session: Optional[aiohttp.ClientSession] = None
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        self.add_routes(app)
+        app.router.add_route("*", "/{path:.*}", self.forward)
+        app.on_startup.append(self._open_session)
+        app.on_cleanup.append(self._close)
+        return app
+
+    async def _open_session(self, app: web.Application):
+        self.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=120))
+
+    async def _close(self, app: web.Application):
+        await self.session.close()
+        save_cassette(self.output, self.interactions)
+        print(f"Recorded {len(self.interactions)} interactions to {self.output}", flush=True)
+
+    async def forward(self, request: web.Request) -> web.Response:
+        route = classify(request.path)
+        if route is None:
+            return web.json_response({"error": f"No upstream for {request.path}"}, status=404)
+        upstream, operation, host = route
+        self.count(upstream, operation)
+
+        body = await request.read()
+        headers = {name: value for name, value in request.headers.items() if name.lower() not in SKIPPED_HEADERS}
+        query = list(request.query.items())
+
+        offset = time.monotonic() - self.started
+        start = time.perf_counter()
+        try:
+            async with self.session.request(request.method, host + request.path, params=query, data=body or None, headers=headers) as response:
+                response_body = await response.read()
+                status = response.status
+                content_type = response.headers.get("Content-Type", "application/octet-stream")
+        except aiohttp.ClientError as e:
+            self.errors[upstream] += 1
+            return web.json_response({"error": f"{upstream} unreachable: {e}"}, status=502)
+        elapsed = time.perf_counter() - start
+
+        stored_body = response_body
+        if (upstream, operation) == ("amadeus", "token") and status == 200:
+            # The bearer token is a live credential, and replays never check it
+            stored_body = json.dumps({**json.loads(response_body), "access_token": "replayed-token"}).encode()
+
+        self.interactions.append({
+            "upstream": upstream,
+            "operation": operation,
+            "key": request_key(request.method, request.path, query, body, request.headers.get("Content-Type", "")),
+            "status": status,
+            "content_type": content_type,
+            "offset": round(offset, 4),
+            "elapsed": round(elapsed, 4),
+            **_encode_body(stored_body, content_type)
+        })
+
+        return web.Response(body=response_body, status=status, headers={"Content-Type": content_type})
+
+class Replayer(_Stats):
+    """Answers upstream requests from a cassette, after each response's recorded delay
+
+    Requests are matched exactly first and then by method and path alone; repeated requests
+    cycle through the responses recorded for them in order. Unmatched requests get a 404 and
+    count as errors.
+    """
+
+    def __init__(self, interactions: List[Dict[str, Any]], speed: float = 1.0):
+        super().__init__()
+        self.speed = speed
+        self.by_key: Dict[str, List[Dict[str, Any]]] = {}
+        self.by_path: Dict[str, List[Dict[str, Any]]] = {}
+        for interaction in interactions:
+            method, path = json.loads(interaction["key"])[:2]
+            self.by_key.setdefault(interaction["key"], []).append(interaction)
+            self.by_path.setdefault(f"{method} {path}", []).append(interaction)
+        self.positions: Dict[str, int] = {}
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        self.add_routes(app)
+        app.router.add_route("*", "/{path:.*}", self.replay)
+        return app
+
+    def _next(self, lookup: Dict[str, List[Dict[str, Any]]], key: str) -> Optional[Dict[str, Any]]:
+        recorded = lookup.get(key)
+        if not recorded:
+            return None
+        position = self.positions.get(key, 0)
+        self.positions[key] = position + 1
+        return recorded[position % len(recorded)]
+
+    async def replay(self, request: web.Request) -> web.Response:
+        route = classify(request.path)
+        if route is None:
+            return web.json_response({"error": f"No upstream for {request.path}"}, status=404)
+        upstream, operation, _ = route
+        self.count(upstream, operation)
+
+        body = await request.read()
+        key = request_key(request.method, request.path, list(request.query.items()), body, request.headers.get("Content-Type", ""))
+        interaction = self._next(self.by_key, key) or self._next(self.by_path, f"{request.method} {request.path}")
+        if interaction is None:
+            self.errors[upstream] += 1
+            return web.json_response({"error": f"Nothing recorded for {request.method} {request.path}"}, status=404)
+
+        if self.speed > 0:
+            await asyncio.sleep(interaction["elapsed"] / self.speed)
+
+        return web.Response(
+            body=_decode_body(interaction),
+            status=interaction["status"],
+            headers={"Content-Type": interaction["content_type"]}
+        )
+
+def upstream_env(base_url: str) -> Dict[str, str]:
+    """Environment that sends all of the API's upstream traffic to base_url"""
+
+    return {
+        "GOOGLE_MAPS_BASE_URL": base_url,
+        "OPEN_METEO_URL": f"{base_url}/v1/forecast",
+        "AMADEUS_BASE_URL": base_url,
+        "GEMINI_API_ENDPOINT": base_url
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Record or replay upstream API traffic")
+    parser.add_argument("mode", choices=["record", "replay"])
+    parser.add_argument("cassette", help="Cassette file to write (record) or read (replay)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8920)
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay delays divided by this; 0 replays without delay")
+    args = parser.parse_args()
+
+    base_url = f"http://{args.host}:{args.port}"
+    if args.mode == "record":
+        server = Recorder(args.cassette)
+        print(f"Recording to {args.cassette}; start the API with:", flush=True)
+        for name, value in upstream_env(base_url).items():
+            print(f"  {name}={value}", flush=True)
+    else:
+        interactions = load_cassette(args.cassette)
+        server = Replayer(interactions, speed=args.speed)
+        print(f"Replaying {len(interactions)} interactions from {args.cassette} on {base_url}", flush=True)
+
+    web.run_app(server.make_app(), host=args.host, port=args.port, print=None, access_log=None)
+
+if __name__ == "__main__":
+    main()
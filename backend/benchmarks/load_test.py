@@ -0,0 +1,342 @@
+"""End-to-end load test of /plan-trip against local upstream stubs
+
+Starts the stub upstreams (benchmarks.stubs) and the API under uvicorn in child processes,
+points every external call at the stubs, then drives POST /plan-trip at a fixed concurrency.
+Reports throughput, latency percentiles, event-loop lag inside the API process and upstream
+calls per plan, and writes the full results to a JSON file. Nothing leaves the machine.
+
+Run from the backend directory:  python -m benchmarks.load_test [--concurrency 16] [--requests 200]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, Any, List, Optional, Tuple
+
+import aiohttp
+
+from benchmarks.cassette import upstream_env
+from benchmarks.stubs import DEFAULT_LATENCY, UPSTREAMS, parse_upstream_values
+
+DEFAULT_PROMPTS = [
+    "Plan a 3-day trip to Rome from 2026-11-03 with a moderate budget, historical sites and food",
+    "Plan a 4-day trip to Paris from 2026-11-10, luxury hotels, art and museums",
+    "Plan a 5-day trip to Barcelona from 2026-12-01 on a cheap budget, nightlife and food",
+    "Plan a 3-day trip to London from 2026-11-20, cultural and shopping",
+    "Plan a 4-day trip to Berlin from 2026-12-05, historical and nightlife",
+    "Plan a 3-day trip to Amsterdam from 2026-11-14, art and nature",
+    "Plan a 5-day trip to Madrid from 2026-12-10, food and museums",
+    "Plan a 7-day trip to Tokyo from 2027-01-08, cultural and shopping"
+]
+
+# Metric families read from the API's /metrics before and after the measured run
+LOOP_LAG_METRIC = "travel_planner_event_loop_lag_seconds"
+FALLBACK_METRIC = "travel_planner_mock_fallbacks_total"
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(q / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+def parse_metrics(text: str) -> Dict[str, float]:
+    """Prometheus text format -> {"name{labels}": value}"""
+
+    samples = {}
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        name, _, value = line.rpartition(" ")
+        samples[name] = float(value)
+    return samples
+
+def loop_lag_summary(before: Dict[str, float], after: Dict[str, float]) -> Dict[str, Any]:
+    """Mean and bucketed p99/max event-loop lag observed during the run, in milliseconds"""
+
+    def delta(name: str) -> float:
+        return after.get(name, 0) - before.get(name, 0)
+
+    count = delta(f"{LOOP_LAG_METRIC}_count")
+    total = delta(f"{LOOP_LAG_METRIC}_sum")
+
+    buckets: List[Tuple[float, float]] = []
+    for name in after:
+        match = re.match(rf'^{LOOP_LAG_METRIC}_bucket\{{le="([^"]+)"\}}$', name)
+        if match and match.group(1) != "+Inf":
+            buckets.append((float(match.group(1)), delta(name)))
+    buckets.sort()
+
+    def bucket_bound(share: float) -> Optional[float]:
+        # Histogram buckets only give an upper bound; None means beyond the largest bucket
+        for bound, cumulative in buckets:
+            if cumulative >= share * count:
+                return bound * 1000
+        return None
+
+    return {
+        "samples": int(count),
+        "mean_ms": total / count * 1000 if count else 0.0,
+        "p99_ms_at_most": bucket_bound(0.99) if count else 0.0,
+        "max_ms_at_most": bucket_bound(1.0) if count else 0.0
+    }
+
+def fallback_counts(before: Dict[str, float], after: Dict[str, float]) -> Dict[str, int]:
+    counts = {}
+    for name, value in after.items():
+        match = re.match(rf'^{FALLBACK_METRIC}\{{service="([^"]+)"\}}$', name)
+        if match:
+            counts[match.group(1)] = int(value - before.get(name, 0))
+    return counts
+
+def start_process(command: List[str], env: Dict[str, str], log_path: str) -> subprocess.Popen:
+    with open(log_path, "wb") as log_file:
+        return subprocess.Popen(command, env=env, stdout=log_file, stderr=subprocess.STDOUT)
+
+def stop_process(process: subprocess.Popen):
+    if process.poll() is None:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+async def wait_until_ready(session: aiohttp.ClientSession, url: str, process: subprocess.Popen, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{url} exited with code {process.returncode} before it was ready")
+        try:
+            async with session.get(url) as response:
+                if response.status == 200:
+                    return
+        except aiohttp.ClientError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} was not ready after {timeout:.0f}s")
+
+async def drive(session: aiohttp.ClientSession, url: str, prompts: List[str], concurrency: int,
+                total: int, duration: float) -> Dict[str, Any]:
+    """Send plans from `concurrency` workers until `total` are done or `duration` seconds pass"""
+
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    next_index = 0
+    deadline = time.monotonic() + duration if duration else None
+
+    async def worker():
+        nonlocal next_index
+        while True:
+            if deadline is not None:
+                if time.monotonic() >= deadline:
+                    return
+            elif next_index >= total:
+                return
+            prompt = prompts[next_index % len(prompts)]
+            next_index += 1
+
+            start = time.perf_counter()
+            try:
+                async with session.post(url, json={"prompt": prompt}) as response:
+                    await response.read()
+                    status = str(response.status)
+            except aiohttp.ClientError as e:
+                status = type(e).__name__
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    completed = len(latencies)
+    return {
+        "completed": completed,
+        "elapsed_s": elapsed,
+        "throughput_rps": completed / elapsed if elapsed else 0.0,
+        "status_counts": statuses,
+        "latency_ms": {
+            "mean": sum(latencies) / completed * 1000 if completed else 0.0,
+            "p50": percentile(latencies, 50) * 1000,
+            "p95": percentile(latencies, 95) * 1000,
+            "p99": percentile(latencies, 99) * 1000,
+            "max": latencies[-1] * 1000 if completed else 0.0
+        }
+    }
+
+async def run(args, prompts: List[str], latency: Dict[str, float], error_rate: Dict[str, float]) -> Dict[str, Any]:
+    work_dir = tempfile.mkdtemp(prefix="travel-planner-load-")
+    stub_port = args.stub_port or free_port()
+    app_port = args.app_port or free_port()
+    stub_url = f"http://127.0.0.1:{stub_port}"
+    app_url = f"http://127.0.0.1:{app_port}"
+
+    if args.cassette:
+        # Recorded responses with their original timings instead of synthetic ones
+        stub_command = [sys.executable, "-m", "benchmarks.cassette", "replay", args.cassette, "--port", str(stub_port)]
+    else:
+        stub_command = [
+            sys.executable, "-m", "benchmarks.stubs", "--port", str(stub_port),
+            "--latency", ",".join(f"{upstream}={value}" for upstream, value in latency.items()),
+            "--error-rate", ",".join(f"{upstream}={value}" for upstream, value in error_rate.items()),
+            "--jitter", str(args.jitter)
+        ]
+        if args.seed is not None:
+            stub_command += ["--seed", str(args.seed)]
+
+    # Every upstream points at the stubs; a fresh cache directory means the run starts cold
+    app_env = dict(os.environ)
+    app_env.update({
+        "APP_ENV": args.app_env,
+        "CACHE_DIR": os.path.join(work_dir, "cache"),
+        "PREWARM_DESTINATIONS": "",
+        "GOOGLE_MAPS_API_KEY": "AIzaLoadTestStubKey",
+        "AMADEUS_API_KEY": "load-test",
+        "AMADEUS_API_SECRET": "load-test",
+        "AMADEUS_LIVE_SEARCH": "true",
+        "GEMINI_API_KEY": "load-test",
+        **upstream_env(stub_url)
+    })
+    if args.seed is not None:
+        app_env["MOCK_DATA_SEED"] = str(args.seed)
+    app_command = [
+        sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(app_port),
+        "--workers", str(args.workers), "--log-level", "warning", "--no-access-log"
+    ]
+
+    stub_process = start_process(stub_command, dict(os.environ), os.path.join(work_dir, "stubs.log"))
+    app_process = start_process(app_command, app_env, os.path.join(work_dir, "app.log"))
+
+    timeout = aiohttp.ClientTimeout(total=args.request_timeout)
+    connector = aiohttp.TCPConnector(limit=0)
+    try:
+        async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+            await wait_until_ready(session, f"{stub_url}/__stats", stub_process)
+            await wait_until_ready(session, f"{app_url}/health", app_process)
+
+            plan_url = f"{app_url}/plan-trip"
+            if args.warmup:
+                await drive(session, plan_url, prompts, min(args.concurrency, args.warmup), args.warmup, 0)
+
+            async with session.post(f"{stub_url}/__reset"):
+                pass
+            async with session.get(f"{app_url}/metrics") as response:
+                metrics_before = parse_metrics(await response.text())
+
+            print(f"Driving {plan_url} with {args.concurrency} concurrent clients...", flush=True)
+            results = await drive(session, plan_url, prompts, args.concurrency, args.requests, args.duration)
+
+            async with session.get(f"{app_url}/metrics") as response:
+                metrics_after = parse_metrics(await response.text())
+            async with session.get(f"{stub_url}/__stats") as response:
+                stub_stats = await response.json()
+    finally:
+        stop_process(app_process)
+        stop_process(stub_process)
+
+    completed = results["completed"] or 1
+    upstream_calls = {}
+    for upstream in UPSTREAMS:
+        operations = stub_stats["calls"].get(upstream, {})
+        calls = sum(operations.values())
+        upstream_calls[upstream] = {
+            "calls": calls,
+            "per_request": calls / completed,
+            # Injected failures for the stubs, requests with no recorded response for a cassette
+            "errors": stub_stats["errors"].get(upstream, 0),
+            "operations": {operation: count / completed for operation, count in sorted(operations.items())}
+        }
+
+    fallbacks = fallback_counts(metrics_before, metrics_after)
+    return {
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "config": {
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "duration_s": args.duration,
+            "warmup": args.warmup,
+            "workers": args.workers,
+            "app_env": args.app_env,
+            "prompts": len(prompts),
+            "latency_s": latency,
+            "error_rate": error_rate,
+            "jitter": args.jitter,
+            "seed": args.seed,
+            "cassette": args.cassette
+        },
+        **results,
+        # With several workers this is whichever worker answered /metrics
+        "event_loop_lag": loop_lag_summary(metrics_before, metrics_after),
+        "upstream_calls": upstream_calls,
+        "mock_fallbacks_per_request": {service: count / completed for service, count in sorted(fallbacks.items())},
+        "logs": work_dir
+    }
+
+def print_summary(results: Dict[str, Any]):
+    latency = results["latency_ms"]
+    lag = results["event_loop_lag"]
+    print(f"Completed:        {results['completed']} plans in {results['elapsed_s']:.1f}s ({results['status_counts']})")
+    print(f"Throughput:       {results['throughput_rps']:.2f} plans/s")
+    print(f"Latency:          p50 {latency['p50']:.0f} ms, p95 {latency['p95']:.0f} ms, p99 {latency['p99']:.0f} ms, max {latency['max']:.0f} ms")
+    print(f"Event-loop lag:   mean {lag['mean_ms']:.1f} ms, p99 <= {lag['p99_ms_at_most']} ms, max <= {lag['max_ms_at_most']} ms")
+    for upstream, calls in results["upstream_calls"].items():
+        print(f"{upstream + ':':<18}{calls['per_request']:.2f} calls/plan ({calls['errors']} errors)")
+    if results["mock_fallbacks_per_request"]:
+        fallbacks = ", ".join(f"{service} {share:.2f}" for service, share in results["mock_fallbacks_per_request"].items())
+        print(f"Mock fallbacks:   {fallbacks} per plan")
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test /plan-trip against local upstream stubs")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=100, help="Plans to send (ignored when --duration is set)")
+    parser.add_argument("--duration", type=float, default=0, help="Run for this many seconds instead of --requests")
+    parser.add_argument("--warmup", type=int, default=0, help="Plans sent before measuring")
+    parser.add_argument("--latency", default="", help='Upstream seconds per call: "0.1" or "gemini=1.5,amadeus=0.2"')
+    parser.add_argument("--error-rate", default="", help='Share of failing upstream calls: "0.05" or "amadeus=0.1"')
+    parser.add_argument("--jitter", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=None, help="Seeds stub latency/errors and the API's sample data")
+    parser.add_argument("--cassette", help="Replay upstream responses recorded with benchmarks.cassette instead of the stubs")
+    parser.add_argument("--prompts-file", help="One prompt per line; defaults to a built-in mix of cities")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--app-env", default="production", choices=["production", "development"])
+    parser.add_argument("--request-timeout", type=float, default=120)
+    parser.add_argument("--stub-port", type=int, default=0)
+    parser.add_argument("--app-port", type=int, default=0)
+    parser.add_argument("--output", help="Results file (default benchmarks/results/load-test-<timestamp>.json)")
+    args = parser.parse_args()
+
+    prompts = DEFAULT_PROMPTS
+    if args.prompts_file:
+        with open(args.prompts_file) as f:
+            prompts = [line.strip() for line in f if line.strip()]
+
+    latency = parse_upstream_values(args.latency, DEFAULT_LATENCY)
+    error_rate = parse_upstream_values(args.error_rate, {upstream: 0.0 for upstream in UPSTREAMS})
+
+    results = asyncio.run(run(args, prompts, latency, error_rate))
+    print_summary(results)
+
+    output = args.output or os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "results", f"load-test-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+
+if __name__ == "__main__":
+    main()
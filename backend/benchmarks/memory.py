@@ -0,0 +1,57 @@
+"""Measure how much memory one plan holds as wire dicts versus compact records
+
+This covers the plan data alone; a real plan also allocates upstream responses and
+request state that records don't shrink.
+
+Run from the backend directory:  python -m benchmarks.memory [--plans 50]
+"""
+
+import argparse
+import gc
+import json
+import tracemalloc
+
+from tools.records import compact_section, to_wire
+from benchmarks.payloads import make_trip_plan
+
+def measure(build, plans: int) -> float:
+    """Average bytes retained per plan built by build()"""
+
+    gc.collect()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    kept = [build() for _ in range(plans)]
+    retained = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+
+    del kept
+    return retained / plans
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark per-plan memory footprint")
+    parser.add_argument("--plans", type=int, default=50)
+    parser.add_argument("--attractions", type=int, default=15)
+    parser.add_argument("--route-steps", type=int, default=40)
+    args = parser.parse_args()
+
+    # Plans are built from freshly parsed JSON, like upstream responses are
+    raw = json.dumps(make_trip_plan(args.attractions, args.route_steps))
+
+    def as_dicts():
+        return json.loads(raw)
+
+    def as_records():
+        plan = json.loads(raw)
+        return {name: compact_section(name, value) for name, value in plan.items()}
+
+    # The record form must serialize back to exactly the same payload
+    assert to_wire(as_records()) == json.loads(raw)
+
+    dict_bytes = measure(as_dicts, args.plans)
+    record_bytes = measure(as_records, args.plans)
+
+    print(f"Wire dicts:      {dict_bytes / 1024:.1f} KiB/plan")
+    print(f"Compact records: {record_bytes / 1024:.1f} KiB/plan ({(1 - record_bytes / dict_bytes) * 100:.0f}% smaller)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""Synthetic but realistically sized planner outputs shared by the benchmarks"""
+
+import random
+from typing import Dict, Any, List
+
+REVIEW_TEXT = "Lovely spot, would definitely come back. " * 8
+
+def make_reviews(count: int = 3) -> List[Dict[str, Any]]:
+    return [{"author": f"Reviewer {i}", "rating": 4 + i % 2, "text": REVIEW_TEXT[:200] + "..."} for i in range(count)]
+
+def make_hotels(count: int = 10) -> List[Dict[str, Any]]:
+    return [
+        {
+            "place_id": f"hotel-{i}",
+            "name": f"Hotel {i}",
+            "rating": round(random.uniform(3, 5), 1),
+            "price_level": i % 5,
+            "address": f"{i} Via del Corso, Rome",
+            "coordinates": {"lat": 41.9 + i / 1000, "lng": 12.49 + i / 1000},
+            "photos": [f"photo-reference-{i}-{j}" * 4 for j in range(5)],
+            "reviews": make_reviews(),
+            "estimated_price": "$150-250"
+        }
+        for i in range(count)
+    ]
+
+def make_attractions(count: int = 15) -> List[Dict[str, Any]]:
+    return [
+        {
+            "place_id": f"attraction-{i}",
+            "name": f"Attraction {i}",
+            "rating": round(random.uniform(3, 5), 1),
+            "price_level": i % 4,
+            "address": f"{i} Piazza Navona, Rome",
+            "coordinates": {"lat": 41.89 + i / 1000, "lng": 12.47 + i / 1000},
+            "photos": [f"photo-reference-{i}-{j}" * 4 for j in range(5)],
+            "types": ["tourist_attraction", "museum", "point_of_interest"],
+            "opening_hours": [f"Day {d}: 9:00 AM - 7:00 PM" for d in range(7)],
+            "reviews": make_reviews(),
+            "category": "Museum",
+            "estimated_visit_time": "2-3 hours",
+            "pricing": "$15-30"
+        }
+        for i in range(count)
+    ]
+
+def make_weather(days: int = 16) -> Dict[str, Any]:
+    return {
+        "location": "Rome",
+        "current": {"temperature": 22, "feels_like": 22, "description": "Partly cloudy", "humidity": 60, "wind_speed": 8, "icon": "02d"},
+        "forecast": [
+            {
+                "date": f"2026-06-{day + 1:02d}",
+                "min_temp": 15 + day % 3,
+                "max_temp": 25 + day % 4,
+                "avg_temp": 20,
+                "humidity": 55,
+                "wind_speed": 10,
+                "weather_code": 1,
+                "description": "Mainly clear"
+            }
+            for day in range(days)
+        ],
+        "recommendations": ["Pack light clothing", "Bring sunscreen"]
+    }
+
+def make_flights(count: int = 10, segments: int = 2) -> List[Dict[str, Any]]:
+    return [
+        {
+            "price": {"total": 350.0 + i * 20, "currency": "EUR"},
+            "itineraries": [
+                {
+                    "duration": "PT5H30M",
+                    "segments": [
+                        {
+                            "departure": {"airport": "LHR", "terminal": "5", "time": "2026-06-01T08:00:00"},
+                            "arrival": {"airport": "FCO", "terminal": "3", "time": "2026-06-01T11:30:00"},
+                            "carrier_code": "AZ",
+                            "flight_number": f"{200 + i}",
+                            "aircraft": "320",
+                            "duration": "PT2H30M"
+                        }
+                        for _ in range(segments)
+                    ]
+                }
+                for _ in range(2)
+            ],
+            "traveler_pricings": [
+                {"travelerId": "1", "fareOption": "STANDARD", "travelerType": "ADULT", "price": {"currency": "EUR", "total": "350.00"}}
+            ]
+        }
+        for i in range(count)
+    ]
+
+def make_routes(count: int = 5, steps: int = 40) -> List[Dict[str, Any]]:
+    return [
+        {
+            "start_location": f"Stop {i}, Rome, Italy",
+            "end_location": f"Stop {i + 1}, Rome, Italy",
+            "waypoints": [],
+            "total_distance": "3.2 km",
+            "total_duration": "12 mins",
+            "overview_polyline": "a~l~Fjk~uOwHJy@P" * 30,
+            "legs": [
+                {
+                    "start_address": f"Stop {i}, Rome, Italy",
+                    "end_address": f"Stop {i + 1}, Rome, Italy",
+                    "distance": "3.2 km",
+                    "duration": "12 mins",
+                    "steps": [
+                        {
+                            "instruction": "Head <b>north</b> on <b>Via del Corso</b> toward <b>Piazza Venezia</b>",
+                            "distance": "120 m",
+                            "duration": "1 min",
+                            "start_location": {"lat": 41.9 + step / 10000, "lng": 12.48},
+                            "end_location": {"lat": 41.9 + (step + 1) / 10000, "lng": 12.48},
+                            "travel_mode": "DRIVING"
+                        }
+                        for step in range(steps)
+                    ]
+                }
+            ],
+            "steps": [],
+            "start_attraction": f"Stop {i}",
+            "end_attraction": f"Stop {i + 1}",
+            "route_type": "attraction_to_attraction"
+        }
+        for i in range(count)
+    ]
+
+def make_trip_plan(attractions: int = 15, route_steps: int = 40) -> Dict[str, Any]:
+    """A /plan-trip result with a full set of sections"""
+
+    return {
+        "destination": "Rome",
+        "duration": 16,
+        "dates": "2026-06-01 to 2026-06-16",
+        "hotels": make_hotels(),
+        "attractions": make_attractions(attractions),
+        "weather": make_weather(),
+        "flights": make_flights(),
+        "routes": make_routes(steps=route_steps),
+        "summary": "A relaxed two weeks in Rome. " * 60
+    }
+
+def make_amadeus_response(count: int = 250, segments: int = 2) -> Dict[str, Any]:
+    """A raw Amadeus flight-offers response, before _process_amadeus_flights"""
+
+    return {
+        "meta": {"count": count},
+        "data": [
+            {
+                "type": "flight-offer",
+                "id": str(i + 1),
+                "itineraries": [
+                    {
+                        "duration": "PT5H30M",
+                        "segments": [
+                            {
+                                "departure": {"iataCode": "LHR", "terminal": "5", "at": "2026-06-01T08:00:00"},
+                                "arrival": {"iataCode": "FCO", "terminal": "3", "at": "2026-06-01T11:30:00"},
+                                "carrierCode": "AZ",
+                                "number": f"{200 + i}",
+                                "aircraft": {"code": "320"},
+                                "duration": "PT2H30M",
+                                "numberOfStops": 0
+                            }
+                            for _ in range(segments)
+                        ]
+                    }
+                    for _ in range(2)
+                ],
+                "price": {"currency": "EUR", "total": f"{350 + i * 2}.00", "base": "300.00", "grandTotal": f"{350 + i * 2}.00"},
+                "travelerPricings": [
+                    {"travelerId": "1", "fareOption": "STANDARD", "travelerType": "ADULT", "price": {"currency": "EUR", "total": "350.00"}}
+                ]
+            }
+            for i in range(count)
+        ]
+    }
+
+def make_place_reviews(count: int = 5, length: int = 800) -> List[Dict[str, Any]]:
+    """Reviews as the Places API returns them, before format_reviews"""
+
+    return [
+        {"author_name": f"Reviewer {i}", "rating": 3 + i % 3, "text": (REVIEW_TEXT * (length // len(REVIEW_TEXT) + 1))[:length], "time": 1700000000 + i}
+        for i in range(count)
+    ]
@@ -0,0 +1,52 @@
+"""Time polyline decoding and simplification for a plan's worth of routes
+
+Run from the backend directory:  python -m benchmarks.polyline [--routes 10 --points 500]
+"""
+
+import argparse
+import time
+
+import numpy as np
+from googlemaps.convert import decode_polyline as decode_polyline_python
+
+from tools.polyline import decode_polyline, encode_polyline, simplify_polyline
+
+def measure(func, iterations: int) -> float:
+    """Average microseconds per call"""
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) * 1e6 / iterations
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark route polyline processing")
+    parser.add_argument("--routes", type=int, default=10)
+    parser.add_argument("--points", type=int, default=500)
+    parser.add_argument("--tolerance", type=float, default=10.0)
+    parser.add_argument("--iterations", type=int, default=50)
+    args = parser.parse_args()
+
+    # Street-like paths around Rome: ~10 m between points with a slowly drifting heading
+    rng = np.random.default_rng(0)
+    polylines = []
+    for _ in range(args.routes):
+        heading = np.cumsum(rng.normal(scale=0.15, size=args.points))
+        steps = np.column_stack((np.cos(heading), np.sin(heading))) * 1e-4
+        polylines.append(encode_polyline(np.cumsum(steps, axis=0) + [41.9, 12.5]))
+
+    numpy_us = measure(lambda: [decode_polyline(polyline) for polyline in polylines], args.iterations)
+    python_us = measure(lambda: [decode_polyline_python(polyline) for polyline in polylines], args.iterations)
+    simplify_us = measure(lambda: [simplify_polyline(polyline, args.tolerance) for polyline in polylines], args.iterations)
+
+    original = sum(len(polyline) for polyline in polylines)
+    simplified = sum(len(simplify_polyline(polyline, args.tolerance)) for polyline in polylines)
+
+    print(f"{args.routes} routes x {args.points} points")
+    print(f"Decode (NumPy):        {numpy_us:.0f} us/plan")
+    print(f"Decode (googlemaps):   {python_us:.0f} us/plan")
+    print(f"Decode+simplify+encode: {simplify_us:.0f} us/plan")
+    print(f"Polyline size: {original} -> {simplified} chars at {args.tolerance:g} m tolerance")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""Compare the validated and the fast /plan-trip response paths
+
+Run from the backend directory:  python -m benchmarks.serialization [--iterations 500]
+"""
+
+import argparse
+import asyncio
+import time
+
+from fastapi.responses import JSONResponse, ORJSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from main import TripResponse
+from benchmarks.payloads import make_trip_plan
+
+async def validated_body(field, trip_plan) -> bytes:
+    """What FastAPI does for `return TripResponse(**trip_plan)` with response_model=TripResponse"""
+
+    content = await serialize_response(field=field, response_content=TripResponse(**trip_plan))
+    return JSONResponse(content).body
+
+async def fast_body(trip_plan) -> bytes:
+    return ORJSONResponse(trip_plan).body
+
+async def measure(func, iterations: int) -> float:
+    """Average milliseconds per call"""
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        await func()
+    return (time.perf_counter() - start) * 1000 / iterations
+
+async def run(iterations: int, trip_plan):
+    field = create_response_field(name="Response_plan_trip", type_=TripResponse)
+
+    validated_ms = await measure(lambda: validated_body(field, trip_plan), iterations)
+    fast_ms = await measure(lambda: fast_body(trip_plan), iterations)
+
+    print(f"Payload size:     {len(await fast_body(trip_plan)) / 1024:.1f} KiB")
+    print(f"Validated path:   {validated_ms:.3f} ms/response")
+    print(f"orjson fast path: {fast_ms:.3f} ms/response ({validated_ms / fast_ms:.1f}x faster)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark /plan-trip response serialization")
+    parser.add_argument("--iterations", type=int, default=500)
+    parser.add_argument("--attractions", type=int, default=15)
+    parser.add_argument("--route-steps", type=int, default=40)
+    args = parser.parse_args()
+
+    trip_plan = make_trip_plan(args.attractions, args.route_steps)
+    asyncio.run(run(args.iterations, trip_plan))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,522 @@
+"""Local stand-ins for Google Maps, Open-Meteo, Amadeus and Gemini
+
+Every upstream answers with payloads shaped like the real API after an injected latency,
+fails a configurable share of requests and counts its calls (GET /__stats, POST /__reset).
+The load test starts this in its own process; it can also be run by hand:
+
+Run from the backend directory:  python -m benchmarks.stubs --port 8900 [--latency gemini=1.5] [--error-rate amadeus=0.1]
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import random
+import re
+import struct
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, Any, List, Tuple
+
+import flatbuffers
+import numpy as np
+from aiohttp import web
+
+from tools.geocoding import CITY_COORDINATES
+from tools.polyline import encode_polyline
+from tools.spatial_index import haversine_km
+
+UPSTREAMS = ("google_maps", "open_meteo", "amadeus", "gemini")
+
+# Typical response times of the real APIs, in seconds
+DEFAULT_LATENCY = {"google_maps": 0.08, "open_meteo": 0.05, "amadeus": 0.4, "gemini": 0.8}
+
+# Place types handed out round-robin so interest-based attraction searches find matches
+PLACE_TYPES = ["tourist_attraction", "museum", "church", "park", "art_gallery", "restaurant", "point_of_interest"]
+
+# Average speed per travel mode in km/h, used to fake directions
+MODE_SPEEDS_KMH = {"walking": 4.8, "bicycling": 15.0, "transit": 22.0, "driving": 30.0}
+
+INTERESTS = ["historical", "cultural", "art", "food", "nature", "shopping", "nightlife", "museums"]
+
+def parse_upstream_values(text: str, defaults: Dict[str, float]) -> Dict[str, float]:
+    """Parse "0.1" (every upstream) or "gemini=1.5,amadeus=0.2" on top of defaults"""
+
+    values = dict(defaults)
+    if not text:
+        return values
+
+    for item in text.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        if "=" not in item:
+            values = {upstream: float(item) for upstream in UPSTREAMS}
+            continue
+        upstream, value = item.split("=", 1)
+        if upstream.strip() not in UPSTREAMS:
+            raise ValueError(f"Unknown upstream '{upstream.strip()}', expected one of {', '.join(UPSTREAMS)}")
+        values[upstream.strip()] = float(value)
+    return values
+
+def _digest(*parts: Any) -> int:
+    """Stable number derived from the request, so the same query gets the same answer"""
+
+    return int(hashlib.md5("|".join(str(part) for part in parts).encode()).hexdigest()[:12], 16)
+
+def _locate(text: str) -> Tuple[float, float]:
+    """Coordinates for "lat,lng", a known city, or a stable made-up point"""
+
+    match = re.match(r"^\s*(-?\d+(?:\.\d+)?)\s*,\s*(-?\d+(?:\.\d+)?)\s*$", text or "")
+    if match:
+        return float(match.group(1)), float(match.group(2))
+
+    text_lower = (text or "").lower()
+    for city, coordinates in CITY_COORDINATES.items():
+        if city in text_lower:
+            return coordinates
+
+    number = _digest(text_lower)
+    return (number % 12000) / 100.0 - 60.0, (number // 12000 % 36000) / 100.0 - 180.0
+
+class StubUpstreams:
+    """The four upstream APIs behind one aiohttp application"""
+
+    def __init__(self, latency: Dict[str, float], error_rate: Dict[str, float], jitter: float = 0.5, seed: int = None):
+        self.latency = latency
+        self.error_rate = error_rate
+        # Each call sleeps latency * uniform(1 - jitter, 1 + jitter)
+        self.jitter = jitter
+        self.random = random.Random(seed)
+        self.reset()
+
+    def reset(self):
+        self.calls: Dict[str, Dict[str, int]] = {upstream: {} for upstream in UPSTREAMS}
+        self.errors: Dict[str, int] = {upstream: 0 for upstream in UPSTREAMS}
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/maps/api/geocode/json", self.geocode)
+        app.router.add_get("/maps/api/place/nearbysearch/json", self.places_search)
+        app.router.add_get("/maps/api/place/textsearch/json", self.places_search)
+        app.router.add_get("/maps/api/place/details/json", self.place_details)
+        app.router.add_get("/maps/api/directions/json", self.directions)
+        app.router.add_get("/v1/forecast", self.forecast)
+        app.router.add_post("/v1/security/oauth2/token", self.amadeus_token)
+        app.router.add_get("/v2/shopping/flight-offers", self.flight_offers)
+        app.router.add_post("/v1beta/models/{model_action}", self.generate_content)
+        app.router.add_get("/__stats", self.stats)
+        app.router.add_post("/__reset", self.reset_stats)
+        return app
+
+    async def _call(self, upstream: str, operation: str) -> bool:
+        """Count the call, wait out the injected latency and decide whether it fails"""
+
+        operations = self.calls[upstream]
+        operations[operation] = operations.get(operation, 0) + 1
+
+        latency = self.latency.get(upstream, 0)
+        if latency > 0:
+            await asyncio.sleep(latency * self.random.uniform(1 - self.jitter, 1 + self.jitter))
+
+        if self.random.random() < self.error_rate.get(upstream, 0):
+            self.errors[upstream] += 1
+            return False
+        return True
+
+    def _maps_error(self) -> web.Response:
+        # A non-retryable status, so the client gives up straight away as it would on a bad key
+        return web.json_response({"status": "REQUEST_DENIED", "error_message": "Injected stub error"})
+
+    def _server_error(self) -> web.Response:
+        return web.json_response({"error": {"code": 500, "message": "Injected stub error"}}, status=500)
+
+    # Google Maps
+
+    async def geocode(self, request: web.Request) -> web.Response:
+        if not await self._call("google_maps", "geocode"):
+            return self._maps_error()
+
+        address = request.query.get("address", "")
+        lat, lng = _locate(address)
+        return web.json_response({
+            "status": "OK",
+            "results": [{
+                "formatted_address": address.title(),
+                "place_id": f"stub-geo-{_digest(address.lower()):x}",
+                "geometry": {
+                    "location": {"lat": lat, "lng": lng},
+                    "viewport": {
+                        "northeast": {"lat": lat + 0.15, "lng": lng + 0.2},
+                        "southwest": {"lat": lat - 0.15, "lng": lng - 0.2}
+                    }
+                }
+            }]
+        })
+
+    async def places_search(self, request: web.Request) -> web.Response:
+        operation = "place.textsearch" if request.path.endswith("textsearch/json") else "place.nearbysearch"
+        if not await self._call("google_maps", operation):
+            return self._maps_error()
+
+        query = request.query.get("query", "")
+        lat, lng = _locate(request.query.get("location") or query)
+        search_type = request.query.get("type", "")
+
+        results = []
+        for index in range(20):
+            number = _digest(lat, lng, search_type, query, index)
+            place_types = [PLACE_TYPES[(number + index) % len(PLACE_TYPES)], "point_of_interest", "establishment"]
+            if search_type:
+                place_types.insert(0, search_type)
+            results.append({
+                "place_id": f"stub-{number:x}",
+                "name": f"{(search_type or place_types[0]).replace('_', ' ').title()} {index + 1}",
+                "rating": round(3.5 + (number % 16) / 10, 1),
+                "user_ratings_total": number % 5000,
+                "price_level": number % 5,
+                "vicinity": f"{index + 1} Stub Street",
+                "geometry": {"location": {"lat": lat + (number % 400 - 200) / 10000, "lng": lng + (number // 400 % 400 - 200) / 10000}},
+                "types": place_types
+            })
+
+        return web.json_response({"status": "OK", "results": results})
+
+    async def place_details(self, request: web.Request) -> web.Response:
+        if not await self._call("google_maps", "place.details"):
+            return self._maps_error()
+
+        place_id = request.query.get("placeid") or request.query.get("place_id", "")
+        number = _digest(place_id)
+        lat, lng = _locate(place_id)
+        return web.json_response({
+            "status": "OK",
+            "result": {
+                "place_id": place_id,
+                "name": f"Stub Place {number % 1000}",
+                "rating": round(3.5 + (number % 16) / 10, 1),
+                "price_level": number % 5,
+                "formatted_address": f"{number % 200} Stub Street",
+                "geometry": {"location": {"lat": lat, "lng": lng}},
+                "types": [PLACE_TYPES[number % len(PLACE_TYPES)], "point_of_interest", "establishment"],
+                "photos": [{"photo_reference": f"stub-photo-{number:x}-{index}", "width": 1600, "height": 1200} for index in range(5)],
+                "reviews": [
+                    {
+                        "author_name": f"Reviewer {index + 1}",
+                        "rating": 3 + (number + index) % 3,
+                        "text": "A lovely place to spend an afternoon. " * 12
+                    }
+                    for index in range(5)
+                ],
+                "opening_hours": {
+                    "weekday_text": [f"{day}: 9:00 AM – 6:00 PM" for day in
+                                     ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]]
+                }
+            }
+        })
+
+    async def directions(self, request: web.Request) -> web.Response:
+        if not await self._call("google_maps", "directions"):
+            return self._maps_error()
+
+        origin = request.query.get("origin", "")
+        destination = request.query.get("destination", "")
+        mode = request.query.get("mode", "driving")
+        start = _locate(origin)
+        end = _locate(destination)
+
+        distance_m = max(haversine_km(start[0], start[1], end[0], end[1]) * 1.3 * 1000, 50.0)
+        duration_s = distance_m / (MODE_SPEEDS_KMH.get(mode, 30.0) * 1000 / 3600)
+        points = np.linspace(start, end, 40)
+
+        steps = []
+        for index in range(8):
+            step_start = points[index * 5]
+            step_end = points[min(index * 5 + 5, len(points) - 1)]
+            steps.append({
+                "html_instructions": f"Continue on <b>Stub Street {index + 1}</b>",
+                "distance": {"text": f"{distance_m / 8000:.1f} km", "value": int(distance_m / 8)},
+                "duration": {"text": f"{max(1, round(duration_s / 480))} mins", "value": int(duration_s / 8)},
+                "start_location": {"lat": float(step_start[0]), "lng": float(step_start[1])},
+                "end_location": {"lat": float(step_end[0]), "lng": float(step_end[1])},
+                "polyline": {"points": encode_polyline(points[index * 5:index * 5 + 6])},
+                "travel_mode": mode.upper()
+            })
+
+        return web.json_response({
+            "status": "OK",
+            "geocoded_waypoints": [],
+            "routes": [{
+                "summary": "Stub Route",
+                "legs": [{
+                    "start_address": origin,
+                    "end_address": destination,
+                    "start_location": {"lat": start[0], "lng": start[1]},
+                    "end_location": {"lat": end[0], "lng": end[1]},
+                    "distance": {"text": f"{distance_m / 1000:.1f} km", "value": int(distance_m)},
+                    "duration": {"text": f"{max(1, round(duration_s / 60))} mins", "value": int(duration_s)},
+                    "steps": steps
+                }],
+                "overview_polyline": {"points": encode_polyline(points)}
+            }]
+        })
+
+    # Open-Meteo
+
+    async def forecast(self, request: web.Request) -> web.Response:
+        if not await self._call("open_meteo", "forecast"):
+            return self._server_error()
+
+        # Several locations in one request answer with one size-prefixed forecast after another
+        latitudes = [float(value) for value in request.query.getall("latitude", ["0"])]
+        longitudes = [float(value) for value in request.query.getall("longitude", ["0"])]
+        days = int(request.query.get("forecast_days", 7))
+        body = b"".join(build_forecast(lat, lng, days) for lat, lng in zip(latitudes, longitudes))
+        return web.Response(body=body, content_type="application/octet-stream")
+
+    # Amadeus
+
+    async def amadeus_token(self, request: web.Request) -> web.Response:
+        if not await self._call("amadeus", "token"):
+            return self._server_error()
+
+        return web.json_response({"type": "amadeusOAuth2Token", "access_token": "stub-token", "token_type": "Bearer", "expires_in": 1799})
+
+    async def flight_offers(self, request: web.Request) -> web.Response:
+        if not await self._call("amadeus", "flight_offers"):
+            return self._server_error()
+
+        origin = request.query.get("originLocationCode", "XXX")
+        destination = request.query.get("destinationLocationCode", "XXX")
+        departure_date = request.query.get("departureDate", "2026-01-01")
+        offers = []
+        for index in range(int(request.query.get("max", 10))):
+            number = _digest(origin, destination, departure_date, index)
+            hour = 6 + number % 16
+            flight_hours = 1 + number % 9
+            total = f"{80 + number % 900}.{number % 100:02d}"
+            offers.append({
+                "type": "flight-offer",
+                "id": str(index + 1),
+                "itineraries": [{
+                    "duration": f"PT{flight_hours}H{number % 60}M",
+                    "segments": [{
+                        "departure": {"iataCode": origin, "terminal": str(1 + number % 3), "at": f"{departure_date}T{hour:02d}:{number % 60:02d}:00"},
+                        "arrival": {"iataCode": destination, "at": f"{departure_date}T{(hour + flight_hours) % 24:02d}:{number % 60:02d}:00"},
+                        "carrierCode": ["AF", "LH", "BA", "AZ", "IB", "KL"][number % 6],
+                        "number": str(100 + number % 9000),
+                        "aircraft": {"code": ["320", "737", "787", "388"][number % 4]},
+                        "duration": f"PT{flight_hours}H{number % 60}M",
+                        "numberOfStops": 0
+                    }]
+                }],
+                "price": {"currency": "EUR", "total": total, "base": total, "grandTotal": total},
+                "travelerPricings": [{
+                    "travelerId": "1",
+                    "fareOption": "STANDARD",
+                    "travelerType": "ADULT",
+                    "price": {"currency": "EUR", "total": total, "base": total}
+                }]
+            })
+
+        return web.json_response({"meta": {"count": len(offers)}, "data": offers})
+
+    # Gemini
+
+    async def generate_content(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        contents = body.get("contents", [])
+        parts = contents[-1].get("parts", []) if contents else []
+        text = " ".join(part.get("text", "") for part in parts)
+
+        # Tell the four kinds of request the planner makes apart by their prompt
+        if any("functionResponse" in part for part in parts):
+            operation = "tool_results"
+        elif "Call the tools needed" in text:
+            operation = "select_tools"
+        elif "Analyze the user's travel prompt" in text:
+            operation = "analyze_prompt"
+        else:
+            operation = "plan_summary"
+
+        if not await self._call("gemini", operation):
+            return self._server_error()
+
+        if operation == "select_tools":
+            offered = [
+                declaration["name"]
+                for tool in body.get("tools", [])
+                for declaration in tool.get("functionDeclarations", tool.get("function_declarations", []))
+            ]
+            response_parts = [{"functionCall": call} for call in tool_calls(text) if call["name"] in offered]
+        elif operation == "analyze_prompt":
+            response_parts = [{"text": "```json\n" + json.dumps(analyze_prompt(text)) + "\n```"}]
+        elif operation == "tool_results":
+            response_parts = [{"text": "All the data for the plan is ready."}]
+        else:
+            response_parts = [{"text": summary_text(text)}]
+
+        return web.json_response({
+            "candidates": [{"content": {"role": "model", "parts": response_parts}, "finishReason": "STOP", "index": 0}]
+        })
+
+    # Bookkeeping
+
+    async def stats(self, request: web.Request) -> web.Response:
+        return web.json_response({"calls": self.calls, "errors": self.errors})
+
+    async def reset_stats(self, request: web.Request) -> web.Response:
+        self.reset()
+        return web.json_response({"status": "reset"})
+
+def analyze_prompt(text: str) -> Dict[str, Any]:
+    """Trip details for the prompt at the end of the planner's analysis request"""
+
+    prompt = text.rsplit("User prompt:", 1)[-1].lower()
+
+    destination = next((city.title() for city in CITY_COORDINATES if city in prompt), "Rome")
+    duration_match = re.search(r"(\d+)[- ]day", prompt)
+    duration = int(duration_match.group(1)) if duration_match else 3
+
+    date_match = re.search(r"\d{4}-\d{2}-\d{2}", prompt)
+    start = datetime.strptime(date_match.group(0), "%Y-%m-%d").date() if date_match else date.today() + timedelta(days=30)
+    end = start + timedelta(days=duration - 1)
+
+    budget = "moderate"
+    if "cheap" in prompt or "budget" in prompt:
+        budget = "cheap"
+    elif "luxury" in prompt:
+        budget = "luxury"
+
+    return {
+        "destination": destination,
+        "duration": duration,
+        "dates": f"{start.isoformat()} to {end.isoformat()}",
+        "budget": budget,
+        "interests": [interest for interest in INTERESTS if interest in prompt] or ["historical", "cultural"],
+        "requirements": []
+    }
+
+def tool_calls(text: str) -> List[Dict[str, Any]]:
+    """One call to every tool, built from the trip details in the tool-selection prompt"""
+
+    match = re.search(r"Trip details: (\{.*\})", text)
+    trip_details = json.loads(match.group(1)) if match else {}
+    destination = trip_details.get("destination", "Rome")
+    dates = trip_details.get("dates", "")
+    departure = re.search(r"\d{4}-\d{2}-\d{2}", dates)
+
+    return [
+        {"name": "search_hotels", "args": {"location": destination, "budget": trip_details.get("budget", "moderate")}},
+        {"name": "get_weather", "args": {"location": destination, "start_date": dates, "end_date": dates}},
+        {"name": "get_attractions", "args": {"location": destination, "interests": ",".join(trip_details.get("interests", []))}},
+        {"name": "get_flights", "args": {
+            "origin": "Paris" if destination.lower() == "london" else "London",
+            "destination": destination,
+            "departure_date": departure.group(0) if departure else dates
+        }},
+        {"name": "get_routes", "args": {"start_location": destination, "end_location": destination}}
+    ]
+
+def summary_text(text: str) -> str:
+    """A plan summary about as long as a real one"""
+
+    request_line = text.split("User Request:", 1)[-1].strip().split("\n", 1)[0]
+    sections = ["Summary", "Where to stay", "Itinerary", "Weather", "Getting there", "Practical tips"]
+    return f"# Your trip\n\n_{request_line}_\n\n" + "\n\n".join(
+        f"## {section}\n\n" + "This part of the plan covers the details travellers ask about most. " * 8
+        for section in sections
+    )
+
+def _variable(builder: flatbuffers.Builder, value: float = None, values: List[float] = None) -> int:
+    """A VariableWithValues table holding either one value (current) or a series (daily)"""
+
+    values_offset = None
+    if values is not None:
+        builder.StartVector(4, len(values), 4)
+        for item in reversed(values):
+            builder.PrependFloat32(item)
+        values_offset = builder.EndVector()
+
+    builder.StartObject(4)
+    if value is not None:
+        builder.PrependFloat32Slot(2, value, 0.0)
+    if values_offset is not None:
+        builder.PrependUOffsetTRelativeSlot(3, values_offset, 0)
+    return builder.EndObject()
+
+def _variables_with_time(builder: flatbuffers.Builder, start: int, end: int, interval: int, variables: List[int]) -> int:
+    builder.StartVector(4, len(variables), 4)
+    for variable in reversed(variables):
+        builder.PrependUOffsetTRelative(variable)
+    variables_offset = builder.EndVector()
+
+    builder.StartObject(4)
+    builder.PrependInt64Slot(0, start, 0)
+    builder.PrependInt64Slot(1, end, 0)
+    builder.PrependInt32Slot(2, interval, 0)
+    builder.PrependUOffsetTRelativeSlot(3, variables_offset, 0)
+    return builder.EndObject()
+
+def build_forecast(lat: float, lng: float, days: int) -> bytes:
+    """A size-prefixed WeatherApiResponse flatbuffer, as Open-Meteo sends for format=flatbuffers
+
+    Variables are in the order WeatherService requests them: current temperature, humidity,
+    wind and weather code; daily weather code, max/min/mean temperature, humidity and wind.
+    """
+
+    builder = flatbuffers.Builder(1024)
+    today = int(time.time()) // 86400 * 86400
+    base_temperature = 25 - abs(lat) / 3
+
+    current = _variables_with_time(builder, int(time.time()), int(time.time()) + 900, 900, [
+        _variable(builder, value=base_temperature),
+        _variable(builder, value=60.0),
+        _variable(builder, value=12.0),
+        _variable(builder, value=float([0, 1, 2, 3, 61][int(abs(lng)) % 5]))
+    ])
+
+    day_numbers = range(days)
+    daily = _variables_with_time(builder, today, today + days * 86400, 86400, [
+        _variable(builder, values=[float([0, 1, 2, 3, 61, 80][(day + int(abs(lng))) % 6]) for day in day_numbers]),
+        _variable(builder, values=[base_temperature + 4 + math.sin(day) * 3 for day in day_numbers]),
+        _variable(builder, values=[base_temperature - 4 + math.sin(day) * 3 for day in day_numbers]),
+        _variable(builder, values=[base_temperature + math.sin(day) * 3 for day in day_numbers]),
+        _variable(builder, values=[55.0 + day % 4 * 5 for day in day_numbers]),
+        _variable(builder, values=[10.0 + day % 3 * 4 for day in day_numbers])
+    ])
+    timezone = builder.CreateString("GMT")
+
+    builder.StartObject(15)
+    builder.PrependFloat32Slot(0, lat, 0.0)
+    builder.PrependFloat32Slot(1, lng, 0.0)
+    builder.PrependUOffsetTRelativeSlot(7, timezone, 0)
+    builder.PrependUOffsetTRelativeSlot(9, current, 0)
+    builder.PrependUOffsetTRelativeSlot(10, daily, 0)
+    builder.Finish(builder.EndObject())
+
+    payload = bytes(builder.Output())
+    return struct.pack("<I", len(payload)) + payload
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve stub Google Maps, Open-Meteo, Amadeus and Gemini APIs")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency", default="", help='Seconds per call: "0.1" or "gemini=1.5,amadeus=0.2"')
+    parser.add_argument("--error-rate", default="", help='Share of failing calls: "0.05" or "amadeus=0.1"')
+    parser.add_argument("--jitter", type=float, default=0.5, help="Latency varies by up to this fraction either way")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    stubs = StubUpstreams(
+        parse_upstream_values(args.latency, DEFAULT_LATENCY),
+        parse_upstream_values(args.error_rate, {upstream: 0.0 for upstream in UPSTREAMS}),
+        jitter=args.jitter,
+        seed=args.seed
+    )
+    print(f"Stub upstreams listening on http://{args.host}:{args.port}", flush=True)
+    web.run_app(stubs.make_app(), host=args.host, port=args.port, print=None, access_log=None)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""Microbenchmarks for the CPU-bound transforms that run on every plan
+
+Each case times one transform on synthetic inputs larger than a typical plan (hundreds of
+offers and places, 16-day forecasts), pytest-benchmark style: the iteration count is
+calibrated per case, then several rounds are timed and summarised. Save a run with --json
+and pass it to --compare later to catch regressions.
+
+Run from the backend directory:
+    python -m benchmarks.transforms [--only weather] [--scale 2] [--json before.json]
+    python -m benchmarks.transforms --compare before.json [--threshold 0.15]
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import time
+from typing import Dict, Any, Callable, List, Tuple
+
+from openmeteo_sdk.WeatherApiResponse import WeatherApiResponse
+
+from tools.attractions import AttractionsService
+from tools.flights import FlightsService
+from tools.gemini_client import dump_prompt_data
+from tools.place_details import format_reviews
+from tools.records import compact_section
+from tools.weather import WeatherService
+from benchmarks.payloads import make_amadeus_response, make_attractions, make_place_reviews, make_trip_plan
+from benchmarks.stubs import build_forecast
+
+def bench(func: Callable[[], Any], rounds: int, round_time: float) -> Dict[str, float]:
+    """Per-call timings in microseconds over `rounds` rounds of roughly `round_time` seconds each"""
+
+    # Calibrate so every round runs long enough to be measured reliably
+    start = time.perf_counter()
+    func()
+    single = max(time.perf_counter() - start, 1e-7)
+    iterations = max(1, int(round_time / single))
+
+    per_call = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            func()
+        per_call.append((time.perf_counter() - start) * 1e6 / iterations)
+
+    return {
+        "min_us": min(per_call),
+        "median_us": statistics.median(per_call),
+        "mean_us": statistics.mean(per_call),
+        "stddev_us": statistics.stdev(per_call) if len(per_call) > 1 else 0.0,
+        "iterations": iterations,
+        "rounds": rounds
+    }
+
+def build_cases(scale: int) -> List[Tuple[str, Callable[[], Any]]]:
+    flights_service = FlightsService()
+    weather_service = WeatherService()
+    attractions_service = AttractionsService()
+
+    amadeus_response = make_amadeus_response(250 * scale)
+
+    # The same size-prefixed flatbuffer the Open-Meteo client parses
+    forecast_buffer = build_forecast(41.9, 12.5, 16)
+    daily = WeatherApiResponse.GetRootAs(forecast_buffer, 4).Daily()
+    forecasts = [weather_service._build_forecast(daily, 16)] * (10 * scale)
+
+    place_reviews = [make_place_reviews() for _ in range(300 * scale)]
+
+    # Half of the places are repeats, as when several searches return the same landmarks
+    places = make_attractions(300 * scale)
+    places = places + [dict(place) for place in places]
+
+    trip_plan = make_trip_plan(attractions=15 * scale)
+    tool_results = {
+        "trip_details": {key: trip_plan[key] for key in ("destination", "duration", "dates")},
+        **{section: trip_plan[section] for section in ("hotels", "attractions", "weather", "flights", "routes")}
+    }
+    record_results = {
+        "trip_details": tool_results["trip_details"],
+        **{section: compact_section(section, value) for section, value in tool_results.items() if section != "trip_details"}
+    }
+
+    return [
+        (f"flights.process_amadeus[{250 * scale} offers]", lambda: flights_service._process_amadeus_flights(amadeus_response)),
+        ("weather.build_forecast[16 days]", lambda: weather_service._build_forecast(daily, 16)),
+        (f"weather.recommendations[{10 * scale}x16 days]",
+         lambda: [weather_service._generate_recommendations(forecast) for forecast in forecasts]),
+        (f"places.format_reviews[{300 * scale} places]", lambda: [format_reviews(reviews) for reviews in place_reviews]),
+        (f"attractions.remove_duplicates[{len(places)} places]", lambda: attractions_service._remove_duplicates(places)),
+        ("gemini.prompt_dumps[dicts]", lambda: dump_prompt_data(tool_results)),
+        ("gemini.prompt_dumps[records]", lambda: dump_prompt_data(record_results))
+    ]
+
+def compare(results: Dict[str, Dict[str, float]], baseline_path: str, threshold: float) -> List[str]:
+    """Cases whose median got slower than the baseline by more than `threshold`"""
+
+    with open(baseline_path) as f:
+        baseline = json.load(f)["cases"]
+
+    regressions = []
+    for name, stats in results.items():
+        if name not in baseline:
+            continue
+        before = baseline[name]["median_us"]
+        change = stats["median_us"] / before - 1
+        marker = "  REGRESSION" if change > threshold else ""
+        print(f"{name:<48}{before:>12.1f} -> {stats['median_us']:>10.1f} us  ({change:+.0%}){marker}")
+        if change > threshold:
+            regressions.append(name)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmark the per-request data transforms")
+    parser.add_argument("--only", default="", help="Only run cases whose name contains this")
+    parser.add_argument("--scale", type=int, default=1, help="Multiply the synthetic input sizes")
+    parser.add_argument("--rounds", type=int, default=7)
+    parser.add_argument("--round-time", type=float, default=0.1, help="Target seconds per round")
+    parser.add_argument("--json", help="Write the results to this file")
+    parser.add_argument("--compare", help="Results file from an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Slowdown that counts as a regression")
+    args = parser.parse_args()
+
+    results = {}
+    print(f"{'case':<48}{'min':>10}{'median':>10}{'stddev':>10}  (us/call)")
+    for name, func in build_cases(args.scale):
+        if args.only not in name:
+            continue
+        stats = bench(func, args.rounds, args.round_time)
+        results[name] = stats
+        print(f"{name:<48}{stats['min_us']:>10.1f}{stats['median_us']:>10.1f}{stats['stddev_us']:>10.1f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"python": sys.version.split()[0], "scale": args.scale, "cases": results}, f, indent=2)
+        print(f"Results written to {args.json}")
+
+    if args.compare:
+        print()
+        regressions = compare(results, args.compare, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} case(s) slower than {args.compare} by more than {args.threshold:.0%}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,54 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Header
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, ORJSONResponse, PlainTextResponse
 from pydantic import BaseModel
 from dotenv import load_dotenv
+from typing import List, Optional
+import asyncio
+import hmac
+import json
 import os
-import uvicorn
+import orjson
+import uuid
+from functools import partial
 
 from tools.gemini_client import GeminiClient
 from tools.trip_planner import TripPlanner
+from tools.job_queue import JobQueue
+from tools.place_details import PlaceDetailsService
+from tools.pagination import PlacesPaginator
+from tools.records import record_default
+from tools.fieldsets import parse_fields, prune_plan
+from tools.compression import CompressionMiddleware
+from tools.metrics import ServerTimingMiddleware, monitor_event_loop_lag, render_metrics, track_stage
+from tools.profiling import BlockingDetector, RequestProfiler
+from tools.circuit_breaker import OPEN, circuit_states
+from tools.admission import AdmissionController, OverloadedError, PRIORITIES
 
 # Load environment variables
 load_dotenv()
 
+# Batch planning limits
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", 8))
+MAX_BATCH_CONCURRENCY = int(os.getenv("MAX_BATCH_CONCURRENCY", 32))
+MAX_BATCH_PROMPTS = int(os.getenv("MAX_BATCH_PROMPTS", 500))
+
+# Planner output is trusted, so production skips re-validating it against TripResponse
+# and serializes it straight to JSON; development and test runs keep the validation
+VALIDATE_RESPONSES = os.getenv(
+    "VALIDATE_RESPONSES", "false" if os.getenv("APP_ENV", "development") == "production" else "true"
+).lower() == "true"
+
+# How often the event-loop lag monitor wakes up (seconds)
+EVENT_LOOP_LAG_INTERVAL = float(os.getenv("EVENT_LOOP_LAG_INTERVAL", 0.1))
+
+# Debug mode: log a stack sample whenever a callback blocks the event loop for too long
+LOOP_BLOCK_DETECTOR = os.getenv("LOOP_BLOCK_DETECTOR", "false").lower() == "true"
+
+# Admin endpoints (/admin/...) are disabled unless a token is configured
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+MAX_PROFILE_REQUESTS = 100
+
 app = FastAPI(title="Smart Travel Planner API", version="1.0.0")
 
 # Configure CORS
@@ -22,13 +60,35 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress responses above COMPRESSION_MIN_SIZE bytes (brotli when installed, otherwise gzip)
+app.add_middleware(CompressionMiddleware, minimum_size=int(os.getenv("COMPRESSION_MIN_SIZE", 1024)))
+
+# Per-request stage breakdown in a Server-Timing header
+app.add_middleware(ServerTimingMiddleware)
+
 # Initialize services
 gemini_client = GeminiClient()
 trip_planner = TripPlanner()
+job_queue = JobQueue()
+place_details_service = PlaceDetailsService()
+paginator = PlacesPaginator(trip_planner.hotels_service, trip_planner.attractions_service, trip_planner.geocoding_service)
+admission = AdmissionController()
+blocking_detector = BlockingDetector()
+request_profiler = RequestProfiler()
+
+class PlanResponse(ORJSONResponse):
+    """orjson response that also serializes the compact records the services return"""
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, default=record_default)
 
 class TripRequest(BaseModel):
     prompt: str
 
+class BatchTripRequest(BaseModel):
+    prompts: List[str]
+    concurrency: Optional[int] = None
+
 class TripResponse(BaseModel):
     destination: str
     duration: int
@@ -39,28 +99,226 @@ class TripResponse(BaseModel):
     flights: list
     routes: list
     summary: str
+    session_id: Optional[str] = None
+    legs: Optional[list] = None
+
+async def plan_queued_trip(prompt: str) -> dict:
+    # Queued jobs take a low-priority planning slot, so interactive plans go first
+    async with admission.admit(PRIORITIES["low"], patient=True) as degraded:
+        return await trip_planner.plan_trip(prompt, degraded=degraded)
+
+@app.on_event("startup")
+async def start_background_workers():
+    await job_queue.start(plan_queued_trip)
+    await trip_planner.prewarmer.start()
+    app.state.lag_monitor = asyncio.create_task(monitor_event_loop_lag(EVENT_LOOP_LAG_INTERVAL))
+    if LOOP_BLOCK_DETECTOR:
+        await blocking_detector.start()
+
+@app.on_event("shutdown")
+async def stop_background_workers():
+    app.state.lag_monitor.cancel()
+    await blocking_detector.stop()
+    await trip_planner.prewarmer.stop()
+    await job_queue.stop()
 
 @app.get("/")
 async def root():
     return {"message": "Smart Travel Planner API is running!"}
 
+def plan_response(trip_plan: dict, fieldset: Optional[dict], degraded: bool):
+    """Validate (outside production), prune to the requested fields and serialize a plan"""
+
+    headers = {"X-Degraded": "true"} if degraded else {}
+    if VALIDATE_RESPONSES:
+        # Checks the plan's shape in place; records inside the sections are left as they are
+        TripResponse.model_validate(trip_plan)
+    if fieldset:
+        trip_plan = prune_plan(trip_plan, fieldset)
+    # Returning a Response skips FastAPI's response_model validation and encoding
+    return PlanResponse(trip_plan, headers=headers)
+
 @app.post("/plan-trip", response_model=TripResponse)
-async def plan_trip(request: TripRequest):
+async def plan_trip(
+    request: TripRequest,
+    fields: Optional[str] = None,
+    session: bool = False,
+    x_request_priority: str = Header("normal")
+):
+    # fields=hotels.name,weather.forecast returns (and only fetches) the listed parts of the plan
+    # session=true keeps the plan so it can be refined with /plan-trip/{session_id}/replan
+    fieldset = None
+    if fields:
+        try:
+            fieldset = parse_fields(fields)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    if x_request_priority not in PRIORITIES:
+        raise HTTPException(status_code=400, detail=f"X-Request-Priority must be one of {', '.join(PRIORITIES)}")
+
+    try:
+        # Wait briefly for one of the bounded planning slots; when the queue is deep the plan is degraded
+        async with admission.admit(PRIORITIES[x_request_priority]) as degraded:
+            # Use Gemini to analyze the prompt and plan the trip
+            with request_profiler.request(), track_stage("plan_trip"):
+                trip_plan = await trip_planner.plan_trip(
+                    request.prompt, wanted_sections=list(fieldset) if fieldset else None, degraded=degraded,
+                    session_id=uuid.uuid4().hex if session else None
+                )
+        return plan_response(trip_plan, fieldset, degraded)
+    except OverloadedError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/plan-trip/{session_id}/replan", response_model=TripResponse)
+async def replan_trip(
+    session_id: str,
+    request: TripRequest,
+    fields: Optional[str] = None,
+    x_request_priority: str = Header("normal")
+):
+    # Refine an earlier plan ("same trip but luxury hotels"); only the tools the change affects run again
+    fieldset = None
+    if fields:
+        try:
+            fieldset = parse_fields(fields)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    if x_request_priority not in PRIORITIES:
+        raise HTTPException(status_code=400, detail=f"X-Request-Priority must be one of {', '.join(PRIORITIES)}")
+
     try:
-        # Use Gemini to analyze the prompt and plan the trip
-        trip_plan = await trip_planner.plan_trip(request.prompt)
-        return TripResponse(**trip_plan)
+        async with admission.admit(PRIORITIES[x_request_priority]) as degraded:
+            with request_profiler.request(), track_stage("replan_trip"):
+                trip_plan = await trip_planner.replan_trip(session_id, request.prompt, degraded=degraded)
+    except OverloadedError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+    if trip_plan is None:
+        raise HTTPException(status_code=404, detail="Plan session not found or expired")
+    return plan_response(trip_plan, fieldset, degraded)
+
+@app.post("/plan-trips")
+async def plan_trips(request: BatchTripRequest):
+    if not request.prompts:
+        raise HTTPException(status_code=400, detail="At least one prompt is required")
+    if len(request.prompts) > MAX_BATCH_PROMPTS:
+        raise HTTPException(status_code=400, detail=f"A batch can contain at most {MAX_BATCH_PROMPTS} prompts")
+
+    concurrency = max(1, min(request.concurrency or BATCH_CONCURRENCY, MAX_BATCH_CONCURRENCY))
+
+    async def stream_plans():
+        # One JSON object per line, in the order the plans finish
+        # Every plan in the batch takes a low-priority planning slot like any other plan
+        admit = partial(admission.admit, PRIORITIES["low"], patient=True)
+        async for item in trip_planner.plan_trips(request.prompts, concurrency, admit=admit):
+            yield orjson.dumps(item, default=record_default) + b"\n"
+
+    return StreamingResponse(stream_plans(), media_type="application/x-ndjson")
+
+@app.post("/plan-trip/jobs", status_code=202)
+async def create_plan_trip_job(request: TripRequest):
+    return await job_queue.enqueue(request.prompt)
+
+@app.get("/plan-trip/jobs/{job_id}")
+async def get_plan_trip_job(job_id: str, stream: bool = False, timeout: float = 60):
+    job = await job_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    if not stream:
+        return job
+
+    async def stream_job():
+        # One JSON object per status change, ending with the finished job
+        async for update in job_queue.watch(job_id, timeout=min(timeout, 300)):
+            yield json.dumps(update) + "\n"
+
+    return StreamingResponse(stream_job(), media_type="application/x-ndjson")
+
+@app.get("/places/{place_id}")
+async def get_place_details(place_id: str):
+    # Reviews, photos and opening hours are loaded lazily when a card is expanded
+    details = await place_details_service.get_place_details(place_id)
+    if not details:
+        raise HTTPException(status_code=404, detail="Place not found")
+    return details
+
+@app.get("/routes/steps/{steps_id}")
+async def get_route_steps(steps_id: str):
+    # Turn-by-turn steps are loaded lazily when ROUTE_STEP_DETAIL=lazy
+    steps = await trip_planner.routes_service.get_route_steps(steps_id)
+    if steps is None:
+        raise HTTPException(status_code=404, detail="Route steps not found")
+    return steps
+
+@app.get("/hotels")
+async def list_hotels(location: Optional[str] = None, budget: str = "moderate", cursor: Optional[str] = None):
+    # "Show more" pages through the upstream results instead of re-running the whole plan
+    if cursor:
+        page = await paginator.next_page(cursor)
+        if page is None:
+            raise HTTPException(status_code=410, detail="Cursor expired")
+        return PlanResponse(page)
+
+    if not location:
+        raise HTTPException(status_code=400, detail="location or cursor is required")
+    return PlanResponse(await paginator.first_page("hotels", location, budget=budget))
+
+@app.get("/attractions")
+async def list_attractions(location: Optional[str] = None, interests: str = "", cursor: Optional[str] = None):
+    if cursor:
+        page = await paginator.next_page(cursor)
+        if page is None:
+            raise HTTPException(status_code=410, detail="Cursor expired")
+        return PlanResponse(page)
+
+    if not location:
+        raise HTTPException(status_code=400, detail="location or cursor is required")
+    interest_list = [interest.strip() for interest in interests.split(",") if interest.strip()]
+    return PlanResponse(await paginator.first_page("attractions", location, interests=interest_list))
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    # Prometheus text format; each worker process reports its own numbers
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+def check_admin_token(token: Optional[str]):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not token or not hmac.compare_digest(token, ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+@app.post("/admin/profile", response_class=PlainTextResponse)
+async def profile_plan_requests(requests: int = 10, timeout: float = 120, x_admin_token: Optional[str] = Header(None)):
+    # Collapsed stacks of the next N /plan-trip requests, ready for flamegraph.pl or speedscope
+    check_admin_token(x_admin_token)
+    if not 1 <= requests <= MAX_PROFILE_REQUESTS:
+        raise HTTPException(status_code=400, detail=f"requests must be between 1 and {MAX_PROFILE_REQUESTS}")
+
+    try:
+        profile = await request_profiler.profile(requests, timeout=min(timeout, 600))
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    return PlainTextResponse(profile["folded"], headers={
+        "X-Profiled-Requests": str(profile["requests"]),
+        "X-Profile-Samples": str(profile["samples"])
+    })
+
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy"}
+    # Open circuits mean some sections are served from stale cache or mock data
+    circuits = circuit_states()
+    degraded = any(circuit["state"] == OPEN for circuit in circuits.values())
+    return {"status": "degraded" if degraded else "healthy", "circuits": circuits, "admission": admission.snapshot()}
 
 if __name__ == "__main__":
-    uvicorn.run(
-        "main:app",
-        host=os.getenv("HOST", "localhost"),
-        port=int(os.getenv("PORT", 8000)),
-        reload=True
-    )
+    # Development reload and the multi-worker production mode both live in start.py
+    from start import main as start_server
+    start_server()
@@ -1,20 +1,81 @@
 #!/usr/bin/env python3
 """
 Start script for Smart Travel Planner Backend
+
+Development (default):  python start.py
+Production:             python start.py --prod --workers 4   (or APP_ENV=production)
 """
 
+import argparse
 import os
 import sys
 import uvicorn
+from dotenv import load_dotenv
 from pathlib import Path
 
+def _module_available(name: str) -> bool:
+    try:
+        __import__(name)
+        return True
+    except ImportError:
+        return False
+
+def run_dev(host: str, port: int):
+    """Single process with auto-reload for local development"""
+
+    uvicorn.run(
+        "main:app",
+        host=host,
+        port=port,
+        reload=True,
+        log_level="info"
+    )
+
+def run_production(host: str, port: int, workers: int, graceful_timeout: int):
+    """Multiple worker processes without the reload file watcher"""
+
+    if _module_available("gunicorn"):
+        # Gunicorn imports the app once in the master (preload) and forks the workers,
+        # so module-level setup is shared copy-on-write and caches live in CACHE_DIR on disk
+        from gunicorn.app.base import BaseApplication
+
+        class TravelPlannerApplication(BaseApplication):
+            def load_config(self):
+                self.cfg.set("bind", f"{host}:{port}")
+                self.cfg.set("workers", workers)
+                self.cfg.set("worker_class", "uvicorn.workers.UvicornWorker")
+                self.cfg.set("preload_app", True)
+                self.cfg.set("graceful_timeout", graceful_timeout)
+                self.cfg.set("timeout", int(os.getenv("WORKER_TIMEOUT", 120)))
+                self.cfg.set("keepalive", 5)
+
+            def load(self):
+                from main import app
+                return app
+
+        TravelPlannerApplication().run()
+        return
+
+    # Gunicorn is not available on Windows, fall back to uvicorn's own process manager
+    uvicorn.run(
+        "main:app",
+        host=host,
+        port=port,
+        workers=workers,
+        loop="uvloop" if _module_available("uvloop") else "asyncio",
+        http="httptools" if _module_available("httptools") else "h11",
+        timeout_graceful_shutdown=graceful_timeout,
+        log_level="info"
+    )
+
 def main():
     """Start the FastAPI server"""
-    
+
     # Add the backend directory to Python path
     backend_dir = Path(__file__).parent
     sys.path.insert(0, str(backend_dir))
-    
+    os.chdir(backend_dir)
+
     # Check if .env file exists
     env_file = backend_dir / ".env"
     if not env_file.exists():
@@ -22,24 +83,35 @@ def main():
         print("📝 Please copy env.example to .env and add your API keys")
         print("   cp env.example .env")
         print()
-    
+    load_dotenv(env_file)
+
+    parser = argparse.ArgumentParser(description="Smart Travel Planner Backend")
+    parser.add_argument("--prod", action="store_true", help="run in production mode (multiple workers, no reload)")
+    parser.add_argument("--workers", type=int, help="number of worker processes in production mode")
+    args = parser.parse_args()
+
     # Get configuration from environment
     host = os.getenv("HOST", "localhost")
     port = int(os.getenv("PORT", 8000))
-    
-    print("🚀 Starting Smart Travel Planner Backend...")
+    production = args.prod or os.getenv("APP_ENV", "development") == "production"
+    workers = args.workers or int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1))
+    graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", 30))
+
+    if production:
+        # Worker processes read APP_ENV too (e.g. to skip response validation)
+        os.environ["APP_ENV"] = "production"
+        print(f"🚀 Starting Smart Travel Planner Backend (production, {workers} workers)...")
+    else:
+        print("🚀 Starting Smart Travel Planner Backend...")
     print(f"📍 Server will be available at: http://{host}:{port}")
     print("🛑 Press Ctrl+C to stop the server")
     print()
-    
+
     try:
-        uvicorn.run(
-            "main:app",
-            host=host,
-            port=port,
-            reload=True,
-            log_level="info"
-        )
+        if production:
+            run_production(host, port, workers, graceful_timeout)
+        else:
+            run_dev(host, port)
     except KeyboardInterrupt:
         print("\n👋 Server stopped. Goodbye!")
     except Exception as e:
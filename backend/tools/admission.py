@@ -0,0 +1,126 @@
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Any, AsyncIterator, List, Optional, Tuple
+from .metrics import PLAN_ADMISSIONS, PLAN_QUEUE_DEPTH, PLAN_QUEUE_WAIT
+
+# X-Request-Priority values; lower is served first
+PRIORITIES = {"high": 0, "normal": 1, "low": 2}
+
+class OverloadedError(Exception):
+    """Raised when a plan can't be admitted; retry_after is a suggested wait in seconds"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class AdmissionController:
+    """Bounds concurrent plans, queueing a few more by priority for a short time
+
+    Up to max_in_flight plans run at once. Further requests wait in a priority queue of at
+    most max_queue entries for up to queue_timeout seconds; a full queue turns away the
+    lowest-priority request. Plans admitted while degraded_depth or more requests are
+    waiting run in degraded mode (cached or mock sections, no LLM summary).
+    """
+
+    def __init__(self, max_in_flight: int = None, max_queue: int = None, queue_timeout: float = None, degraded_depth: int = None):
+        self.max_in_flight = max_in_flight or int(os.getenv("MAX_IN_FLIGHT_PLANS", 16))
+        self.max_queue = max_queue if max_queue is not None else int(os.getenv("PLAN_QUEUE_SIZE", 32))
+        self.queue_timeout = queue_timeout or float(os.getenv("PLAN_QUEUE_TIMEOUT_MS", 2000)) / 1000
+        self.degraded_depth = degraded_depth or int(os.getenv("DEGRADED_QUEUE_DEPTH", 8))
+
+        self._in_flight = 0
+        # (priority, arrival order, future resolved with the degraded flag once a slot is handed over)
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._arrivals = itertools.count()
+        # Smoothed plan duration, for Retry-After
+        self._plan_seconds = 5.0
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"in_flight": self._in_flight, "queued": len(self._waiters), "max_in_flight": self.max_in_flight}
+
+    def retry_after(self) -> int:
+        """Seconds until the queue has likely drained"""
+
+        return max(1, math.ceil(self._plan_seconds * (len(self._waiters) + 1) / self.max_in_flight))
+
+    @asynccontextmanager
+    async def admit(self, priority: int = PRIORITIES["normal"], patient: bool = False) -> AsyncIterator[bool]:
+        """Hold a plan slot for the body; yields True when the plan should run degraded
+
+        Patient callers (batch plans, queued jobs) wait as long as it takes instead of
+        timing out; when a busier moment turns them away they wait out Retry-After and
+        queue again.
+        """
+
+        degraded = await (self._acquire_patiently(priority) if patient else self._acquire(priority, self.queue_timeout))
+        PLAN_ADMISSIONS.inc(outcome="degraded" if degraded else "admitted")
+        start = time.perf_counter()
+        try:
+            yield degraded
+        finally:
+            if not degraded:
+                # Degraded plans are unusually fast and would skew the estimate
+                self._plan_seconds = 0.8 * self._plan_seconds + 0.2 * (time.perf_counter() - start)
+            self._release()
+
+    async def _acquire_patiently(self, priority: int) -> bool:
+        while True:
+            try:
+                return await self._acquire(priority, None)
+            except OverloadedError as e:
+                await asyncio.sleep(e.retry_after)
+
+    async def _acquire(self, priority: int, timeout: Optional[float]) -> bool:
+        if self._in_flight < self.max_in_flight and not self._waiters:
+            self._in_flight += 1
+            return False
+
+        if len(self._waiters) >= self.max_queue:
+            worst = max(self._waiters) if self._waiters else None
+            if worst is None or worst[0] <= priority:
+                PLAN_ADMISSIONS.inc(outcome="rejected")
+                raise OverloadedError("Too many trip plans in progress", self.retry_after())
+            # Make room by turning away the newest of the lowest-priority waiters
+            self._remove(worst)
+            PLAN_ADMISSIONS.inc(outcome="evicted")
+            worst[2].set_exception(OverloadedError("Too many trip plans in progress", self.retry_after()))
+
+        entry = (priority, next(self._arrivals), asyncio.get_running_loop().create_future())
+        heapq.heappush(self._waiters, entry)
+        PLAN_QUEUE_DEPTH.inc()
+        start = time.perf_counter()
+        try:
+            return await asyncio.wait_for(entry[2], timeout)
+        except asyncio.TimeoutError:
+            PLAN_ADMISSIONS.inc(outcome="timed_out")
+            raise OverloadedError("Timed out waiting for a planning slot", self.retry_after())
+        except asyncio.CancelledError:
+            # The client went away just as a slot was handed over; pass it on
+            if entry[2].done() and not entry[2].cancelled() and entry[2].exception() is None:
+                self._release()
+            raise
+        finally:
+            # Still queued unless a slot was handed over or it was evicted
+            if entry in self._waiters:
+                self._remove(entry)
+            PLAN_QUEUE_WAIT.observe(time.perf_counter() - start)
+
+    def _remove(self, entry: Tuple[int, int, asyncio.Future]):
+        self._waiters.remove(entry)
+        heapq.heapify(self._waiters)
+        PLAN_QUEUE_DEPTH.dec()
+
+    def _release(self):
+        # Hand the slot straight to the best waiter so arrivals can't jump the queue
+        while self._waiters:
+            entry = heapq.heappop(self._waiters)
+            PLAN_QUEUE_DEPTH.dec()
+            if not entry[2].done():
+                entry[2].set_result(len(self._waiters) >= self.degraded_depth)
+                return
+        self._in_flight -= 1
@@ -1,93 +1,270 @@
 import os
-import googlemaps
-from typing import List, Dict, Any
+import time
+from functools import partial
+from typing import List, Dict, Any, AsyncIterator, Callable
 import json
+from .cache import TieredCache, cache_key
+from .records import Attraction, compact_section
+from .spatial_index import place_index
+from .place_details import PlaceDetailsService, basic_place, fetch_next_page, PAGE_TOKEN_DELAY
+from .maps_client import create_maps_client
+from .metrics import record_fallback
+
+# Radius of the attraction searches
+ATTRACTION_SEARCH_RADIUS_KM = 10
 
 class AttractionsService:
     def __init__(self):
-        api_key = os.getenv("GOOGLE_MAPS_API_KEY")
-        if api_key:
-            self.gmaps = googlemaps.Client(key=api_key)
-        else:
-            self.gmaps = None
+        self.gmaps = create_maps_client()
+
+        # Search results are shared by every server worker through the on-disk tier
+        self.cache = TieredCache("attractions", ttl=float(os.getenv("PLACES_CACHE_TTL", 21600)), decode=partial(compact_section, "attractions"))
+        self.place_details = PlaceDetailsService()
+        # "basic" lists attractions straight from the search results; "full" also fetches reviews, photos and hours
+        self.detail_level = os.getenv("PLACES_DETAIL_LEVEL", "basic")
+
+    async def get_attractions(self, location: str, interests: List[str] = None, coordinates: Dict[str, float] = None, detail_level: str = None) -> List[Dict[str, Any]]:
+        """Get popular attractions and tourist spots in a location
 
-    async def get_attractions(self, location: str, interests: List[str] = None) -> List[Dict[str, Any]]:
-        """Get popular attractions and tourist spots in a location"""
+        Pass the destination's resolved coordinates ({"lat", "lng"}) to anchor the
+        searches without geocoding the location text again. In "basic" detail level
+        reviews, photos and opening hours are left empty; fetch them per attraction
+        from PlaceDetailsService.
+        """
+        
+        detail_level = detail_level or self.detail_level
         
         if not self.gmaps:
             return self._get_mock_attractions(location, interests)
         
+        # Define search types based on interests
+        search_types = self._get_search_types(interests)
+        
+        # Answer from the local index when the same types were already searched around here
+        if coordinates:
+            indexed_attractions = self._query_index(coordinates, search_types, detail_level)
+            if indexed_attractions is not None:
+                return indexed_attractions
+        
+        key = cache_key("get_attractions", location.lower(), sorted(interest.lower() for interest in interests or []), detail_level)
+        cached_attractions = await self.cache.get(key)
+        if cached_attractions is not None:
+            return cached_attractions
+        
         try:
             attractions = []
             
-            # Define search types based on interests
-            search_types = self._get_search_types(interests)
+            # Find candidates with as few searches as possible, deduplicated by place_id
+            candidates = self._search_candidates(location, coordinates, search_types)
             
-            for search_type in search_types:
-                # Search for places
-                places_result = self.gmaps.places_nearby(
-                    location=location,
-                    radius=10000,  # 10km radius
-                    type=search_type
-                )
+            for place, search_type in candidates:
+                # Heavy fields are only fetched in full detail mode (once per unique place)
+                details = basic_place(place)
+                if detail_level == "full":
+                    details = await self.place_details.get_place_details(place.get('place_id')) or details
                 
-                for place in places_result.get('results', [])[:5]:  # Limit per type
-                    
-                    # Get additional details
-                    place_id = place.get('place_id')
-                    place_details = self.gmaps.place(
-                        place_id=place_id,
-                        fields=['name', 'rating', 'price_level', 'formatted_address', 
-                               'geometry', 'photos', 'reviews', 'opening_hours', 'types']
-                    )
-                    
-                    details = place_details.get('result', {})
-                    
-                    attraction = {
-                        "name": details.get('name', 'Unknown Attraction'),
-                        "rating": details.get('rating', 0),
-                        "price_level": details.get('price_level', 0),
-                        "address": details.get('formatted_address', ''),
-                        "coordinates": details.get('geometry', {}).get('location', {}),
-                        "photos": [photo.get('photo_reference', '') for photo in details.get('photos', [])],
-                        "types": details.get('types', []),
-                        "opening_hours": details.get('opening_hours', {}).get('weekday_text', []),
-                        "reviews": [
-                            {
-                                "author": review.get('author_name', ''),
-                                "rating": review.get('rating', 0),
-                                "text": review.get('text', '')[:200] + '...' if len(review.get('text', '')) > 200 else review.get('text', '')
-                            }
-                            for review in details.get('reviews', [])[:3]
-                        ]
-                    }
-                    
-                    # Add category and estimated visit time
-                    attraction["category"] = self._get_category(search_type)
-                    attraction["estimated_visit_time"] = self._estimate_visit_time(search_type)
-                    
-                    # Add pricing info
-                    if details.get('price_level') == 0:
-                        attraction["pricing"] = "Free"
-                    elif details.get('price_level') == 1:
-                        attraction["pricing"] = "$5-15"
-                    elif details.get('price_level') == 2:
-                        attraction["pricing"] = "$15-30"
-                    elif details.get('price_level') == 3:
-                        attraction["pricing"] = "$30-50"
-                    else:
-                        attraction["pricing"] = "$50+"
-                    
-                    attractions.append(attraction)
+                attractions.append(self._build_attraction(details, search_type))
             
-            # Remove duplicates and sort by rating
-            unique_attractions = self._remove_duplicates(attractions)
-            return sorted(unique_attractions, key=lambda x: x['rating'], reverse=True)[:15]
+            # Index under the whole set of types: other types run a different text search
+            if coordinates:
+                place_index.add(attractions, self._index_type(search_types), coordinates, ATTRACTION_SEARCH_RADIUS_KM, detail_level)
+            
+            attractions = self._rank_attractions(attractions)
+            await self.cache.set(key, attractions)
+            return attractions
             
         except Exception as e:
             print(f"Error fetching attractions: {e}")
+            stale_attractions = await self.cache.get_stale(key)
+            if stale_attractions is not None:
+                return stale_attractions
             return self._get_mock_attractions(location, interests)
 
+    async def iter_attraction_pages(self, location: str, interests: List[str] = None, coordinates: Dict[str, float] = None, search_index: int = 0, page_token: str = None, ready_at: float = 0, seen_place_ids: List[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Yield attractions one upstream results page at a time
+
+        Walks the planned searches in order, following each one's next_page_token before
+        moving on to the next search. Each page is {"items": [...], "resume": {...} or None};
+        pass the resume values back in as keyword arguments to continue after that page.
+        """
+        
+        if not self.gmaps:
+            yield {"items": self._get_mock_attractions(location, interests), "resume": None}
+            return
+        
+        search_types = self._get_search_types(interests)
+        searches = self._plan_searches(location, search_types)
+        seen_place_ids = set(seen_place_ids or [])
+        first_page = search_index == 0 and page_token is None
+        
+        while search_index < len(searches):
+            search = self._search_callable(searches[search_index], location, coordinates)
+            try:
+                if page_token:
+                    places_result = await fetch_next_page(search, page_token, ready_at)
+                else:
+                    places_result = search()
+            except Exception as e:
+                print(f"Error fetching attractions: {e}")
+                if first_page:
+                    yield {"items": self._get_mock_attractions(location, interests), "resume": None}
+                return
+            
+            first_page = False
+            page_token = places_result.get('next_page_token')
+            ready_at = time.time() + PAGE_TOKEN_DELAY
+            if not page_token:
+                search_index += 1
+            
+            attractions = []
+            for place in places_result.get('results', []):
+                place_id = place.get('place_id')
+                search_type = self._classify_place(place.get('types', []), search_types)
+                if not place_id or place_id in seen_place_ids or not search_type:
+                    continue
+                
+                seen_place_ids.add(place_id)
+                attractions.append(self._build_attraction(basic_place(place), search_type))
+            
+            has_more = search_index < len(searches)
+            if attractions or not has_more:
+                yield {
+                    "items": sorted(attractions, key=lambda x: x['rating'], reverse=True),
+                    "resume": {
+                        "search_index": search_index,
+                        "page_token": page_token,
+                        "ready_at": ready_at if page_token else 0,
+                        "seen_place_ids": sorted(seen_place_ids)
+                    } if has_more else None
+                }
+
+    def _build_attraction(self, details: Dict[str, Any], search_type: str) -> Attraction:
+        """Build an attraction record from basic or full place details"""
+        
+        attraction = {
+            "place_id": details['place_id'],
+            "name": details.get('name') or 'Unknown Attraction',
+            "rating": details.get('rating', 0),
+            "price_level": details['price_level'] if details.get('price_level') is not None else 0,
+            "address": details.get('address', ''),
+            "coordinates": details.get('coordinates', {}),
+            "photos": details.get('photos', []),
+            "types": details.get('types', []),
+            "opening_hours": details.get('opening_hours', []),
+            "reviews": details.get('reviews', [])
+        }
+        
+        # Add category and estimated visit time
+        attraction["category"] = self._get_category(search_type)
+        attraction["estimated_visit_time"] = self._estimate_visit_time(search_type)
+        
+        # Add pricing info
+        if details.get('price_level') == 0:
+            attraction["pricing"] = "Free"
+        elif details.get('price_level') == 1:
+            attraction["pricing"] = "$5-15"
+        elif details.get('price_level') == 2:
+            attraction["pricing"] = "$15-30"
+        elif details.get('price_level') == 3:
+            attraction["pricing"] = "$30-50"
+        else:
+            attraction["pricing"] = "$50+"
+        
+        return Attraction.from_dict(attraction)
+
+    def _query_index(self, coordinates: Dict[str, float], search_types: List[str], detail_level: str) -> List[Dict[str, Any]]:
+        """Build the attraction list from the local place index, or None if these types weren't searched here"""
+        
+        indexed = place_index.query(coordinates, ATTRACTION_SEARCH_RADIUS_KM, self._index_type(search_types), detail_level)
+        if indexed is None:
+            return None
+        
+        return self._rank_attractions(indexed)
+
+    def _index_type(self, search_types: List[str]) -> str:
+        return "|".join(sorted(search_types))
+
+    def _rank_attractions(self, attractions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Remove duplicates and keep the best rated attractions"""
+        
+        unique_attractions = self._remove_duplicates(attractions)
+        return sorted(unique_attractions, key=lambda x: x['rating'], reverse=True)[:15]
+
+    def _plan_searches(self, location: str, search_types: List[str]) -> List[Dict[str, Any]]:
+        """Merge the wanted Place types into as few upstream queries as possible
+
+        A single nearby search for tourist attractions covers most sightseeing types, and
+        every other type is folded into one combined text search. Results are classified
+        locally by the types Google returns for each place.
+        """
+        
+        searches = [{"kind": "nearby", "type": "tourist_attraction"}]
+        
+        other_types = [search_type for search_type in search_types if search_type != 'tourist_attraction']
+        if other_types:
+            keywords = " OR ".join(search_type.replace('_', ' ') for search_type in other_types)
+            searches.append({"kind": "text", "query": f"{keywords} in {location}"})
+        
+        return searches
+
+    def _search_candidates(self, location: str, coordinates: Dict[str, float], search_types: List[str]) -> List[tuple]:
+        """Run the planned searches and return (place, search_type) pairs worth fetching details for"""
+        
+        seen_place_ids = set()
+        per_type_counts = {}
+        candidates = []
+        
+        for search in self._plan_searches(location, search_types):
+            places_result = self._search_callable(search, location, coordinates)()
+            
+            for place in places_result.get('results', []):
+                place_id = place.get('place_id')
+                if not place_id or place_id in seen_place_ids:
+                    continue
+                
+                search_type = self._classify_place(place.get('types', []), search_types)
+                if not search_type or per_type_counts.get(search_type, 0) >= 5:  # Limit per type
+                    continue
+                
+                seen_place_ids.add(place_id)
+                per_type_counts[search_type] = per_type_counts.get(search_type, 0) + 1
+                candidates.append((place, search_type))
+        
+        # Only the best rated places make it into the final list, so don't fetch details for the rest
+        candidates.sort(key=lambda candidate: candidate[0].get('rating', 0), reverse=True)
+        return candidates[:15]
+
+    def _search_callable(self, search: Dict[str, Any], location: str, coordinates: Dict[str, float]) -> Callable[..., Dict[str, Any]]:
+        """Bind a planned search to its Places API call; call it with page_token= for later pages"""
+        
+        anchor = (coordinates["lat"], coordinates["lng"]) if coordinates else location
+        
+        if search["kind"] == "nearby":
+            return partial(
+                self.gmaps.places_nearby,
+                location=anchor,
+                radius=ATTRACTION_SEARCH_RADIUS_KM * 1000,
+                type=search["type"]
+            )
+        return partial(
+            self.gmaps.places,
+            query=search["query"],
+            location=anchor if coordinates else None,
+            radius=ATTRACTION_SEARCH_RADIUS_KM * 1000
+        )
+
+    def _classify_place(self, place_types: List[str], search_types: List[str]) -> str:
+        """Pick the first wanted search type that a place belongs to, or None
+
+        Specific types (museum, church, ...) win over the generic tourist_attraction.
+        """
+        
+        specific_types = [search_type for search_type in search_types if search_type != 'tourist_attraction']
+        for search_type in specific_types + ['tourist_attraction']:
+            if search_type in search_types and search_type in place_types:
+                return search_type
+        return None
+
     def _get_search_types(self, interests: List[str] = None) -> List[str]:
         """Get Google Places API types based on user interests"""
         
@@ -104,14 +281,15 @@ class AttractionsService:
             'sports': ['stadium', 'gym', 'sports_complex']
         }
         
-        search_types = set()
+        # Keep the order of the interests so classification prefers the first match
+        search_types = {}
         for interest in interests:
             if interest.lower() in type_mapping:
-                search_types.update(type_mapping[interest.lower()])
+                search_types.update(dict.fromkeys(type_mapping[interest.lower()]))
         
         # If no specific interests match, return default types
         if not search_types:
-            search_types = {'tourist_attraction', 'museum', 'park'}
+            return ['tourist_attraction', 'museum', 'park']
         
         return list(search_types)
 
@@ -176,6 +354,8 @@ class AttractionsService:
     def _get_mock_attractions(self, location: str, interests: List[str] = None) -> List[Dict[str, Any]]:
         """Return mock attraction data when API is not available"""
         
+        record_fallback("attractions")
+        
         mock_attractions = [
             {
                 "name": f"Historic Center of {location}",
@@ -0,0 +1,227 @@
+import asyncio
+import copy
+import json
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+from .metrics import note_fallback, record_cache_lookup
+from .records import record_default
+
+_MISSING = object()
+
+# How often each disk cache deletes entries that expired too long ago to be served stale
+PURGE_INTERVAL_SECONDS = 600
+
+def get_cache_dir() -> str:
+    """Directory for on-disk caches shared by every server worker"""
+
+    cache_dir = os.getenv("CACHE_DIR", ".cache")
+    os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir
+
+class TTLCache:
+    """Small in-process LRU cache whose entries expire after ttl seconds"""
+
+    def __init__(self, ttl: float, maxsize: int = 1024):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+
+        expires_at, value = entry
+        if expires_at < time.time():
+            del self._data[key]
+            return default
+
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Any, value: Any, ttl: float = None):
+        self._data[key] = (time.time() + (ttl if ttl is not None else self.ttl), value)
+        self._data.move_to_end(key)
+
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def __contains__(self, key: Any) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+class DiskCache:
+    """SQLite-backed JSON cache shared between worker processes
+
+    Expired entries are kept for stale_ttl seconds (CACHE_STALE_SECONDS by default) so
+    get_stale can serve them while an upstream is down, then purged.
+    """
+
+    def __init__(self, name: str, ttl: float, stale_ttl: float = None):
+        self.path = os.path.join(get_cache_dir(), f"{name}.sqlite")
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl if stale_ttl is not None else float(os.getenv("CACHE_STALE_SECONDS", 7 * 24 * 3600))
+        self._next_purge_at = 0.0
+
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        # A new connection per operation keeps the cache fork-safe
+        return sqlite3.connect(self.path, timeout=10, isolation_level=None)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            conn = self._connect()
+            try:
+                row = conn.execute(
+                    "SELECT value FROM cache WHERE key = ? AND expires_at >= ?", (key, time.time())
+                ).fetchone()
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            print(f"Error reading cache {self.path}: {e}")
+            return default
+
+        return json.loads(row[0]) if row else default
+
+    def get_stale(self, key: str, default: Any = None) -> Any:
+        """Last value stored for key, even if it has expired"""
+
+        try:
+            conn = self._connect()
+            try:
+                row = conn.execute("SELECT value FROM cache WHERE key = ?", (key,)).fetchone()
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            print(f"Error reading cache {self.path}: {e}")
+            return default
+
+        return json.loads(row[0]) if row else default
+
+    def set(self, key: str, value: Any, ttl: float = None):
+        expires_at = time.time() + (ttl if ttl is not None else self.ttl)
+        try:
+            conn = self._connect()
+            try:
+                conn.execute(
+                    "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(value, default=record_default), expires_at)
+                )
+            finally:
+                conn.close()
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            print(f"Error writing cache {self.path}: {e}")
+
+        if time.time() >= self._next_purge_at:
+            self.purge()
+
+    def purge(self) -> int:
+        """Delete entries that expired more than stale_ttl seconds ago"""
+
+        self._next_purge_at = time.time() + PURGE_INTERVAL_SECONDS
+        try:
+            conn = self._connect()
+            try:
+                return conn.execute("DELETE FROM cache WHERE expires_at < ?", (time.time() - self.stale_ttl,)).rowcount
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            print(f"Error purging cache {self.path}: {e}")
+            return 0
+
+    def add(self, key: str, value: Any, ttl: float = None) -> bool:
+        """Set key only if it is missing or expired; returns True if this call set it"""
+
+        now = time.time()
+        expires_at = now + (ttl if ttl is not None else self.ttl)
+        try:
+            conn = self._connect()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                row = conn.execute(
+                    "SELECT 1 FROM cache WHERE key = ? AND expires_at >= ?", (key, now)
+                ).fetchone()
+                if row:
+                    conn.execute("COMMIT")
+                    return False
+
+                conn.execute(
+                    "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(value, default=record_default), expires_at)
+                )
+                conn.execute("COMMIT")
+                return True
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            print(f"Error writing cache {self.path}: {e}")
+            return False
+
+class TieredCache:
+    """In-process TTL cache in front of a DiskCache shared by all workers
+
+    Disk reads and writes run in the default executor so a busy SQLite file never holds
+    the event loop. Values are copied in and out of the memory tier, so callers may
+    modify what they get or set. Values read from disk come back as JSON; pass decode to
+    turn them back into what was stored (e.g. records).
+    """
+
+    def __init__(self, name: str, ttl: float, maxsize: int = 1024, stale_ttl: float = None, decode: Optional[Callable[[Any], Any]] = None):
+        self.name = name
+        self.memory = TTLCache(ttl=min(ttl, 300), maxsize=maxsize)
+        self.disk = DiskCache(name, ttl=ttl, stale_ttl=stale_ttl)
+        self.decode = decode
+
+    async def get(self, key: str, default: Any = None) -> Any:
+        value = self.memory.get(key, _MISSING)
+        if value is not _MISSING:
+            record_cache_lookup(self.name, "memory")
+            return copy.deepcopy(value)
+
+        value = await run_blocking(self.disk.get, key, _MISSING)
+        if value is _MISSING:
+            record_cache_lookup(self.name, "miss")
+            return default
+
+        record_cache_lookup(self.name, "disk")
+        if self.decode:
+            value = self.decode(value)
+        self.memory.set(key, copy.deepcopy(value))
+        return value
+
+    async def get_stale(self, key: str, default: Any = None) -> Any:
+        """Last value stored for key, expired or not; for serving while the upstream is down"""
+
+        value = await run_blocking(self.disk.get_stale, key, _MISSING)
+        if value is _MISSING:
+            return default
+
+        note_fallback(self.name)
+        return self.decode(value) if self.decode else value
+
+    async def set(self, key: str, value: Any, ttl: float = None):
+        self.memory.set(key, copy.deepcopy(value), ttl=min(ttl, self.memory.ttl) if ttl is not None else None)
+        await run_blocking(self.disk.set, key, value, ttl)
+
+async def run_blocking(func: Callable[..., Any], *args) -> Any:
+    """Run a blocking call (e.g. SQLite) in the default executor"""
+
+    return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+def cache_key(*parts: Any) -> str:
+    """Build a stable cache key from JSON-serializable parts"""
+
+    return json.dumps(parts, sort_keys=True, separators=(",", ":"))
@@ -0,0 +1,185 @@
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Any, Optional
+
+# Circuit states
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Google status codes that mean the request was wrong, not that the upstream is unhealthy
+CLIENT_ERROR_STATUSES = {"INVALID_REQUEST", "NOT_FOUND", "ZERO_RESULTS", "MAX_WAYPOINTS_EXCEEDED", "MAX_ROUTE_LENGTH_EXCEEDED"}
+
+# Calls slower than this (seconds) count against an upstream even when they succeed
+DEFAULT_SLOW_CALL_SECONDS = {"google_maps": 3.0, "open_meteo": 3.0, "amadeus": 8.0, "gemini": 20.0}
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose circuit is open"""
+
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(f"{name} circuit is open, next attempt in {retry_in:.0f}s")
+        self.name = name
+        self.retry_in = retry_in
+
+class UpstreamCallsShedError(CircuitOpenError):
+    """Raised instead of calling an upstream from a plan that is being served in degraded mode"""
+
+    def __init__(self, name: str):
+        Exception.__init__(self, f"{name} call skipped in degraded mode")
+        self.name = name
+        self.retry_in = 0
+
+def is_upstream_failure(error: Optional[BaseException]) -> bool:
+    """Whether an exception says the upstream is unhealthy (5xx, timeouts, quota) rather than the request"""
+
+    if error is None or not isinstance(error, Exception) or isinstance(error, CircuitOpenError):
+        return False
+
+    status = getattr(error, "status", None)
+    if isinstance(status, int):
+        return status >= 500 or status == 429
+    return status not in CLIENT_ERROR_STATUSES
+
+class CircuitBreaker:
+    """Closed/open/half-open breaker for one upstream, driven by error rate and slow-call rate
+
+    Closed: calls go through and their outcomes fill a rolling window. When enough calls in
+    the window failed or were slow, the circuit opens and calls fail fast for a cool-down.
+    Half-open: after the cool-down a few probe calls go through; a healthy probe closes the
+    circuit, an unhealthy one opens it again.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.window_seconds = float(os.getenv("CIRCUIT_WINDOW_SECONDS", 30))
+        self.min_calls = int(os.getenv("CIRCUIT_MIN_CALLS", 10))
+        self.error_rate_threshold = float(os.getenv("CIRCUIT_ERROR_RATE", 0.5))
+        self.slow_rate_threshold = float(os.getenv("CIRCUIT_SLOW_RATE", 0.8))
+        self.slow_call_seconds = float(os.getenv(
+            f"CIRCUIT_SLOW_CALL_SECONDS_{name.upper()}", DEFAULT_SLOW_CALL_SECONDS.get(name, 5.0)
+        ))
+        self.open_seconds = float(os.getenv("CIRCUIT_OPEN_SECONDS", 30))
+        self.half_open_calls = int(os.getenv("CIRCUIT_HALF_OPEN_CALLS", 1))
+
+        self.state = CLOSED
+        self.trips = 0
+        # (finished_at, failed, slow) for calls in the rolling window
+        self._calls = deque()
+        self._opened_at = 0.0
+        self._probes = 0
+        # Outcomes are recorded from executor threads too (route legs)
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Let a call through, or raise CircuitOpenError"""
+
+        with self._lock:
+            if self.state == OPEN:
+                retry_in = self._opened_at + self.open_seconds - time.monotonic()
+                if retry_in > 0:
+                    raise CircuitOpenError(self.name, retry_in)
+                self.state = HALF_OPEN
+                self._probes = 0
+
+            if self.state == HALF_OPEN:
+                if self._probes >= self.half_open_calls:
+                    raise CircuitOpenError(self.name, 0)
+                self._probes += 1
+
+    def record(self, elapsed: float, error: Optional[BaseException] = None):
+        """Feed the outcome of a call that before_call let through"""
+
+        failed = is_upstream_failure(error)
+        slow = elapsed >= self.slow_call_seconds
+        now = time.monotonic()
+
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._probes = max(0, self._probes - 1)
+                if failed or slow:
+                    self._open(now)
+                elif error is None:
+                    self._close()
+                return
+
+            if self.state == OPEN:
+                # Started before the circuit opened; its outcome no longer matters
+                return
+
+            self._calls.append((now, failed, slow))
+            while self._calls and self._calls[0][0] < now - self.window_seconds:
+                self._calls.popleft()
+
+            if len(self._calls) >= self.min_calls:
+                error_rate = sum(1 for _, call_failed, _ in self._calls if call_failed) / len(self._calls)
+                slow_rate = sum(1 for _, _, call_slow in self._calls if call_slow) / len(self._calls)
+                if error_rate >= self.error_rate_threshold or slow_rate >= self.slow_rate_threshold:
+                    self._open(now)
+
+    def _open(self, now: float):
+        if self.state != OPEN:
+            print(f"⚠️  {self.name} circuit opened; serving fallbacks for {self.open_seconds:.0f}s")
+            self.trips += 1
+        self.state = OPEN
+        self._opened_at = now
+        self._calls.clear()
+
+    def _close(self):
+        print(f"✅ {self.name} circuit closed")
+        self.state = CLOSED
+        self._calls.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            calls = len(self._calls)
+            snapshot = {
+                "state": self.state,
+                "trips": self.trips,
+                "window_calls": calls,
+                "error_rate": round(sum(1 for _, failed, _ in self._calls if failed) / calls, 3) if calls else 0.0,
+                "slow_rate": round(sum(1 for _, _, slow in self._calls if slow) / calls, 3) if calls else 0.0
+            }
+            if self.state == OPEN:
+                snapshot["retry_in"] = round(max(0.0, self._opened_at + self.open_seconds - time.monotonic()), 1)
+            return snapshot
+
+# One breaker per upstream, shared by every coroutine and thread in this process
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+def get_breaker(name: str) -> Optional[CircuitBreaker]:
+    """The breaker for an upstream, or None when CIRCUIT_BREAKERS=false"""
+
+    # Read per call: this module is imported before main.py loads .env
+    if os.getenv("CIRCUIT_BREAKERS", "true").lower() != "true":
+        return None
+
+    breaker = _breakers.get(name)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.setdefault(name, CircuitBreaker(name))
+    return breaker
+
+# Set while a degraded plan runs: its upstream calls fail fast, as if every circuit were open
+_shedding_upstreams = contextvars.ContextVar("shedding_upstreams", default=False)
+
+@contextmanager
+def shed_upstream_calls():
+    """Fail every upstream call made in this context, so services answer from cache or mock data"""
+
+    token = _shedding_upstreams.set(True)
+    try:
+        yield
+    finally:
+        _shedding_upstreams.reset(token)
+
+def check_shedding(service: str):
+    if _shedding_upstreams.get():
+        raise UpstreamCallsShedError(service)
+
+def circuit_states() -> Dict[str, Dict[str, Any]]:
+    return {name: breaker.snapshot() for name, breaker in sorted(_breakers.items())}
@@ -0,0 +1,65 @@
+from typing import Dict, Any, List
+from .records import Record
+
+# Keys every plan response keeps, whatever fields were asked for
+ALWAYS_INCLUDED = ["destination", "duration", "dates", "session_id"]
+
+# Sections a fields= parameter can select
+PLAN_SECTIONS = ["hotels", "attractions", "weather", "flights", "routes", "legs", "summary"]
+
+_MISSING = object()
+
+def parse_fields(fields: str) -> Dict[str, Dict[str, Any]]:
+    """Parse "hotels.name,hotels.rating,weather.forecast" into a tree of wanted keys per section
+
+    An empty subtree means "the whole value". Raises ValueError for unknown sections.
+    """
+
+    paths = []
+    for path in fields.split(","):
+        parts = [part.strip() for part in path.strip().split(".") if part.strip()]
+        if not parts:
+            continue
+        if parts[0] not in PLAN_SECTIONS:
+            raise ValueError(f"Unknown field '{parts[0]}', expected one of: {', '.join(PLAN_SECTIONS)}")
+        paths.append(tuple(parts))
+
+    # Shorter paths first: a requested path wins over anything below it, whatever the order
+    fieldset = {}
+    whole = set()
+    for parts in sorted(dict.fromkeys(paths), key=len):
+        if any(parts[:depth] in whole for depth in range(1, len(parts))):
+            continue
+        whole.add(parts)
+
+        node = fieldset
+        for part in parts:
+            node = node.setdefault(part, {})
+
+    if not fieldset:
+        raise ValueError("fields must name at least one section")
+    return fieldset
+
+def prune_plan(plan: Dict[str, Any], fieldset: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """Keep only the requested parts of a plan, before it is serialized"""
+
+    pruned = {key: plan[key] for key in ALWAYS_INCLUDED if key in plan}
+    for section, tree in fieldset.items():
+        if section in plan:
+            pruned[section] = _pick(plan[section], tree)
+    return pruned
+
+def _pick(value: Any, tree: Dict[str, Any]) -> Any:
+    if not tree:
+        return value
+    if isinstance(value, list):
+        return [_pick(item, tree) for item in value]
+    if not isinstance(value, (dict, Record)):
+        return value
+
+    picked = {}
+    for key, subtree in tree.items():
+        item = value.get(key, _MISSING)
+        if item is not _MISSING:
+            picked[key] = _pick(item, subtree)
+    return picked
@@ -1,46 +1,56 @@
+import asyncio
 import os
+import re
+import time
 import aiohttp
 from typing import List, Dict, Any
 import json
 from datetime import datetime, timedelta
 import random
+from .metrics import record_fallback, track_upstream
+from .records import FlightOffer
 
 class FlightsService:
     def __init__(self):
         self.amadeus_api_key = os.getenv("AMADEUS_API_KEY")
         self.amadeus_api_secret = os.getenv("AMADEUS_API_SECRET")
-        self.base_url = "https://test.api.amadeus.com/v2"
+        self.api_host = os.getenv("AMADEUS_BASE_URL", "https://test.api.amadeus.com").rstrip("/")
+        self.base_url = f"{self.api_host}/v2"
+        # Live searches are opt-in: with credentials alone every plan would spend Amadeus quota
+        self.live_search = os.getenv("AMADEUS_LIVE_SEARCH", "false").lower() == "true"
+        # OAuth token shared by every search until shortly before it expires
+        self._access_token = None
+        self._token_expires_at = 0.0
+        self._token_lock = None
+        # MOCK_DATA_SEED makes the sample flights repeatable, e.g. for benchmarks and replays
+        self.mock_seed = os.getenv("MOCK_DATA_SEED")
 
     async def get_flights(self, origin: str, destination: str, dates: str) -> List[Dict[str, Any]]:
         """Search for flights between origin and destination"""
         
-        # For now, return mock data since Amadeus API requires complex setup
-        # In production, you would implement actual Amadeus API calls here
+        # Amadeus needs an exact departure date and known airports; anything vaguer gets mock data
+        departure_date = self._parse_departure_date(dates)
+        known_airports = "XXX" not in (self._get_airport_code(origin), self._get_airport_code(destination))
+        if self.live_search and self.amadeus_api_key and self.amadeus_api_secret and departure_date and known_airports:
+            return await self._search_amadeus_flights(origin, destination, departure_date)
+        
         return self._get_mock_flights(origin, destination, dates)
 
+    def _parse_departure_date(self, dates: str) -> str:
+        """First YYYY-MM-DD date in the trip dates, or an empty string"""
+        
+        match = re.search(r"\d{4}-\d{2}-\d{2}", dates or "")
+        return match.group(0) if match else ""
+
     async def _search_amadeus_flights(self, origin: str, destination: str, departure_date: str, return_date: str = None) -> List[Dict[str, Any]]:
-        """Search flights using Amadeus API (placeholder implementation)"""
+        """Search flights using Amadeus API"""
         
         if not self.amadeus_api_key or not self.amadeus_api_secret:
             return self._get_mock_flights(origin, destination, departure_date)
         
         try:
-            # First, get access token
-            token_url = "https://test.api.amadeus.com/v1/security/oauth2/token"
-            token_data = {
-                "grant_type": "client_credentials",
-                "client_id": self.amadeus_api_key,
-                "client_secret": self.amadeus_api_secret
-            }
-            
             async with aiohttp.ClientSession() as session:
-                # Get access token
-                async with session.post(token_url, data=token_data) as response:
-                    if response.status == 200:
-                        token_response = await response.json()
-                        access_token = token_response["access_token"]
-                    else:
-                        return self._get_mock_flights(origin, destination, departure_date)
+                access_token = await self._get_access_token(session)
                 
                 # Search flights
                 headers = {"Authorization": f"Bearer {access_token}"}
@@ -57,17 +67,48 @@ class FlightsService:
                 if return_date:
                     params["returnDate"] = return_date
                 
-                async with session.get(search_url, headers=headers, params=params) as response:
-                    if response.status == 200:
+                with track_upstream("amadeus", "flight_offers"):
+                    async with session.get(search_url, headers=headers, params=params) as response:
+                        if response.status == 401:
+                            # Revoked or expired early; the next search fetches a new token
+                            self._access_token = None
+                        response.raise_for_status()
                         flight_data = await response.json()
-                        return self._process_amadeus_flights(flight_data)
-                    else:
-                        return self._get_mock_flights(origin, destination, departure_date)
+                
+                return self._process_amadeus_flights(flight_data)
         
         except Exception as e:
             print(f"Error searching flights: {e}")
             return self._get_mock_flights(origin, destination, departure_date)
 
+    async def _get_access_token(self, session: aiohttp.ClientSession) -> str:
+        """The cached OAuth token, fetching a new one when it is missing or about to expire"""
+        
+        if self._token_lock is None:
+            self._token_lock = asyncio.Lock()
+        
+        async with self._token_lock:
+            # Renew a minute early so a token never expires mid-search
+            if self._access_token and time.monotonic() < self._token_expires_at - 60:
+                return self._access_token
+            
+            token_url = f"{self.api_host}/v1/security/oauth2/token"
+            token_data = {
+                "grant_type": "client_credentials",
+                "client_id": self.amadeus_api_key,
+                "client_secret": self.amadeus_api_secret
+            }
+            
+            with track_upstream("amadeus", "token"):
+                async with session.post(token_url, data=token_data) as response:
+                    # Raise so the amadeus circuit breaker sees failed calls
+                    response.raise_for_status()
+                    token_response = await response.json()
+            
+            self._access_token = token_response["access_token"]
+            self._token_expires_at = time.monotonic() + float(token_response.get("expires_in", 1799))
+            return self._access_token
+
     def _get_airport_code(self, location: str) -> str:
         """Convert location name to airport code (simplified mapping)"""
         
@@ -91,7 +132,7 @@ class FlightsService:
         
         return "XXX"  # Default code
 
-    def _process_amadeus_flights(self, flight_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    def _process_amadeus_flights(self, flight_data: Dict[str, Any]) -> List[FlightOffer]:
         """Process Amadeus API response into our format"""
         
         flights = []
@@ -135,13 +176,18 @@ class FlightsService:
                 
                 flight["itineraries"].append(itinerary_data)
             
-            flights.append(flight)
+            flights.append(FlightOffer.from_dict(flight))
         
         return flights
 
     def _get_mock_flights(self, origin: str, destination: str, dates: str) -> List[Dict[str, Any]]:
         """Return mock flight data"""
         
+        record_fallback("flights")
+        
+        # Seeded per query, so the same search gets the same flights whatever order requests arrive in
+        rng = random.Random("|".join([self.mock_seed, origin, destination, dates])) if self.mock_seed else random.Random()
+        
         airlines = ["Air France", "Lufthansa", "British Airways", "Alitalia", "Ryanair", "EasyJet"]
         airports = {
             "rome": "FCO",
@@ -157,12 +203,12 @@ class FlightsService:
         mock_flights = []
         
         for i in range(5):  # Generate 5 mock flights
-            airline = random.choice(airlines)
-            base_price = random.randint(200, 800)
+            airline = rng.choice(airlines)
+            base_price = rng.randint(200, 800)
             
             # Create departure and arrival times
-            departure_hour = random.randint(6, 22)
-            arrival_hour = (departure_hour + random.randint(2, 6)) % 24
+            departure_hour = rng.randint(6, 22)
+            arrival_hour = (departure_hour + rng.randint(2, 6)) % 24
             
             flight = {
                 "price": {
@@ -171,23 +217,23 @@ class FlightsService:
                 },
                 "itineraries": [
                     {
-                        "duration": f"PT{random.randint(2, 6)}H{random.randint(0, 59)}M",
+                        "duration": f"PT{rng.randint(2, 6)}H{rng.randint(0, 59)}M",
                         "segments": [
                             {
                                 "departure": {
                                     "airport": origin_code,
-                                    "terminal": random.choice(["1", "2", "3", ""]),
-                                    "time": f"2024-10-15T{departure_hour:02d}:{random.randint(0, 59):02d}:00"
+                                    "terminal": rng.choice(["1", "2", "3", ""]),
+                                    "time": f"2024-10-15T{departure_hour:02d}:{rng.randint(0, 59):02d}:00"
                                 },
                                 "arrival": {
                                     "airport": dest_code,
-                                    "terminal": random.choice(["1", "2", "3", ""]),
-                                    "time": f"2024-10-15T{arrival_hour:02d}:{random.randint(0, 59):02d}:00"
+                                    "terminal": rng.choice(["1", "2", "3", ""]),
+                                    "time": f"2024-10-15T{arrival_hour:02d}:{rng.randint(0, 59):02d}:00"
                                 },
                                 "carrier_code": airline[:2].upper(),
-                                "flight_number": f"{random.randint(100, 9999)}",
-                                "aircraft": random.choice(["320", "737", "787", "A380"]),
-                                "duration": f"PT{random.randint(2, 6)}H{random.randint(0, 59)}M"
+                                "flight_number": f"{rng.randint(100, 9999)}",
+                                "aircraft": rng.choice(["320", "737", "787", "A380"]),
+                                "duration": f"PT{rng.randint(2, 6)}H{rng.randint(0, 59)}M"
                             }
                         ]
                     }
@@ -205,8 +251,8 @@ class FlightsService:
                     }
                 ],
                 "airline": airline,
-                "stops": random.choice([0, 1, 2]),
-                "duration_hours": random.randint(2, 8)
+                "stops": rng.choice([0, 1, 2]),
+                "duration_hours": rng.randint(2, 8)
             }
             
             mock_flights.append(flight)
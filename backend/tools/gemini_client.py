@@ -1,7 +1,77 @@
 import os
+import re
 import google.generativeai as genai
-from typing import Dict, Any, List
+from google.ai import generativelanguage as glm
+from typing import Dict, Any, List, Callable, Awaitable
 import json
+import orjson
+from .cache import run_blocking
+from .records import record_default
+from .metrics import record_fallback, track_upstream
+
+# Maximum number of function-calling rounds before we stop asking Gemini for more tools
+MAX_TOOL_ROUNDS = 3
+
+# Keywords used to pick tools when Gemini is not available
+TOOL_KEYWORDS = {
+    "search_hotels": ["hotel", "stay", "accommodation", "lodging", "hostel", "resort"],
+    "get_weather": ["weather", "forecast", "temperature", "rain", "sunny", "climate"],
+    "get_attractions": ["attraction", "sight", "sightseeing", "museum", "things to do", "landmark", "tour"],
+    "get_flights": ["flight", "fly", "airline", "airport", "plane"],
+    "get_routes": ["route", "direction", "get around", "walk", "drive", "driving", "transport"]
+}
+
+# Keywords that mean the user wants a complete plan rather than a single answer
+PLANNING_KEYWORDS = ["trip", "plan", "planning", "itinerary", "vacation", "holiday", "travel", "getaway"]
+
+# Cities the mock prompt analysis recognizes
+MOCK_CITIES = ["Rome", "Paris", "London", "Tokyo", "Barcelona", "New York", "Florence", "Venice", "Madrid", "Amsterdam", "Berlin"]
+
+# Text between two cities of a multi-city trip: "then", "and then" or an arrow, optionally
+# after the days spent in the first one ("Rome for 2 days then Florence")
+LEG_CONNECTOR_PATTERN = re.compile(r"\s*(?:for\s+(\d+)[- ]days?\s*)?,?\s*(?:(?:and\s+)?then|→|->)\s*")
+DAYS_PATTERN = re.compile(r"\b(\d+)[- ]days?\b")
+WEEKS_PATTERN = re.compile(r"\b(\d+)[- ]weeks?\b")
+
+def _keyword_pattern(keywords: List[str]) -> re.Pattern:
+    # Whole words plus simple plurals/inflections, so "rain" doesn't match "train"
+    return re.compile(r"\b(?:" + "|".join(re.escape(keyword) for keyword in keywords) + r")(?:s|es|ed|ing)?\b")
+
+TOOL_PATTERNS = {name: _keyword_pattern(keywords) for name, keywords in TOOL_KEYWORDS.items()}
+PLANNING_PATTERN = _keyword_pattern(PLANNING_KEYWORDS)
+
+def dump_prompt_data(value: Any) -> str:
+    """Indented JSON of the gathered data for a prompt; orjson serializes records directly"""
+
+    return orjson.dumps(value, option=orjson.OPT_INDENT_2, default=record_default).decode()
+
+def _to_schema(schema: Dict[str, Any]) -> Dict[str, Any]:
+    """Turn a JSON-schema style parameter description into the SDK's Schema fields"""
+
+    converted = {}
+    for key, value in schema.items():
+        if key == "type":
+            converted["type_"] = value.upper()
+        elif key == "properties":
+            converted["properties"] = {name: _to_schema(prop) for name, prop in value.items()}
+        elif key == "items":
+            converted["items"] = _to_schema(value)
+        else:
+            converted[key] = value
+    return converted
+
+def _to_tools(tools: List[Dict[str, Any]]) -> List[glm.Tool]:
+    return [
+        glm.Tool(function_declarations=[
+            glm.FunctionDeclaration(
+                name=declaration["name"],
+                description=declaration["description"],
+                parameters=_to_schema(declaration["parameters"])
+            )
+            for declaration in tool["function_declarations"]
+        ])
+        for tool in tools
+    ]
 
 class GeminiClient:
     def __init__(self):
@@ -9,9 +79,15 @@ class GeminiClient:
         if not api_key:
             print("⚠️  Warning: GEMINI_API_KEY not found, using mock mode")
             self.model = None
+            self.tool_model = None
             return
         
-        genai.configure(api_key=api_key)
+        api_endpoint = os.getenv("GEMINI_API_ENDPOINT")
+        if api_endpoint:
+            # Another host (e.g. the load-test stubs) only needs to speak the REST API
+            genai.configure(api_key=api_key, transport="rest", client_options={"api_endpoint": api_endpoint})
+        else:
+            genai.configure(api_key=api_key)
         self.model = genai.GenerativeModel('gemini-1.5-pro')
         
         # Define tools/functions that Gemini can use
@@ -86,6 +162,11 @@ class GeminiClient:
                 ]
             }
         ]
+        
+        # The SDK only takes tools on the model, so the function-calling rounds get their own
+        self.tool_model = genai.GenerativeModel('gemini-1.5-pro', tools=_to_tools(self.tools))
+        # Models offering a subset of the tools, by the tool names they offer
+        self._filtered_tool_models = {}
 
     async def analyze_prompt(self, prompt: str) -> Dict[str, Any]:
         """Analyze the user prompt and extract trip details"""
@@ -103,25 +184,28 @@ class GeminiClient:
         4. Budget preferences (cheap, moderate, luxury)
         5. Specific interests or attractions mentioned
         6. Any special requirements
+        7. For trips to several cities, each city in visiting order with the days spent there
         
         Respond with a JSON object containing:
         {
-            "destination": "extracted destination",
+            "destination": "extracted destination (the first city of a multi-city trip)",
+            "origin": "city the trip starts from, or null if not given",
             "duration": number_of_days,
             "dates": "extracted dates or month/year",
             "budget": "cheap/moderate/luxury",
             "interests": ["list", "of", "interests"],
-            "requirements": ["any", "special", "requirements"]
+            "requirements": ["any", "special", "requirements"],
+            "legs": [{"destination": "city", "duration": number_of_days}]
         }
         
+        Leave "legs" empty for a single-city trip. The origin is never a leg.
+        
         If any information is not provided, use reasonable defaults.
         """
         
         try:
-            response = self.model.generate_content(
-                f"{system_prompt}\n\nUser prompt: {prompt}",
-                tools=self.tools
-            )
+            with track_upstream("gemini", "analyze_prompt"):
+                response = await run_blocking(self.model.generate_content, f"{system_prompt}\n\nUser prompt: {prompt}")
             
             # Extract JSON from response
             response_text = response.text
@@ -143,33 +227,63 @@ class GeminiClient:
 
     def _mock_analyze_prompt(self, prompt: str) -> Dict[str, Any]:
         """Mock prompt analysis when API is not available"""
+        record_fallback("gemini")
         prompt_lower = prompt.lower()
         
-        # Simple keyword extraction
-        destinations = []
-        if "rome" in prompt_lower:
-            destinations.append("Rome")
-        if "paris" in prompt_lower:
-            destinations.append("Paris")
-        if "london" in prompt_lower:
-            destinations.append("London")
-        if "tokyo" in prompt_lower:
-            destinations.append("Tokyo")
-        if "barcelona" in prompt_lower:
-            destinations.append("Barcelona")
-        if "new york" in prompt_lower:
-            destinations.append("New York")
+        # Simple keyword extraction, in the order the cities are mentioned
+        mentions = sorted(
+            (match.start(), match.end(), city)
+            for city in MOCK_CITIES
+            for match in re.finditer(r"\b" + re.escape(city.lower()) + r"\b", prompt_lower)
+        )
+        
+        # A city right after "from" is where the trip starts, not somewhere to stay
+        origin = None
+        stops = []
+        for start, end, city in mentions:
+            if origin is None and prompt_lower[:start].rstrip().endswith("from"):
+                origin = city
+            else:
+                stops.append((start, end, city))
+        
+        # Only cities chained with "then" or an arrow are legs of one trip
+        chain = stops[:1]
+        leg_days = [None]
+        connectors = []
+        for previous, current in zip(stops, stops[1:]):
+            connector = LEG_CONNECTOR_PATTERN.fullmatch(prompt_lower, previous[1], current[0])
+            if not connector:
+                break
+            leg_days[-1] = int(connector.group(1)) if connector.group(1) else None
+            connectors.append((previous[1], current[0]))
+            chain.append(current)
+            leg_days.append(None)
+        
+        destination = chain[0][2] if chain else "Rome"
         
-        destination = destinations[0] if destinations else "Rome"
+        # Days given for every earlier city: a trailing "for N days" belongs to the last one
+        if len(chain) > 1 and all(leg_days[:-1]):
+            trailing = re.match(r"\s*for\s+(\d+)[- ]days?\b", prompt_lower[chain[-1][1]:])
+            if trailing:
+                leg_days[-1] = int(trailing.group(1))
+                connectors.append((chain[-1][1], chain[-1][1] + trailing.end()))
         
-        # Extract duration
+        # Extract duration, ignoring the days already given to a single city
         duration = 3
-        if "4-day" in prompt_lower or "4 day" in prompt_lower:
-            duration = 4
-        elif "5-day" in prompt_lower or "5 day" in prompt_lower:
-            duration = 5
+        trip_days = [
+            match for match in DAYS_PATTERN.finditer(prompt_lower)
+            if not any(start <= match.start() < end for start, end in connectors)
+        ]
+        weeks = WEEKS_PATTERN.search(prompt_lower)
+        if len(chain) > 1 and all(leg_days):
+            duration = sum(leg_days)
+        elif trip_days:
+            duration = int(trip_days[0].group(1))
+        elif weeks:
+            duration = 7 * int(weeks.group(1))
         elif "week" in prompt_lower:
             duration = 7
+        duration = max(duration, 1)
         
         # Extract budget
         budget = "moderate"
@@ -187,28 +301,206 @@ class GeminiClient:
         elif "spring" in prompt_lower:
             dates = "Spring 2024"
         
+        # Cities without their own days split the rest, the first ones taking any remainder
+        legs = []
+        if len(chain) > 1:
+            unassigned = [index for index, days in enumerate(leg_days) if not days]
+            assigned = sum(days for days in leg_days if days)
+            duration = max(duration, assigned + len(unassigned))
+            remaining = duration - assigned
+            for index, (_, _, city) in enumerate(chain):
+                days = leg_days[index]
+                if not days:
+                    position = unassigned.index(index)
+                    days = remaining // len(unassigned) + (1 if position < remaining % len(unassigned) else 0)
+                legs.append({"destination": city, "duration": days})
+        
         return {
             "destination": destination,
+            "origin": origin,
             "duration": duration,
             "dates": dates,
             "budget": budget,
             "interests": ["historical", "cultural"],
-            "requirements": []
+            "requirements": [],
+            "legs": legs
+        }
+
+    async def run_tool_loop(
+        self,
+        prompt: str,
+        trip_details: Dict[str, Any],
+        dispatch: Callable[[List[Dict[str, Any]]], Awaitable[List[Dict[str, Any]]]],
+        allowed_tools: List[str] = None
+    ) -> List[Dict[str, Any]]:
+        """Let Gemini pick the tools it needs and dispatch each round of calls together
+
+        When allowed_tools is given, only those tools are offered (or picked by the mock).
+        """
+
+        if allowed_tools is not None and not allowed_tools:
+            return []
+
+        if not self.model:
+            return await dispatch(self._mock_select_tools(prompt, trip_details, allowed_tools))
+
+        tool_model = self._tool_model(allowed_tools)
+        executed = []
+
+        tool_prompt = f"""
+        You are a smart travel planning assistant. Call the tools needed to answer the user's request.
+        Only call the tools that are relevant - do not fetch flights or hotels if the user did not ask for a trip plan or for them.
+        Call independent tools together in the same turn.
+
+        Trip details: {json.dumps(trip_details)}
+
+        User prompt: {prompt}
+        """
+
+        try:
+            # The SDK's async client only exists for gRPC (not the REST transport), so the
+            # blocking send runs in a thread instead
+            chat = tool_model.start_chat()
+            with track_upstream("gemini", "select_tools"):
+                response = await run_blocking(chat.send_message, tool_prompt)
+
+            for round_number in range(MAX_TOOL_ROUNDS):
+                calls = self._extract_function_calls(response)
+                if not calls:
+                    break
+
+                # Every call requested in one turn is independent, so run them as one batch
+                results = await dispatch(calls)
+                executed.extend(results)
+
+                if round_number == MAX_TOOL_ROUNDS - 1:
+                    # Out of rounds: any further calls Gemini asked for would be ignored
+                    break
+
+                with track_upstream("gemini", "select_tools"):
+                    response = await run_blocking(
+                        chat.send_message,
+                        glm.Content(parts=[
+                            glm.Part(function_response=glm.FunctionResponse(
+                                name=result["name"],
+                                response=self._summarize_tool_result(result["result"])
+                            ))
+                            for result in results
+                        ])
+                    )
+        except Exception as e:
+            print(f"Error running tool loop: {e}")
+
+        if not executed:
+            # Gemini did not call anything usable, fall back to keyword selection
+            executed = await dispatch(self._mock_select_tools(prompt, trip_details, allowed_tools))
+
+        return executed
+
+    def _tool_model(self, allowed_tools: List[str] = None):
+        """The model offering every tool, or only allowed_tools"""
+
+        if allowed_tools is None:
+            return self.tool_model
+
+        key = tuple(sorted(set(allowed_tools)))
+        if key not in self._filtered_tool_models:
+            tools = [{
+                "function_declarations": [
+                    declaration for declaration in self.tools[0]["function_declarations"]
+                    if declaration["name"] in key
+                ]
+            }]
+            self._filtered_tool_models[key] = genai.GenerativeModel('gemini-1.5-pro', tools=_to_tools(tools))
+        return self._filtered_tool_models[key]
+
+    def _extract_function_calls(self, response) -> List[Dict[str, Any]]:
+        """Extract function calls from a Gemini response"""
+
+        calls = []
+        for candidate in response.candidates:
+            for part in candidate.content.parts:
+                function_call = getattr(part, "function_call", None)
+                if function_call and function_call.name:
+                    calls.append({
+                        "name": function_call.name,
+                        "args": {key: self._to_python(value) for key, value in function_call.args.items()}
+                    })
+        return calls
+
+    def _to_python(self, value: Any) -> Any:
+        """Convert protobuf map/list values returned by Gemini into plain Python values"""
+
+        if isinstance(value, (str, int, float, bool)) or value is None:
+            return value
+        if hasattr(value, "items"):
+            return {key: self._to_python(item) for key, item in value.items()}
+        return [self._to_python(item) for item in value]
+
+    def _summarize_tool_result(self, result: Any) -> Dict[str, Any]:
+        """Build a small summary of a tool result to send back to Gemini"""
+
+        if isinstance(result, list):
+            return {
+                "count": len(result),
+                "items": [item.get("name", "") for item in result[:5] if isinstance(item, dict)]
+            }
+        if isinstance(result, dict):
+            return {"fields": list(result.keys())}
+        return {"error": "Tool call failed"}
+
+    def _mock_select_tools(self, prompt: str, trip_details: Dict[str, Any], allowed_tools: List[str] = None) -> List[Dict[str, Any]]:
+        """Pick tools from prompt keywords when Gemini is not available"""
+
+        record_fallback("gemini")
+
+        prompt_lower = prompt.lower()
+        destination = trip_details.get("destination", "Unknown")
+        dates = trip_details.get("dates", "Not specified")
+
+        all_calls = {
+            "search_hotels": {"location": destination, "budget": trip_details.get("budget", "moderate")},
+            "get_weather": {"location": destination, "start_date": dates, "end_date": dates},
+            "get_attractions": {"location": destination, "interests": ",".join(trip_details.get("interests", []))},
+            "get_flights": {"origin": trip_details.get("origin") or "User Location", "destination": destination, "departure_date": dates},
+            # Same start and end means "sample routes around the destination"
+            "get_routes": {"start_location": destination, "end_location": destination}
         }
 
-    async def plan_trip_with_tools(self, prompt: str, tool_results: Dict[str, Any]) -> str:
-        """Generate a comprehensive trip plan using tool results"""
+        selected = [name for name, pattern in TOOL_PATTERNS.items() if pattern.search(prompt_lower)]
+
+        # A full trip plan (or a prompt we can't classify) needs every tool
+        if not selected or PLANNING_PATTERN.search(prompt_lower):
+            selected = list(all_calls.keys())
+
+        # The client asked for exactly these sections
+        if allowed_tools is not None:
+            selected = [name for name in all_calls if name in allowed_tools]
+
+        return [{"name": name, "args": all_calls[name]} for name in selected]
+
+    async def plan_trip_with_tools(self, prompt: str, tool_results: Dict[str, Any], previous_summary: str = None) -> str:
+        """Generate a comprehensive trip plan using tool results, revising previous_summary when given"""
         
         if not self.model:
             return self._mock_trip_plan(prompt, tool_results)
         
+        revision = ""
+        if previous_summary:
+            revision = f"""
+        This request changes an earlier plan. Keep what still applies and update what the change and the new data affect.
+        
+        Earlier Plan:
+        {previous_summary}
+        """
+        
         plan_prompt = f"""
         Based on the user's request and the data gathered, create a comprehensive travel plan.
         
         User Request: {prompt}
-        
+        {revision}
         Available Data:
-        {json.dumps(tool_results, indent=2)}
+        {dump_prompt_data(tool_results)}
         
         Create a detailed travel plan including:
         1. Summary of the trip
@@ -222,13 +514,15 @@ class GeminiClient:
         """
         
         try:
-            response = self.model.generate_content(plan_prompt)
+            with track_upstream("gemini", "plan_summary"):
+                response = self.model.generate_content(plan_prompt)
             return response.text
         except Exception as e:
             return self._mock_trip_plan(prompt, tool_results)
 
     def _mock_trip_plan(self, prompt: str, tool_results: Dict[str, Any]) -> str:
         """Generate mock trip plan when API is not available"""
+        record_fallback("gemini")
         destination = tool_results.get("trip_details", {}).get("destination", "Rome")
         duration = tool_results.get("trip_details", {}).get("duration", 3)
         
@@ -0,0 +1,106 @@
+import asyncio
+import os
+from typing import Dict, Any, Optional
+from .cache import TieredCache
+from .maps_client import create_maps_client
+from .metrics import record_fallback
+
+# Coordinates for major cities, used when the Geocoding API is not available
+CITY_COORDINATES = {
+    "rome": (41.9028, 12.4964),
+    "paris": (48.8566, 2.3522),
+    "london": (51.5074, -0.1278),
+    "tokyo": (35.6762, 139.6503),
+    "barcelona": (41.3851, 2.1734),
+    "new york": (40.7128, -74.0060),
+    "berlin": (52.5200, 13.4050),
+    "madrid": (40.4168, -3.7038),
+    "amsterdam": (52.3676, 4.9041),
+    "sydney": (-33.8688, 151.2093),
+    "dubai": (25.2048, 55.2708),
+    "singapore": (1.3521, 103.8198),
+    "mumbai": (19.0760, 72.8777),
+    "moscow": (55.7558, 37.6176),
+    "istanbul": (41.0082, 28.9784),
+    "florence": (43.7696, 11.2558),
+    "venice": (45.4408, 12.3155)
+}
+
+class GeocodingService:
+    """Resolves a free-text destination to coordinates once and caches the answer"""
+
+    def __init__(self):
+        self.gmaps = create_maps_client()
+
+        # Places don't move, so geocodes can be kept for a long time
+        self.cache = TieredCache("geocode", ttl=float(os.getenv("GEOCODE_CACHE_TTL", 30 * 24 * 3600)))
+        self._pending = {}
+
+    async def resolve(self, location: str) -> Optional[Dict[str, Any]]:
+        """Get lat/lng, viewport and formatted address for a location, or None if it can't be found
+
+        Concurrent lookups of the same location share a single upstream call.
+        """
+
+        key = location.strip().lower()
+
+        cached = await self.cache.get(key)
+        if cached is not None:
+            return cached or None
+
+        if key not in self._pending:
+            task = asyncio.ensure_future(self._geocode(location))
+            task.add_done_callback(lambda _: self._pending.pop(key, None))
+            self._pending[key] = task
+
+        return await asyncio.shield(self._pending[key])
+
+    async def _geocode(self, location: str) -> Optional[Dict[str, Any]]:
+        if not self.gmaps:
+            return self._get_fallback_location(location)
+
+        key = location.strip().lower()
+
+        try:
+            results = self.gmaps.geocode(location)
+        except Exception as e:
+            print(f"Error geocoding {location}: {e}")
+            stale = await self.cache.get_stale(key)
+            if stale is not None:
+                return stale or None
+            return self._get_fallback_location(location)
+
+        if not results:
+            # Remember misses too, so unknown places don't hit the API on every request
+            await self.cache.set(key, {})
+            return None
+
+        geometry = results[0].get("geometry", {})
+        resolved = {
+            "lat": geometry.get("location", {}).get("lat"),
+            "lng": geometry.get("location", {}).get("lng"),
+            "viewport": geometry.get("viewport", {}),
+            "formatted_address": results[0].get("formatted_address", location)
+        }
+
+        await self.cache.set(key, resolved)
+        return resolved
+
+    def _get_fallback_location(self, location: str) -> Optional[Dict[str, Any]]:
+        """Look the location up in the built-in city table"""
+
+        record_fallback("geocoding")
+
+        location_lower = location.lower()
+        for city, (lat, lng) in CITY_COORDINATES.items():
+            if city in location_lower:
+                # Only the city centre; callers that need the exact spot must not rely on it
+                return {
+                    "lat": lat,
+                    "lng": lng,
+                    "viewport": {},
+                    "formatted_address": location,
+                    "approximate": True
+                }
+
+        return None
@@ -0,0 +1,123 @@
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, Any, Callable, Optional
+from .metrics import HEDGED_CALLS
+from .throttle import current_throttle, mark_slot_reserved
+
+class HedgeBudget:
+    """Global cap on hedges: every call earns `ratio` of a hedge, up to `burst` saved up"""
+
+    def __init__(self, ratio: float, burst: float):
+        self.ratio = ratio
+        self.burst = burst
+        self._credit = burst
+        self._lock = threading.Lock()
+
+    def earn(self):
+        with self._lock:
+            self._credit = min(self.burst, self._credit + self.ratio)
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            if self._credit < 1:
+                return False
+            self._credit -= 1
+            return True
+
+class Hedger:
+    """Runs an idempotent blocking call in the executor and, if it is still running at the
+    rolling p95 of that call's latency, fires a duplicate; the first success wins
+
+    Losing attempts can't be interrupted in their thread; they finish and are ignored.
+    """
+
+    def __init__(self, name: str, budget: HedgeBudget):
+        self.name = name
+        self.budget = budget
+        self.enabled = os.getenv("HEDGED_REQUESTS", "false").lower() == "true"
+        self.quantile = float(os.getenv("HEDGE_QUANTILE", 0.95))
+        self.min_samples = int(os.getenv("HEDGE_MIN_SAMPLES", 20))
+        self.min_delay = float(os.getenv("HEDGE_MIN_DELAY_MS", 50)) / 1000
+        # Latency of every attempt, hedges included, so hedging doesn't drag the p95 down
+        self._latencies = deque(maxlen=int(os.getenv("HEDGE_WINDOW", 200)))
+
+    def hedge_delay(self) -> Optional[float]:
+        """How long to wait before hedging, or None until enough latencies have been seen"""
+
+        if len(self._latencies) < self.min_samples:
+            return None
+        latencies = sorted(self._latencies)
+        return max(self.min_delay, latencies[min(len(latencies) - 1, int(len(latencies) * self.quantile))])
+
+    def _attempt(self, func: Callable[[], Any], slot_reserved: bool = False) -> asyncio.Future:
+        # Each attempt runs in its own copy of the context so its upstream timings reach Server-Timing
+        context = contextvars.copy_context()
+        if slot_reserved:
+            context.run(mark_slot_reserved)
+        start = time.perf_counter()
+        attempt = asyncio.get_running_loop().run_in_executor(None, context.run, func)
+
+        def finished(future: asyncio.Future):
+            if future.cancelled():
+                return
+            # Retrieving the exception keeps an ignored loser from being logged as never retrieved
+            if future.exception() is None:
+                self._latencies.append(time.perf_counter() - start)
+
+        attempt.add_done_callback(finished)
+        return attempt
+
+    async def run(self, func: Callable[[], Any]) -> Any:
+        throttle = current_throttle()
+        if throttle is not None:
+            # Throttled background work waits its turn without holding a thread, and is never hedged
+            await throttle.acquire()
+            return await self._attempt(func, slot_reserved=True)
+
+        primary = self._attempt(func)
+        delay = self.hedge_delay() if self.enabled else None
+        self.budget.earn()
+        if delay is None:
+            return await primary
+
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done:
+            return primary.result()
+
+        if not self.budget.try_spend():
+            HEDGED_CALLS.inc(call=self.name, outcome="capped")
+            return await primary
+
+        hedge = self._attempt(func)
+        pending = {primary, hedge}
+        first_error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for attempt in done:
+                if attempt.exception() is None:
+                    HEDGED_CALLS.inc(call=self.name, outcome="won" if attempt is hedge else "lost")
+                    return attempt.result()
+                first_error = first_error or attempt.exception()
+
+        HEDGED_CALLS.inc(call=self.name, outcome="failed")
+        raise first_error
+
+_budget: Optional[HedgeBudget] = None
+_hedgers: Dict[str, Hedger] = {}
+
+def get_hedger(name: str) -> Hedger:
+    """The shared hedger for one kind of call; all of them draw on one global budget"""
+
+    global _budget
+    if _budget is None:
+        _budget = HedgeBudget(
+            ratio=float(os.getenv("HEDGE_MAX_RATE", 0.05)),
+            burst=float(os.getenv("HEDGE_BURST", 10))
+        )
+    if name not in _hedgers:
+        _hedgers[name] = Hedger(name, _budget)
+    return _hedgers[name]
@@ -1,80 +1,171 @@
 import os
-import googlemaps
-from typing import List, Dict, Any
+import time
+from functools import partial
+from typing import List, Dict, Any, AsyncIterator
 import json
+from .cache import TieredCache, cache_key
+from .records import Hotel, compact_section
+from .spatial_index import place_index
+from .place_details import PlaceDetailsService, basic_place, fetch_next_page, PAGE_TOKEN_DELAY
+from .maps_client import create_maps_client
+from .metrics import record_fallback
+
+# Radius of the nearby search for hotels
+HOTEL_SEARCH_RADIUS_KM = 5
 
 class HotelsService:
     def __init__(self):
-        api_key = os.getenv("GOOGLE_MAPS_API_KEY")
-        if api_key:
-            self.gmaps = googlemaps.Client(key=api_key)
-        else:
-            self.gmaps = None
+        self.gmaps = create_maps_client()
+
+        # Search results are shared by every server worker through the on-disk tier
+        self.cache = TieredCache("hotels", ttl=float(os.getenv("PLACES_CACHE_TTL", 21600)), decode=partial(compact_section, "hotels"))
+        self.place_details = PlaceDetailsService()
+        # "basic" lists hotels straight from the search results; "full" also fetches reviews and photos
+        self.detail_level = os.getenv("PLACES_DETAIL_LEVEL", "basic")
+
+    async def search_hotels(self, location: str, budget: str = "moderate", requirements: List[str] = None, coordinates: Dict[str, float] = None, detail_level: str = None) -> List[Dict[str, Any]]:
+        """Search for hotels using Google Places API
 
-    async def search_hotels(self, location: str, budget: str = "moderate", requirements: List[str] = None) -> List[Dict[str, Any]]:
-        """Search for hotels using Google Places API"""
+        Pass the destination's resolved coordinates ({"lat", "lng"}) to anchor the
+        search without geocoding the location text again. In "basic" detail level
+        reviews and photos are left empty; fetch them per hotel from PlaceDetailsService.
+        """
+        
+        detail_level = detail_level or self.detail_level
         
         if not self.gmaps:
             # Return mock data if API key not available
             return self._get_mock_hotels(location, budget)
         
+        # Answer from the local index when we've already searched this area for lodging
+        if coordinates:
+            indexed_hotels = place_index.query(coordinates, HOTEL_SEARCH_RADIUS_KM, 'lodging', detail_level)
+            if indexed_hotels is not None:
+                return self._rank_hotels(indexed_hotels, budget)
+        
+        key = cache_key("search_hotels", location.lower(), budget, detail_level)
+        cached_hotels = await self.cache.get(key)
+        if cached_hotels is not None:
+            return cached_hotels
+        
         try:
             # Search for hotels near the location
             places_result = self.gmaps.places_nearby(
-                location=location,
-                radius=5000,  # 5km radius
+                location=(coordinates["lat"], coordinates["lng"]) if coordinates else location,
+                radius=HOTEL_SEARCH_RADIUS_KM * 1000,
                 type='lodging'
             )
             
             hotels = []
             for place in places_result.get('results', [])[:10]:  # Limit to 10 hotels
                 
-                # Get additional details
-                place_id = place.get('place_id')
-                place_details = self.gmaps.place(
-                    place_id=place_id,
-                    fields=['name', 'rating', 'price_level', 'formatted_address', 'geometry', 'photos', 'reviews']
-                )
-                
-                details = place_details.get('result', {})
-                
-                hotel = {
-                    "name": details.get('name', 'Unknown Hotel'),
-                    "rating": details.get('rating', 0),
-                    "price_level": details.get('price_level', 2),
-                    "address": details.get('formatted_address', ''),
-                    "coordinates": details.get('geometry', {}).get('location', {}),
-                    "photos": [photo.get('photo_reference', '') for photo in details.get('photos', [])],
-                    "reviews": [
-                        {
-                            "author": review.get('author_name', ''),
-                            "rating": review.get('rating', 0),
-                            "text": review.get('text', '')[:200] + '...' if len(review.get('text', '')) > 200 else review.get('text', '')
-                        }
-                        for review in details.get('reviews', [])[:3]
-                    ]
-                }
+                # Heavy fields are only fetched in full detail mode
+                details = basic_place(place)
+                if detail_level == "full":
+                    details = await self.place_details.get_place_details(place.get('place_id')) or details
                 
-                # Add estimated price based on price level
-                price_ranges = {
-                    0: "$50-100",
-                    1: "$100-150", 
-                    2: "$150-250",
-                    3: "$250-400",
-                    4: "$400+"
-                }
-                hotel["estimated_price"] = price_ranges.get(details.get('price_level', 2), "$150-250")
-                
-                hotels.append(hotel)
+                hotels.append(self._build_hotel(details))
             
-            # Sort by rating and filter by budget
-            hotels = self._filter_by_budget(hotels, budget)
-            return sorted(hotels, key=lambda x: x['rating'], reverse=True)
+            # Index the hotels this search kept before the budget filter, so other budgets
+            # (which filter the same top 10) can be served locally
+            if coordinates:
+                place_index.add(hotels, 'lodging', coordinates, HOTEL_SEARCH_RADIUS_KM, detail_level)
+            
+            hotels = self._rank_hotels(hotels, budget)
+            await self.cache.set(key, hotels)
+            return hotels
             
         except Exception as e:
             print(f"Error searching hotels: {e}")
+            # While Places is failing (or its circuit is open) an expired result beats mock data
+            stale_hotels = await self.cache.get_stale(key)
+            if stale_hotels is not None:
+                return stale_hotels
             return self._get_mock_hotels(location, budget)
 
+    async def iter_hotel_pages(self, location: str, budget: str = "moderate", coordinates: Dict[str, float] = None, page_token: str = None, ready_at: float = 0) -> AsyncIterator[Dict[str, Any]]:
+        """Yield hotels one upstream results page at a time
+
+        Each page is {"items": [...], "resume": {...} or None}; pass the resume values back
+        in as keyword arguments to continue after that page. The next page is only requested
+        when the consumer asks for it.
+        """
+        
+        if not self.gmaps:
+            yield {"items": self._get_mock_hotels(location, budget), "resume": None}
+            return
+        
+        search = partial(
+            self.gmaps.places_nearby,
+            location=(coordinates["lat"], coordinates["lng"]) if coordinates else location,
+            radius=HOTEL_SEARCH_RADIUS_KM * 1000,
+            type='lodging'
+        )
+        first_page = page_token is None
+        
+        while True:
+            try:
+                if page_token:
+                    places_result = await fetch_next_page(search, page_token, ready_at)
+                else:
+                    places_result = search()
+            except Exception as e:
+                print(f"Error searching hotels: {e}")
+                if first_page:
+                    yield {"items": self._get_mock_hotels(location, budget), "resume": None}
+                return
+            
+            first_page = False
+            page_token = places_result.get('next_page_token')
+            ready_at = time.time() + PAGE_TOKEN_DELAY
+            
+            hotels = self._rank_hotels(
+                [self._build_hotel(basic_place(place)) for place in places_result.get('results', [])],
+                budget
+            )
+            
+            # Pages with nothing in budget are skipped rather than returned empty
+            if hotels or not page_token:
+                yield {
+                    "items": hotels,
+                    "resume": {"page_token": page_token, "ready_at": ready_at} if page_token else None
+                }
+            
+            if not page_token:
+                return
+
+    def _build_hotel(self, details: Dict[str, Any]) -> Hotel:
+        """Build a hotel record from basic or full place details"""
+        
+        hotel = {
+            "place_id": details['place_id'],
+            "name": details.get('name') or 'Unknown Hotel',
+            "rating": details.get('rating', 0),
+            "price_level": details['price_level'] if details.get('price_level') is not None else 2,
+            "address": details.get('address', ''),
+            "coordinates": details.get('coordinates', {}),
+            "photos": details.get('photos', []),
+            "reviews": details.get('reviews', [])
+        }
+        
+        # Add estimated price based on price level
+        price_ranges = {
+            0: "$50-100",
+            1: "$100-150", 
+            2: "$150-250",
+            3: "$250-400",
+            4: "$400+"
+        }
+        hotel["estimated_price"] = price_ranges.get(hotel["price_level"], "$150-250")
+        
+        return Hotel.from_dict(hotel)
+
+    def _rank_hotels(self, hotels: List[Dict[str, Any]], budget: str) -> List[Dict[str, Any]]:
+        """Filter hotels by budget and sort by rating"""
+        
+        hotels = self._filter_by_budget(hotels, budget)
+        return sorted(hotels, key=lambda x: x['rating'], reverse=True)
+
     def _filter_by_budget(self, hotels: List[Dict[str, Any]], budget: str) -> List[Dict[str, Any]]:
         """Filter hotels by budget preference"""
         
@@ -90,6 +181,8 @@ class HotelsService:
     def _get_mock_hotels(self, location: str, budget: str) -> List[Dict[str, Any]]:
         """Return mock hotel data when API is not available"""
         
+        record_fallback("hotels")
+        
         mock_hotels = [
             {
                 "name": f"Grand Hotel {location}",
@@ -0,0 +1,305 @@
+import asyncio
+import json
+import os
+import sqlite3
+import time
+import uuid
+from typing import Dict, Any, Optional, Callable, Awaitable, AsyncIterator
+from .records import record_default
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+
+FINISHED_STATES = (COMPLETED, FAILED)
+
+class JobQueue:
+    """Durable SQLite-backed queue of trip planning jobs with a pool of async workers"""
+
+    def __init__(self, db_path: str = None, workers: int = None):
+        self.db_path = db_path or os.getenv("JOB_QUEUE_PATH", "jobs.sqlite")
+        self.workers = workers or int(os.getenv("JOB_WORKERS", 2))
+        self.poll_interval = float(os.getenv("JOB_POLL_INTERVAL", 1.0))
+        # A running job whose lease expires is assumed lost (e.g. the worker was restarted) and is retried
+        self.lease_seconds = float(os.getenv("JOB_LEASE_SECONDS", 120))
+        self.max_attempts = int(os.getenv("JOB_MAX_ATTEMPTS", 3))
+        # Finished jobs are deleted this long after they finish
+        self.retention_seconds = float(os.getenv("JOB_RETENTION_SECONDS", 7 * 24 * 3600))
+
+        self._wakeup = None
+        self._worker_tasks = []
+        self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        # A new connection per operation keeps the queue safe to use from several worker processes
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _init_db(self):
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    prompt TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    result TEXT,
+                    error TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    claimed_by TEXT,
+                    lease_expires_at REAL,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            columns = [row["name"] for row in conn.execute("PRAGMA table_info(jobs)")]
+            if "claimed_by" not in columns:
+                # Queues created before leases were tied to a claim
+                conn.execute("ALTER TABLE jobs ADD COLUMN claimed_by TEXT")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at)")
+        finally:
+            conn.close()
+
+    async def _run(self, func: Callable[..., Any], *args) -> Any:
+        # SQLite may wait on another process's lock; keep that off the event loop
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+    async def enqueue(self, prompt: str) -> Dict[str, Any]:
+        """Add a new job to the queue and wake up an idle worker"""
+
+        job = await self._run(self._insert, prompt)
+
+        if self._wakeup:
+            self._wakeup.set()
+
+        return job
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get a job by id, or None if it doesn't exist"""
+
+        return await self._run(self._get, job_id)
+
+    def _insert(self, prompt: str) -> Dict[str, Any]:
+        now = time.time()
+        job_id = uuid.uuid4().hex
+
+        conn = self._connect()
+        try:
+            conn.execute(
+                "INSERT INTO jobs (id, prompt, status, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (job_id, prompt, QUEUED, now, now)
+            )
+        finally:
+            conn.close()
+
+        return self._get(job_id)
+
+    def _get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        finally:
+            conn.close()
+
+        if not row:
+            return None
+
+        return {
+            "job_id": row["id"],
+            "status": row["status"],
+            "prompt": row["prompt"],
+            "result": json.loads(row["result"]) if row["result"] else None,
+            "error": row["error"],
+            "attempts": row["attempts"],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"]
+        }
+
+    def _claim(self) -> Optional[Dict[str, Any]]:
+        """Atomically take the oldest queued job (or one whose lease expired)
+
+        The returned job carries a claim token; only the holder of the current claim can
+        renew its lease or finish it.
+        """
+
+        now = time.time()
+        claim = uuid.uuid4().hex
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                """
+                SELECT id, prompt, attempts FROM jobs
+                WHERE status = ? OR (status = ? AND lease_expires_at < ?)
+                ORDER BY created_at
+                LIMIT 1
+                """,
+                (QUEUED, RUNNING, now)
+            ).fetchone()
+
+            if not row:
+                conn.execute("COMMIT")
+                return None
+
+            if row["attempts"] >= self.max_attempts:
+                conn.execute(
+                    "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE id = ?",
+                    (FAILED, "Job exceeded the maximum number of attempts", now, row["id"])
+                )
+                conn.execute("COMMIT")
+                return None
+
+            conn.execute(
+                "UPDATE jobs SET status = ?, attempts = attempts + 1, claimed_by = ?, lease_expires_at = ?, updated_at = ? WHERE id = ?",
+                (RUNNING, claim, now + self.lease_seconds, now, row["id"])
+            )
+            conn.execute("COMMIT")
+            return {"id": row["id"], "prompt": row["prompt"], "claim": claim}
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def _renew(self, job: Dict[str, Any]) -> bool:
+        """Extend the lease of a claimed job; False if the claim was lost"""
+
+        now = time.time()
+        conn = self._connect()
+        try:
+            cursor = conn.execute(
+                "UPDATE jobs SET lease_expires_at = ?, updated_at = ? WHERE id = ? AND status = ? AND claimed_by = ?",
+                (now + self.lease_seconds, now, job["id"], RUNNING, job["claim"])
+            )
+            return cursor.rowcount == 1
+        finally:
+            conn.close()
+
+    def _finish(self, job: Dict[str, Any], status: str, result: Any = None, error: str = None) -> bool:
+        """Store the outcome of a claimed job; False (and nothing stored) if the claim was lost"""
+
+        conn = self._connect()
+        try:
+            cursor = conn.execute(
+                """
+                UPDATE jobs SET status = ?, result = ?, error = ?, lease_expires_at = NULL, updated_at = ?
+                WHERE id = ? AND status = ? AND claimed_by = ?
+                """,
+                (
+                    status, json.dumps(result, default=record_default) if result is not None else None, error,
+                    time.time(), job["id"], RUNNING, job["claim"]
+                )
+            )
+            return cursor.rowcount == 1
+        finally:
+            conn.close()
+
+    def _purge(self) -> int:
+        """Delete jobs that finished more than retention_seconds ago"""
+
+        conn = self._connect()
+        try:
+            cursor = conn.execute(
+                f"DELETE FROM jobs WHERE status IN ({', '.join('?' for _ in FINISHED_STATES)}) AND updated_at < ?",
+                (*FINISHED_STATES, time.time() - self.retention_seconds)
+            )
+            return cursor.rowcount
+        finally:
+            conn.close()
+
+    async def start(self, handler: Callable[[str], Awaitable[Dict[str, Any]]]):
+        """Start the worker pool; each worker runs handler(prompt) for one job at a time"""
+
+        self._wakeup = asyncio.Event()
+        self._worker_tasks = [
+            asyncio.create_task(self._worker(handler))
+            for _ in range(self.workers)
+        ]
+        self._worker_tasks.append(asyncio.create_task(self._purge_finished()))
+
+    async def stop(self):
+        """Stop the worker pool; interrupted jobs are retried once their lease expires"""
+
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+
+    async def _worker(self, handler: Callable[[str], Awaitable[Dict[str, Any]]]):
+        while True:
+            try:
+                job = await self._run(self._claim)
+            except sqlite3.Error as e:
+                print(f"Error claiming job: {e}")
+                job = None
+
+            if not job:
+                # Sleep until a job is enqueued in this process, or poll for jobs from other processes
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            heartbeat = asyncio.create_task(self._heartbeat(job))
+            try:
+                result = await handler(job["prompt"])
+                status, error = COMPLETED, None
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error running job {job['id']}: {e}")
+                result, status, error = None, FAILED, str(e)
+            finally:
+                heartbeat.cancel()
+
+            try:
+                if not await self._run(self._finish, job, status, result, error):
+                    print(f"Dropped result of job {job['id']}: its lease was taken over by another worker")
+            except sqlite3.Error as e:
+                print(f"Error finishing job {job['id']}: {e}")
+
+    async def _heartbeat(self, job: Dict[str, Any]):
+        """Keep renewing the lease of a running job so long plans aren't claimed twice"""
+
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                if not await self._run(self._renew, job):
+                    print(f"Lost the lease on job {job['id']}")
+                    return
+            except sqlite3.Error as e:
+                print(f"Error renewing lease on job {job['id']}: {e}")
+
+    async def _purge_finished(self):
+        while True:
+            try:
+                await self._run(self._purge)
+            except sqlite3.Error as e:
+                print(f"Error purging finished jobs: {e}")
+            await asyncio.sleep(min(self.retention_seconds, 3600))
+
+    async def watch(self, job_id: str, timeout: float = 60) -> AsyncIterator[Dict[str, Any]]:
+        """Yield the job every time its status changes, until it finishes or the timeout passes"""
+
+        deadline = time.time() + timeout
+        last_status = None
+
+        while True:
+            job = await self.get(job_id)
+            if not job:
+                return
+
+            if job["status"] != last_status:
+                last_status = job["status"]
+                yield job
+
+            if job["status"] in FINISHED_STATES or time.time() >= deadline:
+                return
+
+            await asyncio.sleep(min(self.poll_interval, 0.5))
@@ -0,0 +1,32 @@
+import os
+import googlemaps
+from typing import Optional
+from .metrics import track_upstream
+
+class InstrumentedClient(googlemaps.Client):
+    """googlemaps client that times every Maps API request"""
+
+    def _request(self, url, params, first_request_time=None, *args, **kwargs):
+        # Retries call _request again with first_request_time set; time the outer call only
+        if first_request_time is not None:
+            return super()._request(url, params, first_request_time, *args, **kwargs)
+
+        # "/maps/api/place/nearbysearch/json" -> "place.nearbysearch"
+        operation = ".".join(part for part in url.strip("/").split("/")[2:] if part != "json")
+        with track_upstream("google_maps", operation or url):
+            return super()._request(url, params, first_request_time, *args, **kwargs)
+
+def create_maps_client() -> Optional[googlemaps.Client]:
+    """Maps client for GOOGLE_MAPS_API_KEY, or None when no key is configured (mock mode)
+
+    GOOGLE_MAPS_BASE_URL points the client at another host, e.g. the load-test stubs.
+    """
+
+    api_key = os.getenv("GOOGLE_MAPS_API_KEY")
+    if not api_key:
+        return None
+
+    base_url = os.getenv("GOOGLE_MAPS_BASE_URL")
+    if base_url:
+        return InstrumentedClient(key=api_key, base_url=base_url.rstrip("/"))
+    return InstrumentedClient(key=api_key)
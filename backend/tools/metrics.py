@@ -0,0 +1,293 @@
+import asyncio
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional, Tuple
+from .circuit_breaker import CircuitOpenError, check_shedding, get_breaker
+from .throttle import charge_upstream_call
+
+# Latency buckets in seconds, from cache hits up to slow LLM calls
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Event-loop lag buckets; anything past a few milliseconds means a blocking call held the loop
+LOOP_LAG_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, description: str, label_names: Tuple[str, ...] = ()):
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def _format_labels(self, key: Tuple[str, ...], extra: str = "") -> str:
+        pairs = [f'{name}="{value}"' for name, value in zip(self.label_names, key)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def snapshot(self) -> Dict[Tuple[str, ...], float]:
+        """Copy of the values, safe to iterate while other threads keep counting"""
+
+        with self._lock:
+            return dict(self.values)
+
+    def render(self) -> List[str]:
+        return super().render() + [
+            f"{self.name}{self._format_labels(key)} {value}" for key, value in sorted(self.snapshot().items())
+        ]
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: Tuple[float, ...] = LATENCY_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = buckets
+        # key -> (per-bucket counts, sum, count)
+        self.values: Dict[Tuple[str, ...], List[Any]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self.values.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def snapshot(self) -> Dict[Tuple[str, ...], List[Any]]:
+        with self._lock:
+            return {key: [list(counts), total, count] for key, (counts, total, count) in self.values.items()}
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        for key, (counts, total, count) in sorted(self.snapshot().items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                bucket_labels = self._format_labels(key, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            inf_labels = self._format_labels(key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{inf_labels} {count}")
+            lines.append(f"{self.name}_sum{self._format_labels(key)} {total}")
+            lines.append(f"{self.name}_count{self._format_labels(key)} {count}")
+        return lines
+
+STAGE_LATENCY = Histogram(
+    "travel_planner_stage_seconds", "Latency of planning stages (prompt analysis, tools, summary)", ("stage",)
+)
+UPSTREAM_LATENCY = Histogram(
+    "travel_planner_upstream_seconds", "Latency of upstream API calls", ("service", "operation", "outcome")
+)
+IN_FLIGHT = Gauge("travel_planner_in_flight", "Stages and upstream calls currently running", ("stage",))
+MOCK_FALLBACKS = Counter("travel_planner_mock_fallbacks_total", "Responses served from mock data", ("service",))
+CACHE_LOOKUPS = Counter("travel_planner_cache_lookups_total", "Cache lookups by tier that answered", ("cache", "result"))
+EVENT_LOOP_LAG = Histogram(
+    "travel_planner_event_loop_lag_seconds", "How much later than scheduled the event loop woke a timer", buckets=LOOP_LAG_BUCKETS
+)
+LOOP_BLOCKS = Counter(
+    "travel_planner_event_loop_blocks_total", "Callbacks caught holding the event loop, by service method", ("location",)
+)
+CIRCUIT_REJECTIONS = Counter(
+    "travel_planner_circuit_rejections_total", "Upstream calls failed fast because the circuit was open", ("service",)
+)
+HEDGED_CALLS = Counter(
+    "travel_planner_hedged_calls_total",
+    "Calls still running at their p95: hedge won, primary won (lost), both failed, or hedge budget exhausted (capped)",
+    ("call", "outcome")
+)
+PLAN_ADMISSIONS = Counter(
+    "travel_planner_plan_admissions_total",
+    "Plan requests by admission outcome (admitted, degraded, rejected, timed_out, evicted)",
+    ("outcome",)
+)
+PLAN_QUEUE_WAIT = Histogram("travel_planner_plan_queue_seconds", "Time plan requests waited for an admission slot")
+REPLAN_TOOLS = Counter(
+    "travel_planner_replan_tools_total", "Tool results of re-plans, reused from the session or rerun", ("tool", "result")
+)
+PLAN_QUEUE_DEPTH = Gauge("travel_planner_plan_queue_depth", "Plan requests waiting for an admission slot")
+
+METRICS = [
+    STAGE_LATENCY, UPSTREAM_LATENCY, IN_FLIGHT, MOCK_FALLBACKS, CACHE_LOOKUPS, EVENT_LOOP_LAG, LOOP_BLOCKS,
+    CIRCUIT_REJECTIONS, HEDGED_CALLS, PLAN_ADMISSIONS, PLAN_QUEUE_WAIT, PLAN_QUEUE_DEPTH, REPLAN_TOOLS
+]
+
+# Stage name -> [total seconds, calls] for the request being handled, feeds Server-Timing
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+
+def _record_timing(name: str, seconds: float):
+    timings = _request_timings.get()
+    if timings is not None:
+        entry = timings.setdefault(name, [0.0, 0])
+        entry[0] += seconds
+        entry[1] += 1
+
+@contextmanager
+def track_stage(stage: str):
+    """Time a planning stage into the stage histogram, the in-flight gauge and Server-Timing"""
+
+    IN_FLIGHT.inc(stage=stage)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        IN_FLIGHT.dec(stage=stage)
+        STAGE_LATENCY.observe(elapsed, stage=stage)
+        _record_timing(stage, elapsed)
+
+@contextmanager
+def track_upstream(service: str, operation: str):
+    """Time one upstream call, labelled with whether it raised
+
+    The call also goes through the service's circuit breaker: while the circuit is open this
+    raises CircuitOpenError without running the body, and services fall back as for any error.
+    Calls made from a degraded plan (shed_upstream_calls) fail the same way.
+    Calls made under throttle_upstream_calls count against that throttle.
+    """
+
+    check_shedding(service)
+    breaker = get_breaker(service)
+    if breaker is not None:
+        try:
+            breaker.before_call()
+        except CircuitOpenError:
+            CIRCUIT_REJECTIONS.inc(service=service)
+            raise
+    charge_upstream_call()
+
+    stage = f"{service}.{operation}"
+    IN_FLIGHT.inc(stage=stage)
+    start = time.perf_counter()
+    outcome = "error"
+    error = None
+    try:
+        yield
+        outcome = "ok"
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        IN_FLIGHT.dec(stage=stage)
+        UPSTREAM_LATENCY.observe(elapsed, service=service, operation=operation, outcome=outcome)
+        _record_timing(stage, elapsed)
+        if breaker is not None:
+            breaker.record(elapsed, error)
+
+async def monitor_event_loop_lag(interval: float = 0.1):
+    """Sleep in a loop and record how late each wake-up is; runs until cancelled"""
+
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG.observe(max(0.0, time.perf_counter() - start - interval))
+
+# Services that answered from mock or stale data while the current tool call ran
+_fallbacks = contextvars.ContextVar("fallbacks", default=None)
+
+@contextmanager
+def collect_fallbacks():
+    """Collect the services that fall back to mock or stale data inside this context"""
+
+    fallbacks = []
+    token = _fallbacks.set(fallbacks)
+    try:
+        yield fallbacks
+    finally:
+        _fallbacks.reset(token)
+
+def note_fallback(service: str):
+    fallbacks = _fallbacks.get()
+    if fallbacks is not None:
+        fallbacks.append(service)
+
+def record_fallback(service: str):
+    MOCK_FALLBACKS.inc(service=service)
+    note_fallback(service)
+
+def record_cache_lookup(cache: str, result: str):
+    """Count a lookup; result is the tier that answered (memory or disk) or miss"""
+
+    CACHE_LOOKUPS.inc(cache=cache, result=result)
+
+def render_metrics() -> str:
+    """All metrics in the Prometheus text exposition format, plus per-cache hit ratios"""
+
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+
+    lookups: Dict[str, List[float]] = {}
+    for (cache, result), count in CACHE_LOOKUPS.snapshot().items():
+        entry = lookups.setdefault(cache, [0, 0])
+        entry[1] += count
+        if result != "miss":
+            entry[0] += count
+
+    lines.append("# HELP travel_planner_cache_hit_ratio Share of cache lookups answered from memory or disk")
+    lines.append("# TYPE travel_planner_cache_hit_ratio gauge")
+    for cache, (hits, total) in sorted(lookups.items()):
+        lines.append(f'travel_planner_cache_hit_ratio{{cache="{cache}"}} {hits / total if total else 0}')
+
+    return "\n".join(lines) + "\n"
+
+class ServerTimingMiddleware:
+    """Collect the stage timings of each request and send them as a Server-Timing header"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings: Dict[str, List[float]] = {}
+        token = _request_timings.set(timings)
+        start = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                entries = [
+                    f"{name};dur={seconds * 1000:.1f}" + (f';desc="{calls}x"' if calls > 1 else "")
+                    for name, (seconds, calls) in timings.items()
+                ]
+                entries.append(f"total;dur={(time.perf_counter() - start) * 1000:.1f}")
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"server-timing", ", ".join(entries).encode("latin-1"))
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_timings.reset(token)
@@ -0,0 +1,69 @@
+import os
+import uuid
+from typing import Dict, Any, List, Optional, AsyncIterator
+from .cache import TieredCache
+from .hotels import HotelsService
+from .attractions import AttractionsService
+from .geocoding import GeocodingService
+
+class PlacesPaginator:
+    """Cursor-based "show more" pagination over hotel and attraction searches
+
+    The upstream next_page_token lives server-side in a cursor shared by every worker
+    through the disk cache; clients only ever see an opaque cursor id. Each request pulls
+    a single page from the service's page generator, so later pages are fetched on demand.
+    """
+
+    def __init__(self, hotels_service: HotelsService, attractions_service: AttractionsService, geocoding_service: GeocodingService):
+        self.hotels_service = hotels_service
+        self.attractions_service = attractions_service
+        self.geocoding_service = geocoding_service
+        # Google page tokens expire after a few minutes, so cursors don't need to outlive them
+        self.cursors = TieredCache("cursors", ttl=float(os.getenv("PAGE_CURSOR_TTL", 300)))
+
+    async def first_page(self, kind: str, location: str, budget: str = "moderate", interests: List[str] = None) -> Dict[str, Any]:
+        """Start a paginated hotels or attractions search and return its first page"""
+
+        resolved = await self.geocoding_service.resolve(location)
+        state = {
+            "kind": kind,
+            "location": location,
+            "coordinates": {"lat": resolved["lat"], "lng": resolved["lng"]} if resolved else None,
+            "budget": budget,
+            "interests": interests or [],
+            "resume": {}
+        }
+        return await self._take_page(state)
+
+    async def next_page(self, cursor: str) -> Optional[Dict[str, Any]]:
+        """Return the page after a cursor, or None if the cursor is unknown or expired"""
+
+        state = await self.cursors.get(cursor)
+        if not state:
+            return None
+        return await self._take_page(state)
+
+    def _open_pages(self, state: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+        if state["kind"] == "hotels":
+            return self.hotels_service.iter_hotel_pages(
+                state["location"], state["budget"], state["coordinates"], **state["resume"]
+            )
+        return self.attractions_service.iter_attraction_pages(
+            state["location"], state["interests"], state["coordinates"], **state["resume"]
+        )
+
+    async def _take_page(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        pages = self._open_pages(state)
+        try:
+            page = await pages.__anext__()
+        except StopAsyncIteration:
+            page = {"items": [], "resume": None}
+        finally:
+            await pages.aclose()
+
+        cursor = None
+        if page["resume"]:
+            cursor = uuid.uuid4().hex
+            await self.cursors.set(cursor, {**state, "resume": page["resume"]})
+
+        return {"items": page["items"], "cursor": cursor}
@@ -0,0 +1,107 @@
+import asyncio
+import os
+import time
+import googlemaps
+from functools import partial
+from typing import List, Dict, Any, Optional, Callable
+from .cache import TieredCache
+from .hedging import get_hedger
+from .maps_client import create_maps_client
+
+# Heavy fields only requested when a place card is expanded (or in full detail mode)
+DETAIL_FIELDS = ['name', 'rating', 'price_level', 'formatted_address', 'geometry',
+                 'photos', 'reviews', 'opening_hours', 'types']
+
+# Google only accepts a next_page_token a couple of seconds after it was issued
+PAGE_TOKEN_DELAY = 2.0
+PAGE_TOKEN_RETRIES = 3
+
+async def fetch_next_page(search: Callable[..., Dict[str, Any]], page_token: str, ready_at: float = 0) -> Dict[str, Any]:
+    """Run a search for the page behind next_page_token, waiting without blocking until the token is active"""
+
+    delay = ready_at - time.time()
+    if delay > 0:
+        await asyncio.sleep(delay)
+
+    for attempt in range(PAGE_TOKEN_RETRIES):
+        try:
+            return search(page_token=page_token)
+        except googlemaps.exceptions.ApiError as e:
+            # INVALID_REQUEST means the token isn't active yet
+            if e.status != "INVALID_REQUEST" or attempt == PAGE_TOKEN_RETRIES - 1:
+                raise
+            await asyncio.sleep(PAGE_TOKEN_DELAY / 2)
+
+def format_reviews(reviews: List[Dict[str, Any]], limit: int = 3) -> List[Dict[str, Any]]:
+    """Keep the first few reviews with their text truncated to 200 characters"""
+
+    formatted = []
+    for review in reviews[:limit]:
+        text = review.get('text', '')
+        formatted.append({
+            "author": review.get('author_name', ''),
+            "rating": review.get('rating', 0),
+            "text": text[:200] + '...' if len(text) > 200 else text
+        })
+    return formatted
+
+def basic_place(place: Dict[str, Any]) -> Dict[str, Any]:
+    """Build a place record from the fields a search result already contains"""
+
+    return {
+        "place_id": place.get('place_id'),
+        "name": place.get('name'),
+        "rating": place.get('rating', 0),
+        "price_level": place.get('price_level'),
+        "address": place.get('formatted_address') or place.get('vicinity', ''),
+        "coordinates": place.get('geometry', {}).get('location', {}),
+        "types": place.get('types', []),
+        "photos": [],
+        "reviews": [],
+        "opening_hours": []
+    }
+
+class PlaceDetailsService:
+    """Fetches and caches the heavy Place Details fields for a single place"""
+
+    def __init__(self):
+        self.gmaps = create_maps_client()
+
+        self.cache = TieredCache("place_details", ttl=float(os.getenv("PLACE_DETAILS_CACHE_TTL", 86400)))
+        self.hedger = get_hedger("place_details")
+
+    async def get_place_details(self, place_id: str) -> Optional[Dict[str, Any]]:
+        """Get address, photos, reviews and opening hours for a place, or None if unavailable"""
+
+        if not self.gmaps:
+            return None
+
+        cached_details = await self.cache.get(place_id)
+        if cached_details is not None:
+            return cached_details
+
+        try:
+            place_details = await self.hedger.run(partial(self.gmaps.place, place_id=place_id, fields=DETAIL_FIELDS))
+        except Exception as e:
+            print(f"Error fetching place details for {place_id}: {e}")
+            return await self.cache.get_stale(place_id)
+
+        details = place_details.get('result', {})
+        if not details:
+            return None
+
+        place = {
+            "place_id": place_id,
+            "name": details.get('name'),
+            "rating": details.get('rating', 0),
+            "price_level": details.get('price_level'),
+            "address": details.get('formatted_address', ''),
+            "coordinates": details.get('geometry', {}).get('location', {}),
+            "types": details.get('types', []),
+            "photos": [photo.get('photo_reference', '') for photo in details.get('photos', [])],
+            "reviews": format_reviews(details.get('reviews', [])),
+            "opening_hours": details.get('opening_hours', {}).get('weekday_text', [])
+        }
+
+        await self.cache.set(place_id, place)
+        return place
@@ -0,0 +1,113 @@
+import math
+import numpy as np
+from typing import List
+
+# Google encodes coordinates with 5 decimal places
+POLYLINE_PRECISION = 1e5
+
+# Metres per degree of latitude, for the local flat projection used by the simplifier
+METERS_PER_DEGREE = 111_320.0
+
+def decode_polyline(encoded: str) -> np.ndarray:
+    """Decode a Google encoded polyline into an (n, 2) array of (lat, lng)
+
+    Every step is vectorized: bytes are grouped into 5-bit chunks per value with
+    reduceat, zigzag-decoded, and the deltas are summed with cumsum.
+    """
+
+    if not encoded:
+        return np.empty((0, 2))
+
+    data = np.frombuffer(encoded.encode("ascii"), dtype=np.uint8).astype(np.int64) - 63
+    if data.min() < 0 or data.max() > 63:
+        raise ValueError("Invalid polyline")
+
+    # A value ends at every byte without the continuation bit
+    ends = np.flatnonzero((data & 0x20) == 0)
+    if len(ends) == 0 or ends[-1] != len(data) - 1 or len(ends) % 2:
+        raise ValueError("Truncated polyline")
+
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    position = np.arange(len(data)) - np.repeat(starts, ends - starts + 1)
+    values = np.add.reduceat((data & 0x1F) << (5 * position), starts)
+
+    deltas = np.where(values & 1, ~(values >> 1), values >> 1)
+    return np.cumsum(deltas.reshape(-1, 2), axis=0) / POLYLINE_PRECISION
+
+def encode_polyline(points: np.ndarray) -> str:
+    """Encode an (n, 2) array of (lat, lng) as a Google polyline"""
+
+    if len(points) == 0:
+        return ""
+
+    scaled = np.round(np.asarray(points) * POLYLINE_PRECISION).astype(np.int64)
+    deltas = np.diff(scaled, axis=0, prepend=np.zeros((1, 2), dtype=np.int64)).ravel()
+    values = np.where(deltas < 0, ~(deltas << 1), deltas << 1)
+
+    chars = []
+    for value in values.tolist():
+        while value >= 0x20:
+            chars.append(chr((0x20 | (value & 0x1F)) + 63))
+            value >>= 5
+        chars.append(chr(value + 63))
+    return "".join(chars)
+
+def simplify_points(points: np.ndarray, tolerance_m: float) -> np.ndarray:
+    """Douglas-Peucker simplification keeping every point further than tolerance_m from the line"""
+
+    if len(points) < 3 or tolerance_m <= 0:
+        return points
+
+    # Project to local metres around the first point; accurate enough at city scale
+    x = (points[:, 1] - points[0, 1]) * METERS_PER_DEGREE * math.cos(math.radians(points[0, 0]))
+    y = (points[:, 0] - points[0, 0]) * METERS_PER_DEGREE
+
+    keep = np.zeros(len(points), dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+
+        x0, y0 = x[first], y[first]
+        dx, dy = x[last] - x0, y[last] - y0
+        length = math.hypot(dx, dy)
+
+        if length == 0:
+            distances = np.hypot(x[first + 1:last] - x0, y[first + 1:last] - y0)
+            threshold = tolerance_m
+        else:
+            # Cross product is distance-to-line times segment length, so compare against tolerance * length
+            distances = np.abs(dx * (y[first + 1:last] - y0) - dy * (x[first + 1:last] - x0))
+            threshold = tolerance_m * length
+
+        farthest = int(distances.argmax())
+        if distances[farthest] > threshold:
+            index = first + 1 + farthest
+            keep[index] = True
+            stack.append((first, index))
+            stack.append((index, last))
+
+    return points[keep]
+
+def simplify_polyline(encoded: str, tolerance_m: float) -> str:
+    """Decode, simplify and re-encode a polyline; returns the input unchanged if it can't be decoded"""
+
+    try:
+        points = decode_polyline(encoded)
+    except ValueError:
+        return encoded
+    return encode_polyline(simplify_points(points, tolerance_m))
+
+def join_polylines(polylines: List[str]) -> str:
+    """Merge consecutive polylines into one; falls back to the first if any can't be decoded"""
+
+    if len(polylines) == 1:
+        return polylines[0]
+
+    try:
+        return encode_polyline(np.concatenate([decode_polyline(polyline) for polyline in polylines]))
+    except ValueError:
+        return polylines[0]
@@ -0,0 +1,205 @@
+import asyncio
+import copy
+import os
+import time
+from typing import Dict, Any, List, Optional
+from .cache import DiskCache, TTLCache, cache_key, run_blocking
+from .hotels import HotelsService
+from .attractions import AttractionsService
+from .routes import RoutesService
+from .weather import WeatherService, trip_start_date
+from .geocoding import GeocodingService
+from .metrics import collect_fallbacks
+from .throttle import UpstreamThrottle, throttle_upstream_calls
+
+# Open-Meteo supports up to 16 forecast days, so bundles cover any trip length up to that
+BUNDLE_FORECAST_DAYS = 16
+
+def _split_env_list(name: str, default: str = "") -> List[str]:
+    return [item.strip() for item in os.getenv(name, default).split(",") if item.strip()]
+
+class DestinationPrewarmer:
+    """Periodically precomputes ready-to-serve bundles of tool results for popular destinations"""
+
+    def __init__(
+        self,
+        hotels_service: HotelsService,
+        attractions_service: AttractionsService,
+        routes_service: RoutesService,
+        weather_service: WeatherService,
+        geocoding_service: GeocodingService
+    ):
+        self.hotels_service = hotels_service
+        self.attractions_service = attractions_service
+        self.routes_service = routes_service
+        self.weather_service = weather_service
+        self.geocoding_service = geocoding_service
+
+        self.destinations = _split_env_list("PREWARM_DESTINATIONS")
+        self.budgets = _split_env_list("PREWARM_BUDGETS", "cheap,moderate,luxury")
+        # Interest profiles are separated by ";" and the interests inside a profile by ","
+        self.interest_profiles = [
+            sorted(interest.strip().lower() for interest in profile.split(",") if interest.strip())
+            for profile in os.getenv("PREWARM_INTERESTS", "historical,cultural").split(";")
+        ]
+        self.interval = float(os.getenv("PREWARM_INTERVAL_SECONDS", 3600))
+        # Upper bound on upstream calls per minute so warming never competes with live traffic for quota
+        self.calls_per_minute = float(os.getenv("PREWARM_CALLS_PER_MINUTE", 30))
+        self.throttle = UpstreamThrottle(self.calls_per_minute)
+
+        self.bundles = DiskCache("bundles", ttl=self.interval * 2)
+        # Decoded bundles, so tool calls don't read and parse the whole bundle every time
+        self.decoded_bundles = TTLCache(ttl=min(self.interval, 300), maxsize=max(1, len(self.destinations)))
+        self._destination_keys = {destination.lower() for destination in self.destinations}
+        self._task = None
+
+    async def start(self):
+        """Start the background warming loop if any destinations are configured"""
+
+        if self.destinations and not self._task:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            # Only one worker process warms per interval; the others just read the bundles
+            if await run_blocking(self.bundles.add, "prewarm:lock", os.getpid(), self.interval * 0.9):
+                for destination in self.destinations:
+                    try:
+                        await self.warm_destination(destination)
+                    except Exception as e:
+                        print(f"Error prewarming {destination}: {e}")
+
+            await asyncio.sleep(self.interval)
+
+    async def _rate_limited(self, coroutine_factory):
+        """Run one warming step with its upstream calls spaced to PREWARM_CALLS_PER_MINUTE
+
+        Returns (result, fell_back); fell_back is True when any service answered from mock
+        or stale data.
+        """
+
+        with throttle_upstream_calls(self.throttle), collect_fallbacks() as fallbacks:
+            result = await coroutine_factory()
+        # Pay for the calls that were made without waiting before starting the next step
+        await self.throttle.drain()
+        return result, bool(fallbacks)
+
+    async def warm_destination(self, destination: str) -> Dict[str, Any]:
+        """Run every cacheable service for a destination and store the results as one bundle
+
+        Sections only hold real upstream data: when a service falls back, the section from
+        the previous bundle is kept until it expires, or the section is left out.
+        """
+
+        now = time.time()
+        previous = await run_blocking(self.bundles.get, cache_key("bundle", destination.lower())) or {}
+        bundle = {
+            "destination": destination,
+            "built_at": now,
+            "hotels": {},
+            "attractions": {},
+            "routes": None,
+            "weather": None,
+            # When each section last got real data, by "hotels:<budget>", "attractions:<interests>", "routes", "weather"
+            "warmed_at": {}
+        }
+
+        def store(section: str, key: Optional[str], result: Any, fell_back: bool):
+            slot = f"{section}:{key}" if key is not None else section
+            if fell_back:
+                warmed_at = previous.get("warmed_at", {}).get(slot)
+                if warmed_at is None or warmed_at + self.bundles.ttl < now:
+                    return
+                result = previous[section][key] if key is not None else previous[section]
+            else:
+                warmed_at = now
+
+            if key is not None:
+                bundle[section][key] = result
+            else:
+                bundle[section] = result
+            bundle["warmed_at"][slot] = warmed_at
+
+        resolved, fell_back = await self._rate_limited(lambda: self.geocoding_service.resolve(destination))
+        # Approximate coordinates would anchor every search in the wrong place
+        coordinates = {"lat": resolved["lat"], "lng": resolved["lng"]} if resolved and not fell_back else None
+
+        # Places-backed sections are only worth bundling with real data behind them
+        if self.hotels_service.gmaps:
+            for budget in self.budgets:
+                store("hotels", budget, *await self._rate_limited(
+                    lambda: self.hotels_service.search_hotels(destination, budget, coordinates=coordinates)
+                ))
+
+        if self.attractions_service.gmaps:
+            for interests in self.interest_profiles:
+                store("attractions", ",".join(interests), *await self._rate_limited(
+                    lambda: self.attractions_service.get_attractions(destination, interests, coordinates)
+                ))
+
+        if self.routes_service.gmaps:
+            store("routes", None, *await self._rate_limited(
+                lambda: self.routes_service.get_sample_routes(destination, coordinates)
+            ))
+
+        store("weather", None, *await self._rate_limited(
+            lambda: self.weather_service.get_weather(destination, "Not specified", BUNDLE_FORECAST_DAYS, coordinates)
+        ))
+
+        await run_blocking(self.bundles.set, cache_key("bundle", destination.lower()), bundle)
+        self.decoded_bundles.set(destination.lower(), bundle)
+        return bundle
+
+    async def get_bundle(self, destination: str) -> Optional[Dict[str, Any]]:
+        """The stored bundle for a destination, or None if it isn't configured or warmed yet
+
+        The bundle is shared; callers must copy what they hand out.
+        """
+
+        key = destination.lower()
+        if key not in self._destination_keys:
+            return None
+
+        bundle = self.decoded_bundles.get(key)
+        if bundle is None:
+            bundle = await run_blocking(self.bundles.get, cache_key("bundle", key)) or {}
+            # Remember a missing bundle briefly too; the warming worker may store it any moment
+            self.decoded_bundles.set(key, bundle, ttl=None if bundle else 30)
+        return bundle or None
+
+    async def get_hotels(self, destination: str, budget: str) -> Optional[List[Dict[str, Any]]]:
+        bundle = await self.get_bundle(destination)
+        return copy.deepcopy(bundle["hotels"].get(budget)) if bundle else None
+
+    async def get_attractions(self, destination: str, interests: List[str]) -> Optional[List[Dict[str, Any]]]:
+        bundle = await self.get_bundle(destination)
+        key = ",".join(sorted(interest.lower() for interest in interests or []))
+        return copy.deepcopy(bundle["attractions"].get(key)) if bundle else None
+
+    async def get_sample_routes(self, destination: str) -> Optional[List[Dict[str, Any]]]:
+        bundle = await self.get_bundle(destination)
+        return copy.deepcopy(bundle["routes"]) if bundle else None
+
+    async def get_weather(self, destination: str, dates: str, duration: int) -> Optional[Dict[str, Any]]:
+        """Serve weather from the bundle for the trip's days, or None if the bundle doesn't cover them"""
+
+        bundle = await self.get_bundle(destination)
+        if not bundle or not bundle["weather"]:
+            return None
+
+        forecast = bundle["weather"].get("forecast", [])
+        start = trip_start_date(dates)
+        if start:
+            forecast = [day for day in forecast if day["date"] >= start.isoformat()]
+            if not forecast or forecast[0]["date"] != start.isoformat():
+                return None
+
+        weather = copy.deepcopy({**bundle["weather"], "forecast": forecast[:duration]})
+        weather["recommendations"] = self.weather_service._generate_recommendations(weather["forecast"])
+        return weather
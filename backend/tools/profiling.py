@@ -0,0 +1,204 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter as TallyCounter
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional
+from .metrics import LOOP_BLOCKS
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Frames inside these files are the detector itself, not the code that blocked
+_OWN_FILES = {os.path.join(TOOLS_DIR, "profiling.py"), os.path.join(TOOLS_DIR, "metrics.py")}
+
+# Innermost functions of a thread that is waiting rather than working
+_IDLE_FILES = ("selectors.py", "threading.py", "queue.py")
+
+def describe_frame(frame) -> str:
+    """Class.method for methods, otherwise module.function"""
+
+    owner = frame.f_locals.get("self")
+    if owner is not None:
+        return f"{type(owner).__name__}.{frame.f_code.co_name}"
+    module = os.path.splitext(os.path.basename(frame.f_code.co_filename))[0]
+    return f"{module}.{frame.f_code.co_name}"
+
+def blocking_location(frame) -> str:
+    """Innermost service-code frame (a tools/ module) on the stack, or the innermost frame"""
+
+    current = frame
+    while current is not None:
+        filename = os.path.abspath(current.f_code.co_filename)
+        if filename.startswith(TOOLS_DIR) and filename not in _OWN_FILES:
+            return describe_frame(current)
+        current = current.f_back
+    return describe_frame(frame)
+
+class BlockingDetector:
+    """Watchdog thread that reports callbacks holding the event loop past a threshold
+
+    A heartbeat coroutine stamps the time on every loop turn; when the stamp goes stale the
+    watchdog samples the loop thread's stack, names the service method on it and logs it.
+    """
+
+    def __init__(self, threshold: float = None):
+        self.threshold = threshold or float(os.getenv("LOOP_BLOCK_THRESHOLD_MS", 100)) / 1000
+        self._last_beat = time.monotonic()
+        self._beat = 0
+        self._reported_beat = -1
+        self._loop_thread_id = None
+        self._heartbeat_task = None
+        self._stopped = threading.Event()
+
+    async def start(self):
+        """Start watching the running loop"""
+
+        if self._heartbeat_task:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._stopped.clear()
+        self._heartbeat_task = asyncio.create_task(self._heartbeat())
+        threading.Thread(target=self._watch, name="loop-block-detector", daemon=True).start()
+
+    async def stop(self):
+        self._stopped.set()
+        if self._heartbeat_task:
+            self._heartbeat_task.cancel()
+            await asyncio.gather(self._heartbeat_task, return_exceptions=True)
+            self._heartbeat_task = None
+
+    async def _heartbeat(self):
+        while True:
+            self._last_beat = time.monotonic()
+            self._beat += 1
+            await asyncio.sleep(self.threshold / 4)
+
+    def _watch(self):
+        while not self._stopped.wait(self.threshold / 4):
+            blocked_for = time.monotonic() - self._last_beat
+            # One report per stall, however long it lasts
+            if blocked_for > self.threshold and self._reported_beat != self._beat:
+                self._reported_beat = self._beat
+                self._report(blocked_for)
+
+    def _report(self, blocked_for: float):
+        frame = sys._current_frames().get(self._loop_thread_id)
+        if frame is None:
+            return
+
+        location = blocking_location(frame)
+        LOOP_BLOCKS.inc(location=location)
+        stack = "".join(traceback.format_stack(frame, limit=12))
+        print(f"⚠️  Event loop blocked for over {blocked_for * 1000:.0f} ms in {location}\n{stack}")
+
+class RequestProfiler:
+    """Sampling profiler armed for the next N /plan-trip requests
+
+    While any of those requests is running, a thread samples the stacks of the event-loop
+    thread and the executor threads and tallies them in the collapsed-stack format used by
+    flamegraph.pl, speedscope and similar tools.
+    """
+
+    def __init__(self, interval: float = None):
+        self.interval = interval or float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", 5)) / 1000
+        self._remaining = 0
+        self._active = 0
+        self._samples: TallyCounter = TallyCounter()
+        self._sampling = threading.Event()
+        self._done: Optional[asyncio.Event] = None
+        self._sampler: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._done is not None
+
+    async def profile(self, requests: int, timeout: float) -> Dict[str, Any]:
+        """Profile the next `requests` plan requests, or whatever ran until `timeout` seconds passed"""
+
+        if self.running:
+            raise RuntimeError("A profile is already being captured")
+
+        self._samples = TallyCounter()
+        self._remaining = requests
+        self._done = asyncio.Event()
+        try:
+            await asyncio.wait_for(self._done.wait(), timeout)
+            completed = requests
+        except asyncio.TimeoutError:
+            completed = requests - self._remaining - self._active
+        finally:
+            self._remaining = 0
+            await self._stop_sampling()
+            self._done = None
+
+        return {
+            "requests": completed,
+            "samples": sum(self._samples.values()),
+            "folded": "".join(f"{stack} {count}\n" for stack, count in self._samples.most_common())
+        }
+
+    @contextmanager
+    def request(self):
+        """Wrap a plan request; profiled if it is one of the next N"""
+
+        if self._remaining <= 0:
+            yield
+            return
+
+        self._remaining -= 1
+        self._active += 1
+        self._start_sampling()
+        try:
+            yield
+        finally:
+            self._active -= 1
+            if self._remaining <= 0 and self._active == 0 and self._done is not None:
+                # profile() joins the sampler thread off the loop once it wakes
+                self._sampling.clear()
+                self._done.set()
+
+    def _start_sampling(self):
+        if self._sampling.is_set():
+            return
+        self._sampling.set()
+        self._sampler = threading.Thread(
+            target=self._sample, args=(threading.get_ident(),), name="request-profiler", daemon=True
+        )
+        self._sampler.start()
+
+    async def _stop_sampling(self):
+        self._sampling.clear()
+        if self._sampler:
+            # The sampler may be mid-sleep; wait for it in an executor thread, not on the loop
+            await asyncio.get_running_loop().run_in_executor(None, self._sampler.join)
+            self._sampler = None
+
+    def _sample(self, loop_thread_id: int):
+        own_id = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+
+        while self._sampling.is_set():
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                if os.path.basename(frame.f_code.co_filename) in _IDLE_FILES:
+                    continue
+                if thread_id not in names:
+                    names = {thread.ident: thread.name for thread in threading.enumerate()}
+                root = "event-loop" if thread_id == loop_thread_id else names.get(thread_id, "thread")
+                self._samples[";".join([root] + self._stack(frame))] += 1
+            time.sleep(self.interval)
+
+    def _stack(self, frame) -> List[str]:
+        """Outermost-first frame labels; ";" separates frames in the folded format"""
+
+        labels = []
+        while frame is not None:
+            code = frame.f_code
+            labels.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        labels.reverse()
+        return labels
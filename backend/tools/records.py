@@ -0,0 +1,175 @@
+import sys
+from typing import Dict, Any, List, Optional
+
+class Record:
+    """Compact, slotted stand-in for one of the dicts the services put on the wire
+
+    Subclasses list their wire keys in __slots__ (in wire order) and map keys holding
+    nested records (or lists of them) in `nested`. from_dict/to_dict round-trip the dict
+    format exactly: keys that were absent stay absent and unknown keys are kept in `extra`.
+    """
+
+    __slots__ = ("extra",)
+    nested: Dict[str, type] = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._fields = cls.__slots__
+        cls._field_set = frozenset(cls.__slots__)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Record":
+        record = cls.__new__(cls)
+        extra = None
+
+        for key, value in data.items():
+            if key not in cls._field_set:
+                extra = extra or {}
+                extra[key] = value
+                continue
+
+            nested = cls.nested.get(key)
+            if nested is not None and isinstance(value, list):
+                value = [nested.from_dict(item) if isinstance(item, dict) else item for item in value]
+            elif nested is not None and isinstance(value, dict):
+                value = nested.from_dict(value)
+            elif isinstance(value, str) and len(value) <= 32:
+                # Codes, currencies, categories and travel modes repeat across every record
+                value = sys.intern(value)
+            setattr(record, key, value)
+
+        record.extra = extra
+        return record
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {}
+        for name in self._fields:
+            try:
+                value = getattr(self, name)
+            except AttributeError:
+                continue
+
+            if isinstance(value, Record):
+                value = value.to_dict()
+            elif isinstance(value, list) and value and isinstance(value[0], Record):
+                value = [item.to_dict() if isinstance(item, Record) else item for item in value]
+            data[name] = value
+
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+    def get(self, name: str, default: Any = None) -> Any:
+        try:
+            return self[name]
+        except KeyError:
+            return default
+
+    def __getitem__(self, name: str) -> Any:
+        if name in self._field_set and hasattr(self, name):
+            return getattr(self, name)
+        if self.extra and name in self.extra:
+            return self.extra[name]
+        raise KeyError(name)
+
+    def __setitem__(self, name: str, value: Any):
+        if name in self._field_set:
+            setattr(self, name, value)
+        else:
+            self.extra = self.extra or {}
+            self.extra[name] = value
+
+    def __contains__(self, name: str) -> bool:
+        return (name in self._field_set and hasattr(self, name)) or bool(self.extra and name in self.extra)
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+class LatLng(Record):
+    __slots__ = ("lat", "lng")
+
+class Review(Record):
+    __slots__ = ("author", "rating", "text")
+
+class Hotel(Record):
+    __slots__ = ("place_id", "name", "rating", "price_level", "address", "coordinates", "photos", "reviews",
+                 "estimated_price")
+    nested = {"coordinates": LatLng, "reviews": Review}
+
+class Attraction(Record):
+    __slots__ = ("place_id", "name", "rating", "price_level", "address", "coordinates", "photos", "types",
+                 "opening_hours", "reviews", "category", "estimated_visit_time", "pricing")
+    nested = {"coordinates": LatLng, "reviews": Review}
+
+class Price(Record):
+    __slots__ = ("total", "currency")
+
+class FlightEndpoint(Record):
+    __slots__ = ("airport", "terminal", "time")
+
+class FlightSegment(Record):
+    __slots__ = ("departure", "arrival", "carrier_code", "flight_number", "aircraft", "duration")
+    nested = {"departure": FlightEndpoint, "arrival": FlightEndpoint}
+
+class Itinerary(Record):
+    __slots__ = ("duration", "segments")
+    nested = {"segments": FlightSegment}
+
+class FlightOffer(Record):
+    __slots__ = ("price", "itineraries", "traveler_pricings")
+    nested = {"price": Price, "itineraries": Itinerary}
+
+class ForecastDay(Record):
+    __slots__ = ("date", "min_temp", "max_temp", "avg_temp", "humidity", "wind_speed", "weather_code",
+                 "description", "icon")
+
+class RouteStep(Record):
+    __slots__ = ("instruction", "distance", "duration", "start_location", "end_location", "travel_mode")
+    nested = {"start_location": LatLng, "end_location": LatLng}
+
+class RouteLeg(Record):
+    __slots__ = ("start_address", "end_address", "distance", "duration", "mode", "alternatives", "steps")
+    nested = {"steps": RouteStep}
+
+class Route(Record):
+    __slots__ = ("start_location", "end_location", "waypoints", "total_distance", "total_duration",
+                 "overview_polyline", "legs", "steps", "start_attraction", "end_attraction", "route_type")
+    nested = {"legs": RouteLeg, "steps": RouteStep}
+
+# Record type for the items of each list section of a plan
+SECTION_RECORDS = {
+    "hotels": Hotel,
+    "attractions": Attraction,
+    "flights": FlightOffer,
+    "routes": Route
+}
+
+def compact_section(name: str, value: Any) -> Any:
+    """Convert one plan section from wire dicts to records"""
+
+    if name == "weather" and isinstance(value, dict) and isinstance(value.get("forecast"), list):
+        return {**value, "forecast": [ForecastDay.from_dict(day) if isinstance(day, dict) else day for day in value["forecast"]]}
+
+    record_type = SECTION_RECORDS.get(name)
+    if record_type and isinstance(value, list):
+        return [record_type.from_dict(item) if isinstance(item, dict) else item for item in value]
+
+    return value
+
+def to_wire(value: Any) -> Any:
+    """Turn any records inside a plan (or part of one) back into plain dicts"""
+
+    if isinstance(value, Record):
+        return value.to_dict()
+    if isinstance(value, list):
+        return [to_wire(item) for item in value]
+    if isinstance(value, dict):
+        return {key: to_wire(item) for key, item in value.items()}
+    return value
+
+def record_default(value: Any) -> Dict[str, Any]:
+    """`default=` hook so json.dumps and orjson.dumps can serialize records directly"""
+
+    if isinstance(value, Record):
+        return value.to_dict()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
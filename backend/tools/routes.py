@@ -1,84 +1,278 @@
+import asyncio
 import os
-import googlemaps
-from typing import List, Dict, Any
+import hashlib
+from functools import partial
+from typing import List, Dict, Any, Optional
 import json
+from .cache import TieredCache, cache_key
+from .geocoding import GeocodingService
+from .polyline import simplify_polyline, encode_polyline, join_polylines
+from .spatial_index import haversine_km
+from .maps_client import create_maps_client
+from .metrics import record_fallback
+from .records import Route
+from .hedging import get_hedger
+
+WALKING_SPEED_KMH = 4.8
+
+# Streets are longer than the straight line; used to turn haversine distance into a walking estimate
+DETOUR_FACTOR = 1.3
 
 class RoutesService:
-    def __init__(self):
-        api_key = os.getenv("GOOGLE_MAPS_API_KEY")
-        if api_key:
-            self.gmaps = googlemaps.Client(key=api_key)
-        else:
-            self.gmaps = None
+    def __init__(self, geocoding_service: GeocodingService = None):
+        self.gmaps = create_maps_client()
+
+        # Used to place legs on the map so clearly walkable ones skip the Directions API
+        self.geocoding_service = geocoding_service
+
+        # Douglas-Peucker tolerance in metres for overview polylines (0 keeps them as returned)
+        self.polyline_tolerance = float(os.getenv("ROUTE_POLYLINE_TOLERANCE_M", 0))
+        # "full" returns every step, "lazy" serves them from get_route_steps, "none" drops them
+        self.step_detail = os.getenv("ROUTE_STEP_DETAIL", "full")
+        self.step_cache = TieredCache("route_steps", ttl=float(os.getenv("PLACES_CACHE_TTL", 21600)))
+
+        # Modes requested concurrently for every leg, and the thresholds used to pick one
+        self.modes = [mode.strip() for mode in os.getenv("ROUTE_MODES", "walking,transit,driving").split(",") if mode.strip()]
+        self.walk_only_km = float(os.getenv("ROUTE_WALK_ONLY_KM", 1.0))
+        self.max_walk_minutes = float(os.getenv("ROUTE_MAX_WALK_MINUTES", 20))
+        self.max_transit_ratio = float(os.getenv("ROUTE_MAX_TRANSIT_RATIO", 1.5))
+        self.directions_cache = TieredCache("directions", ttl=float(os.getenv("PLACES_CACHE_TTL", 21600)))
+        self.directions_hedger = get_hedger("directions")
 
-    async def get_routes(self, start_location: str, end_location: str, waypoints: List[str] = None) -> Dict[str, Any]:
-        """Get optimized route between locations with optional waypoints"""
+    async def get_routes(self, start_location: str, end_location: str, waypoints: List[str] = None, polyline_tolerance: float = None, step_detail: str = None) -> Dict[str, Any]:
+        """Get a route between locations with optional waypoints, choosing the travel mode per leg
+
+        Waypoints are visited in the given order. polyline_tolerance and step_detail
+        override ROUTE_POLYLINE_TOLERANCE_M and ROUTE_STEP_DETAIL for this call.
+        """
         
         if not self.gmaps:
             return self._get_mock_route(start_location, end_location, waypoints)
         
         try:
-            # Prepare waypoints for Google Directions API
-            waypoints_str = "|".join(waypoints) if waypoints else None
-            
-            # Get directions
-            directions_result = self.gmaps.directions(
-                origin=start_location,
-                destination=end_location,
-                waypoints=waypoints_str,
-                mode="driving",
-                optimize_waypoints=True if waypoints else False,
-                alternatives=False
-            )
+            # Every leg is routed independently, so all of them run at once
+            stops = [start_location] + (waypoints or []) + [end_location]
+            legs = await asyncio.gather(*[
+                self._get_best_leg(origin, destination)
+                for origin, destination in zip(stops, stops[1:])
+            ])
             
-            if not directions_result:
+            if not all(legs):
                 return self._get_mock_route(start_location, end_location, waypoints)
             
-            route = directions_result[0]
-            
             # Process route data
             route_info = {
                 "start_location": start_location,
                 "end_location": end_location,
                 "waypoints": waypoints or [],
-                "total_distance": route["legs"][0]["distance"]["text"],
-                "total_duration": route["legs"][0]["duration"]["text"],
-                "overview_polyline": route["overview_polyline"]["points"],
-                "legs": [],
+                "total_distance": self._format_distance(sum(leg["distance_m"] for leg in legs)),
+                "total_duration": self._format_duration(sum(leg["duration_s"] for leg in legs)),
+                "overview_polyline": join_polylines([leg["polyline"] for leg in legs]),
+                "legs": [leg["info"] for leg in legs],
                 "steps": []
             }
             
-            # Process each leg of the journey
-            for leg in route["legs"]:
-                leg_info = {
-                    "start_address": leg["start_address"],
-                    "end_address": leg["end_address"],
-                    "distance": leg["distance"]["text"],
-                    "duration": leg["duration"]["text"],
-                    "steps": []
-                }
-                
-                for step in leg["steps"]:
-                    step_info = {
-                        "instruction": step["html_instructions"],
-                        "distance": step["distance"]["text"],
-                        "duration": step["duration"]["text"],
-                        "start_location": step["start_location"],
-                        "end_location": step["end_location"],
-                        "travel_mode": step["travel_mode"]
-                    }
-                    
-                    leg_info["steps"].append(step_info)
-                
-                route_info["legs"].append(leg_info)
-            
-            return route_info
+            return Route.from_dict(await self._compact_route(
+                route_info,
+                self.polyline_tolerance if polyline_tolerance is None else polyline_tolerance,
+                step_detail or self.step_detail
+            ))
             
         except Exception as e:
             print(f"Error getting routes: {e}")
             return self._get_mock_route(start_location, end_location, waypoints)
 
-    async def get_sample_routes(self, destination: str) -> List[Dict[str, Any]]:
+    async def _get_best_leg(self, origin: str, destination: str) -> Optional[Dict[str, Any]]:
+        """Route one leg in every mode at once and keep the most sensible one"""
+        
+        # Short hops are walked; no need to ask Google
+        estimate = await self._estimate_walking_leg(origin, destination)
+        if estimate and estimate["distance_m"] <= self.walk_only_km * 1000:
+            return estimate
+        
+        results = await asyncio.gather(*[self._get_leg(origin, destination, mode) for mode in self.modes])
+        options = {mode: leg for mode, leg in zip(self.modes, results) if leg}
+        if not options:
+            # A straight-line walk is no answer for anything longer; let the caller fall back
+            return None
+        
+        # Cached legs come back as copies (TieredCache), so decorating them here is safe
+        best = self._choose_mode(options)
+        best["info"]["alternatives"] = {mode: leg["info"]["duration"] for mode, leg in options.items()}
+        return best
+
+    def _choose_mode(self, options: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+        """Walk if it's short enough, take transit unless it's much slower, otherwise the fastest mode"""
+        
+        walking = options.get("walking")
+        if walking and walking["duration_s"] <= self.max_walk_minutes * 60:
+            return walking
+        
+        fastest = min(options.values(), key=lambda leg: leg["duration_s"])
+        transit = options.get("transit")
+        if transit and transit["duration_s"] <= fastest["duration_s"] * self.max_transit_ratio:
+            return transit
+        
+        return fastest
+
+    async def _get_leg(self, origin: str, destination: str, mode: str) -> Optional[Dict[str, Any]]:
+        """Directions for one leg in one mode, cached per (origin, destination, mode)"""
+        
+        key = cache_key("directions", origin.lower(), destination.lower(), mode)
+        cached_leg = await self.directions_cache.get(key)
+        if cached_leg is not None:
+            return cached_leg or None
+        
+        try:
+            # The client is blocking; the hedger runs it in a thread so the modes really go out together
+            directions_result = await self.directions_hedger.run(partial(
+                self.gmaps.directions,
+                origin=origin,
+                destination=destination,
+                mode=mode,
+                alternatives=False
+            ))
+        except Exception as e:
+            print(f"Error getting {mode} directions: {e}")
+            stale_leg = await self.directions_cache.get_stale(key)
+            return stale_leg or None
+        
+        if not directions_result:
+            # No route in this mode (e.g. no transit); remember that too
+            await self.directions_cache.set(key, {})
+            return None
+        
+        route = directions_result[0]
+        leg = route["legs"][0]
+        
+        leg_info = {
+            "start_address": leg["start_address"],
+            "end_address": leg["end_address"],
+            "distance": leg["distance"]["text"],
+            "duration": leg["duration"]["text"],
+            "mode": mode,
+            "steps": []
+        }
+        
+        for step in leg["steps"]:
+            step_info = {
+                "instruction": step.get("html_instructions", ""),
+                "distance": step["distance"]["text"],
+                "duration": step["duration"]["text"],
+                "start_location": step["start_location"],
+                "end_location": step["end_location"],
+                "travel_mode": step["travel_mode"]
+            }
+            
+            leg_info["steps"].append(step_info)
+        
+        result = {
+            "info": leg_info,
+            "polyline": route["overview_polyline"]["points"],
+            "distance_m": leg["distance"]["value"],
+            "duration_s": leg["duration"]["value"]
+        }
+        
+        await self.directions_cache.set(key, result)
+        return result
+
+    async def _estimate_walking_leg(self, origin: str, destination: str) -> Optional[Dict[str, Any]]:
+        """Straight-line walking estimate for a leg, or None if either end can't be placed exactly"""
+        
+        start, end = await asyncio.gather(self._locate(origin), self._locate(destination))
+        if not start or not end:
+            return None
+        
+        distance_m = haversine_km(start["lat"], start["lng"], end["lat"], end["lng"]) * DETOUR_FACTOR * 1000
+        duration_s = distance_m / (WALKING_SPEED_KMH * 1000 / 3600)
+        
+        return {
+            "info": {
+                "start_address": origin,
+                "end_address": destination,
+                "distance": self._format_distance(distance_m),
+                "duration": self._format_duration(duration_s),
+                "mode": "walking",
+                "estimated": True,
+                "steps": [
+                    {
+                        "instruction": f"Walk to {destination}",
+                        "distance": self._format_distance(distance_m),
+                        "duration": self._format_duration(duration_s),
+                        "start_location": start,
+                        "end_location": end,
+                        "travel_mode": "WALKING"
+                    }
+                ]
+            },
+            "polyline": encode_polyline([[start["lat"], start["lng"]], [end["lat"], end["lng"]]]),
+            "distance_m": distance_m,
+            "duration_s": duration_s
+        }
+
+    async def _locate(self, location: str) -> Optional[Dict[str, float]]:
+        """Coordinates for a "lat,lng" string or a geocodable place name"""
+        
+        parts = location.split(",")
+        if len(parts) == 2:
+            try:
+                return {"lat": float(parts[0]), "lng": float(parts[1])}
+            except ValueError:
+                pass
+        
+        if not self.geocoding_service:
+            return None
+        
+        resolved = await self.geocoding_service.resolve(location)
+        if not resolved or resolved.get("approximate"):
+            # A city-centre fallback would put both ends of a leg on the same spot
+            return None
+        return {"lat": resolved["lat"], "lng": resolved["lng"]}
+
+    def _format_distance(self, meters: float) -> str:
+        if meters < 1000:
+            return f"{round(meters)} m"
+        return f"{meters / 1000:.1f} km"
+
+    def _format_duration(self, seconds: float) -> str:
+        minutes = max(1, round(seconds / 60))
+        hours, minutes = divmod(minutes, 60)
+        
+        parts = []
+        if hours:
+            parts.append(f"{hours} hour{'s' if hours > 1 else ''}")
+        if minutes:
+            parts.append(f"{minutes} min{'s' if minutes > 1 else ''}")
+        return " ".join(parts)
+
+    async def get_route_steps(self, steps_id: str) -> Optional[List[Dict[str, Any]]]:
+        """Get the steps of a leg that was returned with ROUTE_STEP_DETAIL=lazy"""
+        
+        return await self.step_cache.get(steps_id)
+
+    async def _compact_route(self, route_info: Dict[str, Any], polyline_tolerance: float, step_detail: str) -> Dict[str, Any]:
+        """Simplify the overview polyline and drop or park the step details"""
+        
+        if polyline_tolerance > 0:
+            route_info["overview_polyline"] = simplify_polyline(route_info["overview_polyline"], polyline_tolerance)
+        
+        if step_detail == "full":
+            return route_info
+        
+        for index, leg in enumerate(route_info["legs"]):
+            if step_detail == "lazy" and leg["steps"]:
+                # Same route, same id, so repeated plans reuse the stored steps
+                steps_id = hashlib.sha1(cache_key(
+                    "route_steps", route_info["start_location"], route_info["end_location"],
+                    route_info["waypoints"], index
+                ).encode()).hexdigest()[:16]
+                await self.step_cache.set(steps_id, leg["steps"])
+                leg["steps_id"] = steps_id
+            leg["steps"] = []
+        
+        return route_info
+
+    async def get_sample_routes(self, destination: str, coordinates: Dict[str, float] = None) -> List[Dict[str, Any]]:
         """Get sample routes for popular attractions in a destination"""
         
         if not self.gmaps:
@@ -86,30 +280,29 @@ class RoutesService:
         
         try:
             # Define sample attractions for different cities
-            sample_attractions = self._get_sample_attractions(destination)
+            sample_attractions = self._get_sample_attractions(destination, coordinates)
             
             if not sample_attractions:
                 return self._get_mock_sample_routes(destination)
             
-            routes = []
+            # Create routes between different attractions, all pairs at once
+            pairs = [
+                (sample_attractions[i], sample_attractions[j])
+                for i in range(min(3, len(sample_attractions)))
+                for j in range(i + 1, min(i + 3, len(sample_attractions)))
+            ]
+            pair_routes = await asyncio.gather(*[
+                self.get_routes(start_attraction["location"], end_attraction["location"])
+                for start_attraction, end_attraction in pairs
+            ])
             
-            # Create routes between different attractions
-            for i in range(min(3, len(sample_attractions))):
-                start_attraction = sample_attractions[i]
-                
-                for j in range(i + 1, min(i + 3, len(sample_attractions))):
-                    end_attraction = sample_attractions[j]
-                    
-                    route = await self.get_routes(
-                        start_attraction["location"],
-                        end_attraction["location"]
-                    )
-                    
-                    if route:
-                        route["start_attraction"] = start_attraction["name"]
-                        route["end_attraction"] = end_attraction["name"]
-                        route["route_type"] = "attraction_to_attraction"
-                        routes.append(route)
+            routes = []
+            for (start_attraction, end_attraction), route in zip(pairs, pair_routes):
+                if route:
+                    route["start_attraction"] = start_attraction["name"]
+                    route["end_attraction"] = end_attraction["name"]
+                    route["route_type"] = "attraction_to_attraction"
+                    routes.append(route)
             
             return routes
             
@@ -117,7 +310,7 @@ class RoutesService:
             print(f"Error getting sample routes: {e}")
             return self._get_mock_sample_routes(destination)
 
-    def _get_sample_attractions(self, destination: str) -> List[Dict[str, str]]:
+    def _get_sample_attractions(self, destination: str, coordinates: Dict[str, float] = None) -> List[Dict[str, str]]:
         """Get sample attractions for a destination"""
         
         attraction_map = {
@@ -153,9 +346,10 @@ class RoutesService:
             if city in destination_lower:
                 return attractions
         
-        # Default attractions
+        # Default attractions, anchored on the resolved city center when we have it
+        city_center = f"{coordinates['lat']},{coordinates['lng']}" if coordinates else f"City Center, {destination}"
         return [
-            {"name": f"Main Square", "location": f"City Center, {destination}"},
+            {"name": f"Main Square", "location": city_center},
             {"name": f"Central Museum", "location": f"Museum District, {destination}"},
             {"name": f"Historic District", "location": f"Old Town, {destination}"}
         ]
@@ -163,6 +357,8 @@ class RoutesService:
     def _get_mock_route(self, start_location: str, end_location: str, waypoints: List[str] = None) -> Dict[str, Any]:
         """Return mock route data"""
         
+        record_fallback("routes")
+        
         return {
             "start_location": start_location,
             "end_location": end_location,
@@ -0,0 +1,170 @@
+import math
+import os
+import time
+from typing import Dict, Any, List, Optional, Tuple
+
+EARTH_RADIUS_KM = 6371.0
+
+def haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Great-circle distance between two points in kilometres"""
+
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = math.radians(lat2 - lat1)
+    d_lambda = math.radians(lng2 - lng1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+# How often add() sweeps every bucket for expired places and coverage (seconds)
+PRUNE_INTERVAL_SECONDS = 300
+
+class PlaceIndex:
+    """In-memory grid index of places we have already fetched from Google Places
+
+    Places are bucketed into fixed-size lat/lng cells. Every upstream search records the
+    circle it read for its place type (any key naming what was searched) and detail level.
+    A later "within R km, type T" query inside a fresh circle is answered with the places
+    that search kept, so it gets what the same search would have returned (its first page,
+    after the caller's top-N cut), not every place in the area. The index holds at most
+    max_places entries; the oldest are evicted first, along with the coverage that relied
+    on them.
+    """
+
+    def __init__(self, cell_size_deg: float = None, ttl: float = None, max_places: int = None):
+        # 0.01 degrees is roughly 1.1 km of latitude
+        self.cell_size = cell_size_deg or float(os.getenv("PLACE_INDEX_CELL_DEG", 0.01))
+        self.ttl = ttl or float(os.getenv("PLACE_INDEX_TTL", 21600))
+        self.max_places = max_places or int(os.getenv("PLACE_INDEX_MAX_PLACES", 50000))
+
+        # cell -> (place_id, detail_level) -> entry
+        self._buckets: Dict[Tuple[int, int], Dict[Tuple[str, str], Dict[str, Any]]] = {}
+        # (place_type, detail_level) -> circles (lat, lng, radius_km, fetched_at) already searched upstream
+        self._coverage: Dict[Tuple[str, str], List[Tuple[float, float, float, float]]] = {}
+        self._size = 0
+        self._next_prune_at = 0.0
+
+    def _cell(self, lat: float, lng: float) -> Tuple[int, int]:
+        return (math.floor(lat / self.cell_size), math.floor(lng / self.cell_size))
+
+    def _cells_in_bbox(self, lat: float, lng: float, radius_km: float) -> List[Tuple[int, int]]:
+        """All cells overlapping the bounding box of a circle"""
+
+        d_lat = radius_km / 111.0
+        d_lng = radius_km / max(111.0 * math.cos(math.radians(lat)), 1e-6)
+        min_cell = self._cell(lat - d_lat, lng - d_lng)
+        max_cell = self._cell(lat + d_lat, lng + d_lng)
+
+        return [
+            (row, col)
+            for row in range(min_cell[0], max_cell[0] + 1)
+            for col in range(min_cell[1], max_cell[1] + 1)
+        ]
+
+    def _is_covered(self, center: Dict[str, float], radius_km: float, coverage_key: Tuple[str, str], now: float) -> bool:
+        circles = [circle for circle in self._coverage.get(coverage_key, []) if circle[3] + self.ttl >= now]
+        self._coverage[coverage_key] = circles
+
+        return any(
+            haversine_km(center["lat"], center["lng"], lat, lng) + radius_km <= covered_radius
+            for lat, lng, covered_radius, _ in circles
+        )
+
+    def add(self, places: List[Dict[str, Any]], place_type: str, center: Dict[str, float], radius_km: float, detail_level: str = "basic"):
+        """Store the places a search for place_type around center kept, and mark its circle read"""
+
+        now = time.time()
+        if now >= self._next_prune_at:
+            self._prune(now)
+
+        for place in places:
+            place_id = place.get("place_id")
+            coordinates = place.get("coordinates") or {}
+            if not place_id or "lat" not in coordinates or "lng" not in coordinates:
+                continue
+
+            bucket = self._buckets.setdefault(self._cell(coordinates["lat"], coordinates["lng"]), {})
+            entry = bucket.get((place_id, detail_level))
+            if entry and entry["fetched_at"] + self.ttl >= now:
+                entry["types"].add(place_type)
+                entry["place"] = place
+                entry["fetched_at"] = now
+            else:
+                if not entry:
+                    self._size += 1
+                bucket[(place_id, detail_level)] = {"place": place, "types": {place_type}, "fetched_at": now}
+
+        coverage_key = (place_type, detail_level)
+        if not self._is_covered(center, radius_km, coverage_key, now):
+            self._coverage.setdefault(coverage_key, []).append((center["lat"], center["lng"], radius_km, now))
+
+        if self._size > self.max_places:
+            self._evict_oldest()
+
+    def query(self, center: Dict[str, float], radius_km: float, place_type: str, detail_level: str = "basic") -> Optional[List[Dict[str, Any]]]:
+        """Places of place_type within radius_km of center, or None if no search for it read this area"""
+
+        now = time.time()
+        if not self._is_covered(center, radius_km, (place_type, detail_level), now):
+            return None
+
+        places = []
+        for cell in self._cells_in_bbox(center["lat"], center["lng"], radius_km):
+            bucket = self._buckets.get(cell)
+            if not bucket:
+                continue
+
+            for key, entry in list(bucket.items()):
+                if entry["fetched_at"] + self.ttl < now:
+                    del bucket[key]
+                    self._size -= 1
+                    continue
+                if key[1] != detail_level or place_type not in entry["types"]:
+                    continue
+
+                coordinates = entry["place"]["coordinates"]
+                if haversine_km(center["lat"], center["lng"], coordinates["lat"], coordinates["lng"]) <= radius_km:
+                    places.append(entry["place"])
+
+        return places
+
+    def _prune(self, now: float):
+        """Drop expired places and coverage everywhere, not just in the cells being queried"""
+
+        self._next_prune_at = now + PRUNE_INTERVAL_SECONDS
+        for cell, bucket in list(self._buckets.items()):
+            for key, entry in list(bucket.items()):
+                if entry["fetched_at"] + self.ttl < now:
+                    del bucket[key]
+                    self._size -= 1
+            if not bucket:
+                del self._buckets[cell]
+
+        for coverage_key, circles in list(self._coverage.items()):
+            circles = [circle for circle in circles if circle[3] + self.ttl >= now]
+            if circles:
+                self._coverage[coverage_key] = circles
+            else:
+                del self._coverage[coverage_key]
+
+    def _evict_oldest(self):
+        """Shrink to 90% of max_places, dropping the oldest places and any coverage that relied on them"""
+
+        entries = sorted(
+            (entry["fetched_at"], cell, key)
+            for cell, bucket in self._buckets.items()
+            for key, entry in bucket.items()
+        )
+        evicted = entries[:len(entries) - int(self.max_places * 0.9)]
+        for _, cell, key in evicted:
+            bucket = self._buckets[cell]
+            del bucket[key]
+            if not bucket:
+                del self._buckets[cell]
+        self._size -= len(evicted)
+
+        # A circle recorded before the newest evicted place may have lost some of its places
+        cutoff = evicted[-1][0]
+        for coverage_key, circles in list(self._coverage.items()):
+            self._coverage[coverage_key] = [circle for circle in circles if circle[3] > cutoff]
+
+# Shared by the Places-backed services in this process
+place_index = PlaceIndex()
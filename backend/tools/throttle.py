@@ -0,0 +1,65 @@
+import asyncio
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+class UpstreamThrottle:
+    """Spaces upstream calls so they stay under calls_per_minute
+
+    Every call reserves the next free slot. Calls that go through the hedger (Place
+    Details, Directions, Open-Meteo) wait for their slot before running; calls made
+    straight from the event loop (searches, geocoding) can't wait without blocking it,
+    so they only take a slot and drain() pays for them afterwards.
+    """
+
+    def __init__(self, calls_per_minute: float):
+        self.interval = 60.0 / calls_per_minute
+        self._next_slot_at = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Take the next slot; returns how many seconds until it starts"""
+
+        with self._lock:
+            now = time.monotonic()
+            slot_at = max(now, self._next_slot_at)
+            self._next_slot_at = slot_at + self.interval
+            return slot_at - now
+
+    async def acquire(self):
+        await asyncio.sleep(self.reserve())
+
+    async def drain(self):
+        """Wait until every slot taken so far has started"""
+
+        await asyncio.sleep(max(0.0, self._next_slot_at - self.interval - time.monotonic()))
+
+# Set while background work (pre-warming) runs, so its upstream calls are spaced out
+_upstream_throttle = contextvars.ContextVar("upstream_throttle", default=None)
+# Set in the context of a call that already waited for its slot
+_slot_reserved = contextvars.ContextVar("upstream_slot_reserved", default=False)
+
+@contextmanager
+def throttle_upstream_calls(throttle: UpstreamThrottle):
+    """Count every upstream call made in this context against throttle"""
+
+    token = _upstream_throttle.set(throttle)
+    try:
+        yield
+    finally:
+        _upstream_throttle.reset(token)
+
+def current_throttle() -> Optional[UpstreamThrottle]:
+    return _upstream_throttle.get()
+
+def mark_slot_reserved():
+    _slot_reserved.set(True)
+
+def charge_upstream_call():
+    """Take a slot for an upstream call made under a throttle, unless it already waited for one"""
+
+    throttle = _upstream_throttle.get()
+    if throttle is not None and not _slot_reserved.get():
+        throttle.reserve()
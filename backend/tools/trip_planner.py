@@ -1,13 +1,57 @@
 import asyncio
-from typing import Dict, Any
+import os
+import re
+from contextlib import nullcontext
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, AsyncContextManager, AsyncIterator, Callable, Awaitable, Optional, Tuple
 from .gemini_client import GeminiClient
 from .hotels import HotelsService
 from .weather import WeatherService
 from .attractions import AttractionsService
 from .flights import FlightsService
 from .routes import RoutesService
+from .geocoding import GeocodingService
+from .prewarmer import DestinationPrewarmer
+from .cache import TieredCache
+from .records import compact_section, to_wire
+from .metrics import collect_fallbacks, REPLAN_TOOLS, track_stage
+from .circuit_breaker import shed_upstream_calls
 import json
 
+# Summary of plans served in degraded mode, which skip the LLM summary
+DEGRADED_SUMMARY = (
+    "The planner is busy right now, so this plan was put together from saved and sample results "
+    "without a personalised summary. Try again in a moment for the full plan."
+)
+
+# Trip details a re-plan compares, and the tools whose results depend on each
+REPLAN_DEPENDENCIES = {
+    "budget": ["search_hotels"],
+    "requirements": ["search_hotels"],
+    "interests": ["get_attractions", "get_routes"],
+    "dates": ["get_weather", "get_flights"],
+    "duration": ["get_weather"],
+    "origin": ["get_flights"]
+}
+
+# Tool arguments Gemini fills in from a trip detail; dropped on re-run so the new detail applies
+REPLAN_ARGS = {
+    "budget": ["budget"],
+    "interests": ["interests"],
+    "dates": ["start_date", "end_date", "departure_date"],
+    "duration": ["start_date", "end_date"],
+    "origin": ["origin"]
+}
+
+# Response section filled by each tool
+TOOL_SECTIONS = {
+    "search_hotels": "hotels",
+    "get_weather": "weather",
+    "get_attractions": "attractions",
+    "get_flights": "flights",
+    "get_routes": "routes"
+}
+
 class TripPlanner:
     def __init__(self):
         self.gemini_client = GeminiClient()
@@ -15,62 +59,629 @@ class TripPlanner:
         self.weather_service = WeatherService()
         self.attractions_service = AttractionsService()
         self.flights_service = FlightsService()
-        self.routes_service = RoutesService()
+        self.geocoding_service = GeocodingService()
+        self.routes_service = RoutesService(self.geocoding_service)
+        self.prewarmer = DestinationPrewarmer(
+            self.hotels_service, self.attractions_service, self.routes_service, self.weather_service,
+            self.geocoding_service
+        )
+
+        # Map Gemini function declarations to the services that implement them
+        self.tool_handlers = {
+            "search_hotels": self._search_hotels,
+            "get_weather": self._get_weather,
+            "get_attractions": self._get_attractions,
+            "get_flights": self._get_flights,
+            "get_routes": self._get_routes
+        }
+
+        # Tool calls running at once across all legs of a multi-city plan
+        self.multi_city_concurrency = int(os.getenv("MULTI_CITY_CONCURRENCY", 8))
+
+        # Trip details, tool calls and summary of recent plans, so refinements can reuse them
+        # An expired session can't be replanned, so its rows are purged rather than kept as stale data
+        self.sessions = TieredCache("plan_sessions", ttl=float(os.getenv("PLAN_SESSION_TTL", 86400)), stale_ttl=0)
+
+    async def plan_trip(
+        self,
+        prompt: str,
+        tool_cache: Optional[Dict[Tuple, asyncio.Future]] = None,
+        wanted_sections: Optional[List[str]] = None,
+        degraded: bool = False,
+        session_id: Optional[str] = None,
+        trip_details: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Main method to plan a complete trip
+
+        When a tool_cache is given, identical prompt analyses and tool calls are
+        shared with every other plan using the same cache. When wanted_sections is given,
+        tools for the other sections are not run and the summary is only generated
+        if "summary" is requested (the summary needs every tool, so it enables them all).
+        A degraded plan (admitted under overload) still analyzes the prompt, but picks tools
+        by keyword, serves every section from cache or mock data and skips the summary.
+        With a session_id the plan is saved for replan_trip; trip_details that were already
+        extracted skip the prompt analysis. Trips through several cities are planned per leg
+        by _plan_multi_city.
+        """
+
+        allowed_tools = None
+        if wanted_sections is not None and "summary" not in wanted_sections:
+            # The legs of a multi-city plan hold every section but flights
+            allowed_tools = [
+                tool for tool, section in TOOL_SECTIONS.items()
+                if section in wanted_sections or ("legs" in wanted_sections and section != "flights")
+            ]
 
-    async def plan_trip(self, prompt: str) -> Dict[str, Any]:
-        """Main method to plan a complete trip"""
-        
         # Step 1: Analyze the prompt using Gemini
-        trip_details = await self.gemini_client.analyze_prompt(prompt)
-        
+        if trip_details is None:
+            with track_stage("analyze_prompt"):
+                trip_details = await self._call_cached(
+                    tool_cache, ("analyze_prompt", prompt),
+                    lambda: self.gemini_client.analyze_prompt(prompt)
+                )
+
+        legs = self._trip_legs(trip_details)
+        if legs:
+            return await self._plan_multi_city(
+                prompt, trip_details, legs, tool_cache, allowed_tools, wanted_sections, degraded, session_id
+            )
+
         destination = trip_details.get("destination", "Unknown")
         duration = trip_details.get("duration", 3)
         dates = trip_details.get("dates", "Not specified")
-        budget = trip_details.get("budget", "moderate")
-        interests = trip_details.get("interests", [])
-        requirements = trip_details.get("requirements", [])
-        
-        # Step 2: Gather data from various APIs in parallel
-        tasks = [
-            self.hotels_service.search_hotels(destination, budget, requirements),
-            self.attractions_service.get_attractions(destination, interests),
-            self.weather_service.get_weather(destination, dates, duration),
-            self.flights_service.get_flights("User Location", destination, dates),
-            self.routes_service.get_sample_routes(destination)
-        ]
-        
-        # Execute all API calls in parallel
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-        
-        hotels, attractions, weather, flights, routes = results
-        
-        # Handle any exceptions in API calls
-        hotels = hotels if not isinstance(hotels, Exception) else []
-        attractions = attractions if not isinstance(attractions, Exception) else []
-        weather = weather if not isinstance(weather, Exception) else {}
-        flights = flights if not isinstance(flights, Exception) else []
-        routes = routes if not isinstance(routes, Exception) else []
-        
+
+        # In degraded mode every later upstream call, LLM tool selection included, fails fast to its fallback
+        with shed_upstream_calls() if degraded else nullcontext():
+            # Start resolving the destination now; every tool reuses this one geocode
+            geocode = asyncio.ensure_future(self.geocoding_service.resolve(destination))
+
+            # Step 2: Let Gemini call only the tools this trip needs, each round in parallel
+            async def dispatch(calls: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+                return await self._dispatch_tool_calls(calls, trip_details, tool_cache)
+
+            try:
+                executed = await self.gemini_client.run_tool_loop(prompt, trip_details, dispatch, allowed_tools)
+            finally:
+                await asyncio.gather(geocode, return_exceptions=True)
+        sections = self._collect_sections(executed)
+
         # Step 3: Generate comprehensive plan using Gemini
         tool_results = {
-            "hotels": hotels,
-            "attractions": attractions,
-            "weather": weather,
-            "flights": flights,
-            "routes": routes,
+            **sections,
             "trip_details": trip_details
         }
-        
-        summary = await self.gemini_client.plan_trip_with_tools(prompt, tool_results)
-        
-        return {
+
+        summary = ""
+        if degraded:
+            summary = DEGRADED_SUMMARY
+        elif wanted_sections is None or "summary" in wanted_sections:
+            with track_stage("plan_summary"):
+                summary = await self.gemini_client.plan_trip_with_tools(prompt, tool_results)
+
+        plan = {
             "destination": destination,
             "duration": duration,
             "dates": dates,
-            "hotels": hotels,
-            "attractions": attractions,
-            "weather": weather,
-            "flights": flights,
-            "routes": routes,
+            **self._compact_sections(sections),
             "summary": summary
         }
+        if session_id:
+            await self._save_session(session_id, prompt, trip_details, executed, summary)
+            plan["session_id"] = session_id
+        return plan
+
+    async def replan_trip(self, session_id: str, prompt: str, degraded: bool = False) -> Optional[Dict[str, Any]]:
+        """Apply a refinement ("same trip but luxury hotels") to a saved plan
+
+        The refinement is analyzed together with the session's earlier prompts and only the
+        tools whose inputs changed run again: budget affects hotels, interests attractions and
+        routes, dates weather and flights. Other results are reused and the earlier summary is
+        revised rather than rewritten. A new destination is planned from scratch. Returns None
+        when the session has expired.
+        """
+
+        session = await self.sessions.get(session_id)
+        if session is None:
+            return None
+
+        combined_prompt = f"{session['prompt']}\n\nChange to the trip: {prompt}"
+        with track_stage("analyze_prompt"):
+            trip_details = await self.gemini_client.analyze_prompt(combined_prompt)
+
+        previous_details = session["trip_details"]
+        # Multi-city plans keep no per-tool results to reuse
+        if (
+            self._trip_legs(trip_details) or self._trip_legs(previous_details)
+            or self._normalize_detail(trip_details.get("destination")) != self._normalize_detail(previous_details.get("destination"))
+        ):
+            return await self.plan_trip(combined_prompt, degraded=degraded, session_id=session_id, trip_details=trip_details)
+
+        changed = [
+            detail for detail in REPLAN_DEPENDENCIES
+            if self._normalize_detail(trip_details.get(detail)) != self._normalize_detail(previous_details.get(detail))
+        ]
+        stale_tools = {tool for detail in changed for tool in REPLAN_DEPENDENCIES[detail]}
+        stale_args = {arg for detail in changed for arg in REPLAN_ARGS.get(detail, [])}
+
+        reused, calls = [], []
+        for call in session["executed"]:
+            if call["name"] in stale_tools or call.get("fallback"):
+                calls.append({"name": call["name"], "args": {key: value for key, value in call["args"].items() if key not in stale_args}})
+                REPLAN_TOOLS.inc(tool=call["name"], result="rerun")
+            else:
+                reused.append(call)
+                REPLAN_TOOLS.inc(tool=call["name"], result="reused")
+
+        with shed_upstream_calls() if degraded else nullcontext():
+            executed = reused + (await self._dispatch_tool_calls(calls, trip_details) if calls else [])
+        sections = self._collect_sections(executed)
+
+        if degraded:
+            summary = DEGRADED_SUMMARY
+        else:
+            # The earlier summary gives the LLM the plan it is revising
+            previous_summary = session["summary"] if session["summary"] != DEGRADED_SUMMARY else None
+            with track_stage("plan_summary"):
+                summary = await self.gemini_client.plan_trip_with_tools(
+                    combined_prompt, {**sections, "trip_details": trip_details}, previous_summary=previous_summary
+                )
+
+        await self._save_session(session_id, combined_prompt, trip_details, executed, summary)
+        return {
+            "destination": trip_details.get("destination", "Unknown"),
+            "duration": trip_details.get("duration", 3),
+            "dates": trip_details.get("dates", "Not specified"),
+            **self._compact_sections(sections),
+            "summary": summary,
+            "session_id": session_id
+        }
+
+    async def _plan_multi_city(
+        self,
+        prompt: str,
+        trip_details: Dict[str, Any],
+        legs: List[Dict[str, Any]],
+        tool_cache: Optional[Dict[Tuple, asyncio.Future]] = None,
+        allowed_tools: Optional[List[str]] = None,
+        wanted_sections: Optional[List[str]] = None,
+        degraded: bool = False,
+        session_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Plan each city as its own sub-pipeline, with every leg and hop running at once
+
+        Each leg's hotels, attractions and city routes, the flight in to the first city, and
+        the flights and routes between consecutive cities run concurrently but share one
+        budget of MULTI_CITY_CONCURRENCY tool calls. Weather for all legs comes from a single
+        batched forecast request, each leg's forecast starting on its own dates, and
+        repeated calls (a city visited twice, shared geocodes) go through one tool cache.
+        The tool selection LLM round is skipped; the legs say which tools are needed.
+        """
+
+        tool_cache = {} if tool_cache is None else tool_cache
+        semaphore = asyncio.Semaphore(self.multi_city_concurrency)
+        leg_details = [
+            {**trip_details, "destination": leg["destination"], "duration": leg["duration"], "dates": leg_dates, "legs": []}
+            for leg, leg_dates in zip(legs, self._leg_dates(trip_details.get("dates", "Not specified"), legs))
+        ]
+
+        def wanted(tool: str) -> bool:
+            return allowed_tools is None or tool in allowed_tools
+
+        async def run(call: Dict[str, Any], details: Dict[str, Any]) -> Dict[str, Any]:
+            async with semaphore:
+                try:
+                    result = await self._run_tool(call, details, tool_cache)
+                except Exception as e:
+                    print(f"Error running tool {call['name']}: {e}")
+                    result = None
+            return {**call, "result": result}
+
+        # A route from a city to itself gives the getting-around routes for that leg
+        leg_calls = [{"name": tool, "args": {}} for tool in ("search_hotels", "get_attractions", "get_routes") if wanted(tool)]
+        # Hops: the flight in to the first city, then a flight and a route between each pair of cities
+        hops = [(None, leg_details[0])] + list(zip(leg_details, leg_details[1:]))
+        hop_calls = [
+            [
+                call for call in (
+                    {"name": "get_flights", "args": {
+                        "origin": origin["destination"] if origin else trip_details.get("origin") or "User Location",
+                        "destination": arrival["destination"],
+                        "departure_date": arrival["dates"]
+                    }},
+                    {"name": "get_routes", "args": {"start_location": origin["destination"], "end_location": arrival["destination"]}} if origin else None
+                ) if call and wanted(call["name"])
+            ]
+            for origin, arrival in hops
+        ]
+
+        with shed_upstream_calls() if degraded else nullcontext():
+            # Every leg's tools and the weather batch reuse these geocodes
+            geocodes = [asyncio.ensure_future(self.geocoding_service.resolve(details["destination"])) for details in leg_details]
+            stages = [
+                asyncio.gather(*[
+                    asyncio.gather(*[run(call, details) for call in leg_calls]) for details in leg_details
+                ]),
+                asyncio.gather(*[
+                    asyncio.gather(*[run(call, arrival) for call in calls])
+                    for (_, arrival), calls in zip(hops, hop_calls)
+                ])
+            ]
+            if wanted("get_weather"):
+                stages.append(self._get_leg_weather(leg_details, semaphore))
+            try:
+                results = await asyncio.gather(*stages)
+            finally:
+                await asyncio.gather(*geocodes, return_exceptions=True)
+        leg_results, hop_results = results[0], results[1]
+        weather = results[2] if len(results) > 2 else [None] * len(leg_details)
+
+        leg_sections = []
+        for details, executed, leg_weather in zip(leg_details, leg_results, weather):
+            sections = self._collect_sections(list(executed) + [{"name": "get_weather", "args": {}, "result": leg_weather}])
+            sections.pop("flights")
+            leg_sections.append({
+                "destination": details["destination"],
+                "duration": details["duration"],
+                "dates": details["dates"],
+                **sections
+            })
+        travel = self._collect_sections([call for executed in hop_results for call in executed])
+
+        summary = ""
+        if degraded:
+            summary = DEGRADED_SUMMARY
+        elif wanted_sections is None or "summary" in wanted_sections:
+            with track_stage("plan_summary"):
+                summary = await self.gemini_client.plan_trip_with_tools(prompt, {
+                    "trip_details": trip_details,
+                    "legs": leg_sections,
+                    "flights": travel["flights"],
+                    "routes": travel["routes"]
+                })
+
+        leg_sections = [self._compact_sections(leg) for leg in leg_sections]
+        travel = self._compact_sections(travel)
+        plan = {
+            "destination": " → ".join(leg["destination"] for leg in legs),
+            "duration": sum(leg["duration"] for leg in legs),
+            "dates": trip_details.get("dates", "Not specified"),
+            # Single-city clients still get every city's hotels and attractions
+            "hotels": [hotel for leg in leg_sections for hotel in leg["hotels"]],
+            "attractions": [attraction for leg in leg_sections for attraction in leg["attractions"]],
+            "weather": leg_sections[0]["weather"],
+            "flights": travel["flights"],
+            "routes": travel["routes"],
+            "legs": leg_sections,
+            "summary": summary
+        }
+        if session_id:
+            await self._save_session(session_id, prompt, trip_details, [], summary)
+            plan["session_id"] = session_id
+        return plan
+
+    async def _get_leg_weather(self, leg_details: List[Dict[str, Any]], semaphore: asyncio.Semaphore) -> List[Dict[str, Any]]:
+        """Weather per leg: pre-warmed bundles where available, the rest in one forecast request"""
+
+        weather = await asyncio.gather(*[
+            self.prewarmer.get_weather(details["destination"], details["dates"], details["duration"])
+            for details in leg_details
+        ])
+        missing = [index for index, leg_weather in enumerate(weather) if leg_weather is None]
+        if not missing:
+            return weather
+
+        coordinates = await asyncio.gather(*[self._resolve(leg_details[index]["destination"]) for index in missing])
+        async with semaphore:
+            with track_stage("tool.get_weather"):
+                fetched = await self.weather_service.get_weather_batch([
+                    (leg_details[index]["destination"], leg_details[index]["dates"], leg_details[index]["duration"], leg_coordinates)
+                    for index, leg_coordinates in zip(missing, coordinates)
+                ])
+
+        for index, leg_weather in zip(missing, fetched):
+            weather[index] = leg_weather
+        return weather
+
+    def _trip_legs(self, trip_details: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Cities of a multi-city trip with the days spent in each, or [] for a single-city trip"""
+
+        legs = []
+        for leg in trip_details.get("legs") or []:
+            if not isinstance(leg, dict) or not leg.get("destination"):
+                continue
+            try:
+                duration = max(1, int(leg.get("duration") or 1))
+            except (TypeError, ValueError):
+                duration = 1
+            legs.append({"destination": str(leg["destination"]), "duration": duration})
+        return legs if len(legs) > 1 else []
+
+    def _leg_dates(self, dates: str, legs: List[Dict[str, Any]]) -> List[str]:
+        """Each leg's start date when the trip dates contain one (YYYY-MM-DD), else the trip's dates"""
+
+        match = re.search(r"\d{4}-\d{2}-\d{2}", dates or "")
+        if not match:
+            return [dates] * len(legs)
+
+        start = datetime.strptime(match.group(0), "%Y-%m-%d")
+        leg_dates = []
+        for leg in legs:
+            leg_dates.append(start.strftime("%Y-%m-%d"))
+            start += timedelta(days=leg["duration"])
+        return leg_dates
+
+    async def _save_session(self, session_id: str, prompt: str, trip_details: Dict[str, Any], executed: List[Dict[str, Any]], summary: str):
+        await self.sessions.set(session_id, to_wire({
+            "prompt": prompt,
+            "trip_details": trip_details,
+            "executed": executed,
+            "summary": summary
+        }))
+
+    def _normalize_detail(self, value: Any) -> Any:
+        """Compare details case-insensitively, and lists (interests) regardless of order"""
+
+        if isinstance(value, str):
+            return value.strip().lower()
+        if isinstance(value, list):
+            return sorted(str(item).strip().lower() for item in value)
+        return value
+
+    async def plan_trips(
+        self,
+        prompts: List[str],
+        concurrency: int = 8,
+        admit: Optional[Callable[[], AsyncContextManager[bool]]] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Plan a batch of trips, sharing tool calls between them and yielding plans as they finish
+
+        admit() is entered around each plan to take a planning slot; it yields whether the
+        plan should run degraded.
+        """
+
+        semaphore = asyncio.Semaphore(concurrency)
+        tool_cache = {}
+
+        async def run(index: int, prompt: str) -> Dict[str, Any]:
+            async with semaphore:
+                try:
+                    if admit:
+                        async with admit() as degraded:
+                            plan = await self.plan_trip(prompt, tool_cache=tool_cache, degraded=degraded)
+                    else:
+                        plan = await self.plan_trip(prompt, tool_cache=tool_cache)
+                    return {"index": index, "prompt": prompt, "result": plan}
+                except Exception as e:
+                    return {"index": index, "prompt": prompt, "error": str(e)}
+
+        tasks = [asyncio.ensure_future(run(index, prompt)) for index, prompt in enumerate(prompts)]
+
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # Stop outstanding plans if the client goes away mid-stream
+            for task in tasks:
+                task.cancel()
+
+    async def _call_cached(
+        self,
+        tool_cache: Optional[Dict[Tuple, asyncio.Future]],
+        key: Tuple,
+        factory: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """Run a call once per key, letting concurrent callers with the same key share the result"""
+
+        if tool_cache is None:
+            return await factory()
+
+        if key not in tool_cache:
+            tool_cache[key] = asyncio.ensure_future(factory())
+
+        # Shield the shared call so one cancelled plan doesn't cancel it for the others
+        return await asyncio.shield(tool_cache[key])
+
+    async def _dispatch_tool_calls(
+        self,
+        calls: List[Dict[str, Any]],
+        trip_details: Dict[str, Any],
+        tool_cache: Optional[Dict[Tuple, asyncio.Future]] = None
+    ) -> List[Dict[str, Any]]:
+        """Run one round of tool calls concurrently, skipping duplicate calls"""
+
+        unique_calls = {}
+        for call in calls:
+            key = (call["name"], json.dumps(call.get("args", {}), sort_keys=True))
+            unique_calls.setdefault(key, call)
+        calls = list(unique_calls.values())
+
+        async def run(call: Dict[str, Any]) -> Tuple[Any, bool]:
+            with collect_fallbacks() as fallbacks:
+                result = await self._run_tool(call, trip_details, tool_cache)
+            return result, bool(fallbacks)
+
+        results = await asyncio.gather(*[run(call) for call in calls], return_exceptions=True)
+
+        executed = []
+        for call, outcome in zip(calls, results):
+            if isinstance(outcome, Exception):
+                print(f"Error running tool {call['name']}: {outcome}")
+                outcome = (None, True)
+            result, fallback = outcome
+            entry = {"name": call["name"], "args": call.get("args", {}), "result": result}
+            if fallback:
+                # Mock or stale data; a re-plan runs this tool again instead of reusing it
+                entry["fallback"] = True
+            executed.append(entry)
+
+        return executed
+
+    async def _run_tool(
+        self,
+        call: Dict[str, Any],
+        trip_details: Dict[str, Any],
+        tool_cache: Optional[Dict[Tuple, asyncio.Future]] = None
+    ) -> Any:
+        """Run a single tool call against its service"""
+
+        handler = self.tool_handlers.get(call["name"])
+        if not handler:
+            raise ValueError(f"Unknown tool: {call['name']}")
+
+        with track_stage(f"tool.{call['name']}"):
+            return await handler(call.get("args", {}), trip_details, tool_cache)
+
+    async def _search_hotels(
+        self,
+        args: Dict[str, Any],
+        trip_details: Dict[str, Any],
+        tool_cache: Optional[Dict[Tuple, asyncio.Future]] = None
+    ) -> List[Dict[str, Any]]:
+        location = args.get("location", trip_details.get("destination", "Unknown"))
+        budget = args.get("budget") or trip_details.get("budget", "moderate")
+        requirements = trip_details.get("requirements", [])
+
+        bundled_hotels = await self.prewarmer.get_hotels(location, budget)
+        if bundled_hotels is not None:
+            return bundled_hotels
+
+        coordinates = await self._resolve(location)
+        return await self._call_cached(
+            tool_cache, ("search_hotels", location.lower(), budget, tuple(requirements)),
+            lambda: self.hotels_service.search_hotels(location, budget, requirements, coordinates)
+        )
+
+    async def _get_weather(
+        self,
+        args: Dict[str, Any],
+        trip_details: Dict[str, Any],
+        tool_cache: Optional[Dict[Tuple, asyncio.Future]] = None
+    ) -> Dict[str, Any]:
+        location = args.get("location", trip_details.get("destination", "Unknown"))
+        dates = trip_details.get("dates") or args.get("start_date", "Not specified")
+        duration = self._duration_from_dates(
+            args.get("start_date"), args.get("end_date"), trip_details.get("duration", 3)
+        )
+
+        bundled_weather = await self.prewarmer.get_weather(location, dates, duration)
+        if bundled_weather is not None:
+            return bundled_weather
+
+        coordinates = await self._resolve(location)
+        return await self._call_cached(
+            tool_cache, ("get_weather", location.lower(), dates, duration),
+            lambda: self.weather_service.get_weather(location, dates, duration, coordinates)
+        )
+
+    async def _get_attractions(
+        self,
+        args: Dict[str, Any],
+        trip_details: Dict[str, Any],
+        tool_cache: Optional[Dict[Tuple, asyncio.Future]] = None
+    ) -> List[Dict[str, Any]]:
+        location = args.get("location", trip_details.get("destination", "Unknown"))
+        interests = args.get("interests")
+        if isinstance(interests, str):
+            interests = [interest.strip() for interest in interests.split(",") if interest.strip()]
+        interests = interests or trip_details.get("interests", [])
+
+        bundled_attractions = await self.prewarmer.get_attractions(location, interests)
+        if bundled_attractions is not None:
+            return bundled_attractions
+
+        coordinates = await self._resolve(location)
+        return await self._call_cached(
+            tool_cache, ("get_attractions", location.lower(), tuple(sorted(interests))),
+            lambda: self.attractions_service.get_attractions(location, interests, coordinates)
+        )
+
+    async def _get_flights(
+        self,
+        args: Dict[str, Any],
+        trip_details: Dict[str, Any],
+        tool_cache: Optional[Dict[Tuple, asyncio.Future]] = None
+    ) -> List[Dict[str, Any]]:
+        origin = args.get("origin", "User Location")
+        destination = args.get("destination", trip_details.get("destination", "Unknown"))
+        departure_date = args.get("departure_date") or trip_details.get("dates", "Not specified")
+
+        return await self._call_cached(
+            tool_cache, ("get_flights", origin.lower(), destination.lower(), departure_date),
+            lambda: self.flights_service.get_flights(origin, destination, departure_date)
+        )
+
+    async def _get_routes(
+        self,
+        args: Dict[str, Any],
+        trip_details: Dict[str, Any],
+        tool_cache: Optional[Dict[Tuple, asyncio.Future]] = None
+    ) -> List[Dict[str, Any]]:
+        start_location = args.get("start_location", trip_details.get("destination", "Unknown"))
+        end_location = args.get("end_location", start_location)
+        waypoints = args.get("waypoints") or []
+
+        # A route from a city to itself means "show me how to get around"
+        if start_location == end_location:
+            bundled_routes = await self.prewarmer.get_sample_routes(start_location)
+            if bundled_routes is not None:
+                return bundled_routes
+
+            coordinates = await self._resolve(start_location)
+            return await self._call_cached(
+                tool_cache, ("get_sample_routes", start_location.lower()),
+                lambda: self.routes_service.get_sample_routes(start_location, coordinates)
+            )
+
+        route = await self._call_cached(
+            tool_cache, ("get_routes", start_location.lower(), end_location.lower(), tuple(waypoints)),
+            lambda: self.routes_service.get_routes(start_location, end_location, waypoints or None)
+        )
+        return [route] if route else []
+
+    async def _resolve(self, location: str) -> Optional[Dict[str, float]]:
+        """Get the cached lat/lng for a location, or None to let the service use the text"""
+
+        resolved = await self.geocoding_service.resolve(location)
+        return {"lat": resolved["lat"], "lng": resolved["lng"]} if resolved else None
+
+    def _duration_from_dates(self, start_date: str, end_date: str, default: int) -> int:
+        """Work out the trip length from ISO dates, falling back to the extracted duration"""
+
+        try:
+            start = datetime.strptime(start_date, "%Y-%m-%d")
+            end = datetime.strptime(end_date, "%Y-%m-%d")
+            return max(1, (end - start).days + 1)
+        except (TypeError, ValueError):
+            return default
+
+    def _collect_sections(self, executed: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Merge executed tool calls into the response sections"""
+
+        sections = {
+            "hotels": [],
+            "attractions": [],
+            "weather": {},
+            "flights": [],
+            "routes": []
+        }
+        for call in executed:
+            section = TOOL_SECTIONS.get(call["name"])
+            result = call["result"]
+            if not section or result is None:
+                continue
+
+            if isinstance(sections[section], list):
+                sections[section].extend(result)
+            else:
+                sections[section] = result
+
+        return sections
+
+    def _compact_sections(self, sections: Dict[str, Any]) -> Dict[str, Any]:
+        """Sections as compact records for the plan that is returned (and held across a batch)
+
+        The services already return records; this converts what still arrives as wire dicts
+        (sample data, bundles and cache entries read back from disk).
+        """
+
+        return {name: compact_section(name, value) for name, value in sections.items()}
@@ -1,141 +1,216 @@
 import os
+import re
 import openmeteo_requests
 import pandas as pd
 import requests_cache
+from functools import partial
 from retry_requests import retry
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple
+from datetime import date, datetime
 import json
+from .cache import get_cache_dir
+from .geocoding import CITY_COORDINATES
+from .hedging import get_hedger
+from .metrics import record_fallback, track_upstream
+from .records import ForecastDay
+
+def trip_start_date(dates: str) -> Optional[date]:
+    """The first YYYY-MM-DD date in a trip's dates text, or None when it has none"""
+    
+    match = re.search(r"\d{4}-\d{2}-\d{2}", dates or "")
+    if not match:
+        return None
+    try:
+        return datetime.strptime(match.group(0), "%Y-%m-%d").date()
+    except ValueError:
+        return None
 
 class WeatherService:
     def __init__(self):
         # Setup the Open-Meteo API client with cache and retry on error
-        cache_session = requests_cache.CachedSession('.cache', expire_after=3600)
+        # The cache lives in CACHE_DIR so every server worker shares it
+        cache_session = requests_cache.CachedSession(os.path.join(get_cache_dir(), 'weather'), expire_after=3600)
         retry_session = retry(cache_session, retries=5, backoff_factor=0.2)
         self.openmeteo = openmeteo_requests.Client(session=retry_session)
+        self.forecast_url = os.getenv("OPEN_METEO_URL", "https://api.open-meteo.com/v1/forecast")
+        self.hedger = get_hedger("forecast")
 
-    async def get_weather(self, location: str, dates: str, duration: int) -> Dict[str, Any]:
+    async def get_weather(self, location: str, dates: str, duration: int, coordinates: Dict[str, float] = None) -> Dict[str, Any]:
         """Get weather forecast for the trip dates using Open-Meteo API"""
         
         try:
-            # Get coordinates for the location
-            coordinates = self._get_coordinates_for_city(location)
-            if not coordinates:
-                return self._get_mock_weather(location, dates, duration)
-            
-            lat, lon = coordinates
-            
-            # Open-Meteo API URL
-            url = "https://api.open-meteo.com/v1/forecast"
-            
-            # Parameters for current weather and daily forecast
-            params = {
-                "latitude": lat,
-                "longitude": lon,
-                "current": ["temperature_2m", "relative_humidity_2m", "wind_speed_10m", "weather_code"],
-                "daily": [
-                    "weather_code",
-                    "temperature_2m_max",
-                    "temperature_2m_min",
-                    "temperature_2m_mean",
-                    "relative_humidity_2m_mean",
-                    "wind_speed_10m_max"
-                ],
-                "timezone": "auto",
-                "forecast_days": min(duration, 16)  # Open-Meteo supports up to 16 days
-            }
-            
-            # Make the API request
-            responses = self.openmeteo.weather_api(url, params=params)
-            response = responses[0]
-            
-            # Process current weather
-            current = response.Current()
-            current_weather = {
-                "temperature": round(current.Variables(0).Value()),
-                "feels_like": round(current.Variables(0).Value()),  # Open-Meteo doesn't provide feels_like
-                "humidity": round(current.Variables(1).Value()),
-                "wind_speed": round(current.Variables(2).Value()),
-                "weather_code": current.Variables(3).Value()
-            }
-            
-            # Process daily forecast
-            daily = response.Daily()
-            daily_weather_code = daily.Variables(0).ValuesAsNumpy()
-            daily_temperature_max = daily.Variables(1).ValuesAsNumpy()
-            daily_temperature_min = daily.Variables(2).ValuesAsNumpy()
-            daily_temperature_mean = daily.Variables(3).ValuesAsNumpy()
-            daily_relative_humidity = daily.Variables(4).ValuesAsNumpy()
-            daily_wind_speed = daily.Variables(5).ValuesAsNumpy()
-            
-            # Create date range
-            daily_data = {
-                "date": pd.date_range(
-                    start=pd.to_datetime(daily.Time(), unit="s", utc=True),
-                    end=pd.to_datetime(daily.TimeEnd(), unit="s", utc=True),
-                    freq=pd.Timedelta(seconds=daily.Interval()),
-                    inclusive="left"
-                )
-            }
-            
-            # Process forecast data
-            forecast = []
-            for i in range(min(duration, len(daily_data["date"]))):
-                daily_forecast = {
-                    "date": daily_data["date"][i].strftime("%Y-%m-%d"),
-                    "min_temp": round(daily_temperature_min[i]),
-                    "max_temp": round(daily_temperature_max[i]),
-                    "avg_temp": round(daily_temperature_mean[i]),
-                    "humidity": round(daily_relative_humidity[i]),
-                    "wind_speed": round(daily_wind_speed[i]),
-                    "weather_code": int(daily_weather_code[i]),
-                    "description": self._weather_code_to_description(int(daily_weather_code[i]))
-                }
-                forecast.append(daily_forecast)
-            
-            # Create weather info
-            weather_info = {
-                "location": location,
-                "current": {
-                    "temperature": current_weather["temperature"],
-                    "feels_like": current_weather["feels_like"],
-                    "description": self._weather_code_to_description(int(current_weather["weather_code"])),
-                    "humidity": current_weather["humidity"],
-                    "wind_speed": current_weather["wind_speed"],
-                    "icon": self._weather_code_to_icon(int(current_weather["weather_code"]))
-                },
-                "forecast": forecast,
-                "recommendations": self._generate_recommendations(forecast)
-            }
+            # Use the resolved coordinates when we have them, otherwise look the city up
+            if coordinates:
+                lat, lon = coordinates["lat"], coordinates["lng"]
+            else:
+                city_coordinates = self._get_coordinates_for_city(location)
+                if not city_coordinates:
+                    return self._get_mock_weather(location, dates, duration)
+                lat, lon = city_coordinates
             
-            return weather_info
+            # Make the API request (in a thread, hedged when HEDGED_REQUESTS=true)
+            start = trip_start_date(dates)
+            responses = await self.hedger.run(partial(self._fetch_forecast, self._forecast_params(lat, lon, self._forecast_days(start, duration))))
+            return self._parse_weather(responses[0], location, duration, start)
             
         except Exception as e:
             print(f"Error fetching weather from Open-Meteo: {e}")
             return self._get_mock_weather(location, dates, duration)
 
-    def _get_coordinates_for_city(self, location: str) -> tuple:
-        """Get coordinates for major cities"""
+    async def get_weather_batch(self, legs: List[Tuple[str, str, int, Optional[Dict[str, float]]]]) -> List[Dict[str, Any]]:
+        """Forecasts for several (location, dates, duration, coordinates) legs in one Open-Meteo request
+
+        The request covers every leg's days; each leg's forecast starts at its own dates.
+        """
+        
+        results = [None] * len(legs)
+        located = []
+        for index, (location, dates, duration, coordinates) in enumerate(legs):
+            if coordinates:
+                located.append((index, coordinates["lat"], coordinates["lng"]))
+                continue
+            city_coordinates = self._get_coordinates_for_city(location)
+            if city_coordinates:
+                located.append((index, city_coordinates[0], city_coordinates[1]))
+            else:
+                results[index] = self._get_mock_weather(location, dates, duration)
+        
+        if not located:
+            return results
+        
+        try:
+            params = self._forecast_params(
+                [lat for _, lat, _ in located],
+                [lon for _, _, lon in located],
+                max(self._forecast_days(trip_start_date(legs[index][1]), legs[index][2]) for index, _, _ in located)
+            )
+            responses = await self.hedger.run(partial(self._fetch_forecast, params))
+            
+            # One response per location, in request order
+            for (index, _, _), response in zip(located, responses):
+                location, dates, duration, _ = legs[index]
+                results[index] = self._parse_weather(response, location, duration, trip_start_date(dates))
+        
+        except Exception as e:
+            print(f"Error fetching weather from Open-Meteo: {e}")
+            for index, _, _ in located:
+                location, dates, duration, _ = legs[index]
+                results[index] = self._get_mock_weather(location, dates, duration)
+        
+        return results
+
+    def _forecast_days(self, start: Optional[date], duration: int) -> int:
+        """Days of forecast needed to reach the end of a stay starting at start (today when None)"""
         
-        city_coordinates = {
-            "rome": (41.9028, 12.4964),
-            "paris": (48.8566, 2.3522),
-            "london": (51.5074, -0.1278),
-            "tokyo": (35.6762, 139.6503),
-            "barcelona": (41.3851, 2.1734),
-            "new york": (40.7128, -74.0060),
-            "berlin": (52.5200, 13.4050),
-            "madrid": (40.4168, -3.7038),
-            "amsterdam": (52.3676, 4.9041),
-            "sydney": (-33.8688, 151.2093),
-            "dubai": (25.2048, 55.2708),
-            "singapore": (1.3521, 103.8198),
-            "mumbai": (19.0760, 72.8777),
-            "moscow": (55.7558, 37.6176),
-            "istanbul": (41.0082, 28.9784)
+        # One extra day in case the location's date is already ahead of ours
+        offset = (start - date.today()).days + 1 if start else 0
+        return max(offset, 0) + duration
+
+    def _forecast_params(self, lat: Any, lon: Any, days: int) -> Dict[str, Any]:
+        """Parameters for current weather and daily forecast; lat/lon may be lists for several locations"""
+        
+        return {
+            "latitude": lat,
+            "longitude": lon,
+            "current": ["temperature_2m", "relative_humidity_2m", "wind_speed_10m", "weather_code"],
+            "daily": [
+                "weather_code",
+                "temperature_2m_max",
+                "temperature_2m_min",
+                "temperature_2m_mean",
+                "relative_humidity_2m_mean",
+                "wind_speed_10m_max"
+            ],
+            "timezone": "auto",
+            "forecast_days": min(days, 16)  # Open-Meteo supports up to 16 days
+        }
+
+    def _parse_weather(self, response, location: str, duration: int, start: Optional[date] = None) -> Dict[str, Any]:
+        """Turn one location's Open-Meteo response into the weather section"""
+        
+        # Process current weather
+        current = response.Current()
+        current_weather = {
+            "temperature": round(current.Variables(0).Value()),
+            "feels_like": round(current.Variables(0).Value()),  # Open-Meteo doesn't provide feels_like
+            "humidity": round(current.Variables(1).Value()),
+            "wind_speed": round(current.Variables(2).Value()),
+            "weather_code": current.Variables(3).Value()
+        }
+        
+        # Process daily forecast
+        forecast = self._build_forecast(response.Daily(), duration, start)
+        
+        # Create weather info
+        weather_info = {
+            "location": location,
+            "current": {
+                "temperature": current_weather["temperature"],
+                "feels_like": current_weather["feels_like"],
+                "description": self._weather_code_to_description(int(current_weather["weather_code"])),
+                "humidity": current_weather["humidity"],
+                "wind_speed": current_weather["wind_speed"],
+                "icon": self._weather_code_to_icon(int(current_weather["weather_code"]))
+            },
+            "forecast": forecast,
+            "recommendations": self._generate_recommendations(forecast)
         }
         
+        return weather_info
+
+    def _fetch_forecast(self, params: Dict[str, Any]) -> list:
+        with track_upstream("open_meteo", "forecast"):
+            return self.openmeteo.weather_api(self.forecast_url, params=params)
+
+    def _build_forecast(self, daily, duration: int, start: Optional[date] = None) -> list:
+        """Turn the daily variables of an Open-Meteo response into per-day forecast entries
+
+        Days before start are skipped; days past the 16-day forecast range are left out.
+        """
+        
+        daily_weather_code = daily.Variables(0).ValuesAsNumpy()
+        daily_temperature_max = daily.Variables(1).ValuesAsNumpy()
+        daily_temperature_min = daily.Variables(2).ValuesAsNumpy()
+        daily_temperature_mean = daily.Variables(3).ValuesAsNumpy()
+        daily_relative_humidity = daily.Variables(4).ValuesAsNumpy()
+        daily_wind_speed = daily.Variables(5).ValuesAsNumpy()
+        
+        # Create date range
+        daily_data = {
+            "date": pd.date_range(
+                start=pd.to_datetime(daily.Time(), unit="s", utc=True),
+                end=pd.to_datetime(daily.TimeEnd(), unit="s", utc=True),
+                freq=pd.Timedelta(seconds=daily.Interval()),
+                inclusive="left"
+            )
+        }
+        
+        # Process forecast data from the first day of the stay
+        first_day = 0
+        if start:
+            first_day = sum(1 for day in daily_data["date"] if day.date() < start)
+        
+        forecast = []
+        for i in range(first_day, min(first_day + duration, len(daily_data["date"]))):
+            daily_forecast = {
+                "date": daily_data["date"][i].strftime("%Y-%m-%d"),
+                "min_temp": round(daily_temperature_min[i]),
+                "max_temp": round(daily_temperature_max[i]),
+                "avg_temp": round(daily_temperature_mean[i]),
+                "humidity": round(daily_relative_humidity[i]),
+                "wind_speed": round(daily_wind_speed[i]),
+                "weather_code": int(daily_weather_code[i]),
+                "description": self._weather_code_to_description(int(daily_weather_code[i]))
+            }
+            forecast.append(ForecastDay.from_dict(daily_forecast))
+        
+        return forecast
+
+    def _get_coordinates_for_city(self, location: str) -> tuple:
+        """Get coordinates for major cities"""
+        
         location_lower = location.lower()
-        for city, coords in city_coordinates.items():
+        for city, coords in CITY_COORDINATES.items():
             if city in location_lower:
                 return coords
         
@@ -218,6 +293,8 @@ class WeatherService:
     def _get_mock_weather(self, location: str, dates: str, duration: int) -> Dict[str, Any]:
         """Return mock weather data when API is not available"""
         
+        record_fallback("weather")
+        
         mock_forecast = []
         for i in range(min(duration, 5)):
             mock_forecast.append({
@@ -1,7 +1,10 @@
 import React from 'react'
 import { MapPin, Star, Clock, DollarSign } from 'lucide-react'
+import usePlaceDetails from '../../hooks/usePlaceDetails'
 
 const AttractionsSection = ({ attractions }) => {
+  const { details, loading, loadDetails, withDetails } = usePlaceDetails()
+
   if (!attractions || attractions.length === 0) {
     return (
       <div className="card">
@@ -22,7 +25,7 @@ const AttractionsSection = ({ attractions }) => {
       </div>
       
       <div className="space-y-4">
-        {attractions.map((attraction, index) => (
+        {attractions.map(withDetails).map((attraction, index) => (
           <div key={index} className="bg-gray-50 p-4 rounded-lg border border-gray-200">
             <div className="flex items-start justify-between mb-2">
               <h3 className="font-semibold text-gray-900">{attraction.name}</h3>
@@ -86,6 +89,14 @@ const AttractionsSection = ({ attractions }) => {
                 </div>
               </div>
             )}
+            {attraction.place_id && !details[attraction.place_id] && (
+              <button
+                onClick={() => loadDetails(attraction.place_id)}
+                className="mt-3 text-sm font-medium text-primary-600 hover:text-primary-700"
+              >
+                {loading[attraction.place_id] ? 'Loading details...' : 'Show reviews & details'}
+              </button>
+            )}
           </div>
         ))}
       </div>
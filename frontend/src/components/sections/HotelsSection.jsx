@@ -1,7 +1,10 @@
 import React from 'react'
 import { Hotel, Star, MapPin, DollarSign } from 'lucide-react'
+import usePlaceDetails from '../../hooks/usePlaceDetails'
 
 const HotelsSection = ({ hotels }) => {
+  const { details, loading, loadDetails, withDetails } = usePlaceDetails()
+
   if (!hotels || hotels.length === 0) {
     return (
       <div className="card">
@@ -22,7 +25,7 @@ const HotelsSection = ({ hotels }) => {
       </div>
       
       <div className="space-y-4">
-        {hotels.map((hotel, index) => (
+        {hotels.map(withDetails).map((hotel, index) => (
           <div key={index} className="bg-gray-50 p-4 rounded-lg border border-gray-200">
             <div className="flex items-start justify-between mb-2">
               <h3 className="font-semibold text-gray-900">{hotel.name}</h3>
@@ -71,6 +74,14 @@ const HotelsSection = ({ hotels }) => {
                 </div>
               </div>
             )}
+            {hotel.place_id && !details[hotel.place_id] && (
+              <button
+                onClick={() => loadDetails(hotel.place_id)}
+                className="mt-3 text-sm font-medium text-primary-600 hover:text-primary-700"
+              >
+                {loading[hotel.place_id] ? 'Loading details...' : 'Show reviews & details'}
+              </button>
+            )}
           </div>
         ))}
       </div>
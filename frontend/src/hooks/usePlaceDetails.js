@@ -0,0 +1,32 @@
+import { useState } from 'react'
+
+// Loads reviews, photos and opening hours for a place on demand
+const usePlaceDetails = () => {
+  const [details, setDetails] = useState({})
+  const [loading, setLoading] = useState({})
+
+  const loadDetails = async (placeId) => {
+    if (!placeId || details[placeId] || loading[placeId]) return
+
+    setLoading((prev) => ({ ...prev, [placeId]: true }))
+    try {
+      const response = await fetch(`/api/places/${placeId}`)
+      if (!response.ok) {
+        throw new Error('Failed to load place details')
+      }
+      const data = await response.json()
+      setDetails((prev) => ({ ...prev, [placeId]: data }))
+    } catch (error) {
+      console.error('Error loading place details:', error)
+    } finally {
+      setLoading((prev) => ({ ...prev, [placeId]: false }))
+    }
+  }
+
+  // Prefer the expanded details, falling back to what the plan already contained
+  const withDetails = (place) => ({ ...place, ...(details[place.place_id] || {}) })
+
+  return { details, loading, loadDetails, withDetails }
+}
+
+export default usePlaceDetails